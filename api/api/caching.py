@@ -0,0 +1,66 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache(object):
+    """Thread safe in-process cache with per entry expiry
+
+    When a max size is provided the least recently used entries are evicted
+    once the cache is full.
+    """
+
+    def __init__(self, ttl, max_size=None):
+        """
+        :param ttl: Default seconds an entry stays valid for
+        :param max_size: Optional max number of entries to hold
+        """
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Get the value for key if it is present and has not expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value for key, optionally overriding the default ttl"""
+        expires = time.monotonic() + (self._ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            if self._max_size is not None:
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove key from the cache if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        with self._lock:
+            self._entries.clear()
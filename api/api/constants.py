@@ -14,13 +14,36 @@ ENV_EVE_API_USER_AGENT = (
     'Corp-HQ client https://github.com/fritogotlayed/corp-hq-api and '
     'https://github.com/fritogotlayed/corp-hq-ui contact <FritoGotLayed> '
     'in game or <Frito> on Tweetfleet')
+# NOTE: ESI allows bursts well above these but they keep a single worker from
+# starving everything else that talks to the API.
+EVE_API_BURST = 100
+EVE_API_MAX_WORKERS = 10
+EVE_API_REQUESTS_PER_SECOND = 50
+# NOTE: ESI stops answering clients whose error limit reaches zero until the
+# limit resets, so retries wait for the reset once it gets this low.
+EVE_API_ERROR_LIMIT_THRESHOLD = 10
 
 ###
 # Environment
 ###
+ENV_BCRYPT_ROUNDS = 'CORP_HQ_BCRYPT_ROUNDS'
+ENV_CONFIG_WATCH = 'CORP_HQ_CONFIG_WATCH'
+ENV_ESI_CACHE_DIR = 'CORP_HQ_ESI_CACHE_DIR'
+ENV_ESI_REQUESTS_PER_SECOND = 'CORP_HQ_ESI_REQUESTS_PER_SECOND'
+ENV_ESI_RESPONSE_CACHE_BYTES = 'CORP_HQ_ESI_RESPONSE_CACHE_BYTES'
+ENV_ESI_SHARED_LIMITS = 'CORP_HQ_ESI_SHARED_LIMITS'
 ENV_FLASK_HOST = 'CORP_HQ_FLASK_HOST'
 ENV_FLASK_PORT = 'CORP_HQ_FLASK_PORT'
+ENV_HASH_QUEUE_LIMIT = 'CORP_HQ_HASH_QUEUE_LIMIT'
+ENV_HASH_WORKERS = 'CORP_HQ_HASH_WORKERS'
+ENV_JOB_WORKERS = 'CORP_HQ_JOB_WORKERS'
+ENV_JSON_SERIALIZER = 'CORP_HQ_JSON_SERIALIZER'
 ENV_MONGO_HOST = 'CORP_HQ_MONGO_HOST'
+ENV_MONGO_MAX_POOL_SIZE = 'CORP_HQ_MONGO_MAX_POOL_SIZE'
+ENV_MONGO_SLOW_MS = 'CORP_HQ_MONGO_SLOW_MS'
+ENV_MONGO_WAIT_QUEUE_TIMEOUT_MS = 'CORP_HQ_MONGO_WAIT_QUEUE_TIMEOUT_MS'
+ENV_SYNC_INDEXES = 'CORP_HQ_SYNC_INDEXES'
+ENV_TOKEN_SECRET = 'CORP_HQ_TOKEN_SECRET'
 
 ###
 # System
@@ -28,3 +51,27 @@ ENV_MONGO_HOST = 'CORP_HQ_MONGO_HOST'
 # This space is for constants generally used by the system overall.
 ###
 SYS_LOGGER_NAME = 'corp-hq'
+BCRYPT_ROUNDS = 12
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+CONFIG_CACHE_TTL = 60
+ESI_RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+# NOTE: Reads only move a cached response up the eviction order once this many
+# seconds have passed since it was last moved, so most reads do not write.
+ESI_RESPONSE_ACCESS_INTERVAL = 60
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 60
+SESSION_REVOCATION_POLL = 1
+IMPORT_BATCH_SIZE = 50
+MONGO_SLOW_MS = 100
+PAGE_SIZE = 100
+PAGE_SIZE_MAX = 1000
+# NOTE: Every user registered in bulk is hashed before the request answers,
+# at the default work factor 25 of them keep one core busy for seconds.
+REGISTER_BULK_LIMIT = 25
+REPO_BATCH_SIZE = 1000
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 5
+STREAM_BATCH_SIZE = 500
+STREAM_BATCH_SIZE_MAX = 5000
@@ -5,15 +5,23 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
-import json
+from itertools import islice
 
 from flask import Response
 from flask_api import status as codes
 
+import api.constants as const
+from api import serialization
+
 
 def _build_response(data, status=codes.HTTP_200_OK, headers=None):
-    if isinstance(data, dict):
-        data = json.dumps(data)
+    """Build a response, serializing data to JSON unless it is already text
+
+    Datetimes, ObjectIds and bytes inside data are serialized too, see
+    api.serialization.
+    """
+    if data is not None and not isinstance(data, (str, bytes)):
+        data = serialization.dumps(data)
 
     if not headers:
         headers = {}
@@ -21,3 +29,48 @@ def _build_response(data, status=codes.HTTP_200_OK, headers=None):
         headers['Content-Type'] = 'application/json'
 
     return Response(data, status=status, headers=headers)
+
+
+def _stream_response(items,
+                     batch_size=None,
+                     ndjson=False,
+                     status=codes.HTTP_200_OK,
+                     headers=None):
+    """Build a response that serializes the items as they are read
+
+    The items are sent as a single JSON array, or as newline delimited JSON
+    when ndjson is set, batch_size items per chunk. Only one batch is held in
+    memory at a time and the opening of the array is sent straight away.
+
+    :param items: An iterable of the items to send, such as a repo iterator
+    :param batch_size: The items serialized per chunk sent
+    :param ndjson: Send one JSON document per line instead of an array
+    """
+    batch_size = batch_size or const.STREAM_BATCH_SIZE
+    items = iter(items)
+
+    def _generate():
+        if not ndjson:
+            yield b'['
+        separator = b'\n' if ndjson else b','
+        first = True
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                break
+            chunk = separator.join(serialization.dumps(item) for item in batch)
+            if ndjson:
+                yield chunk + b'\n'
+            else:
+                yield chunk if first else b',' + chunk
+            first = False
+        if not ndjson:
+            yield b']'
+
+    if not headers:
+        headers = {}
+    if 'Content-Type' not in headers:
+        headers['Content-Type'] = ('application/x-ndjson'
+                                   if ndjson else 'application/json')
+
+    return Response(_generate(), status=status, headers=headers)
@@ -5,27 +5,55 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
-from flask import Blueprint, Response
+from flask import Blueprint, Response, request
+from flask_api import status
 
 from api.controllers import _build_response
-from api.helpers import time_it
 from api import domain
+from api.helpers import requires_session
 
 MOD = Blueprint('admin', __name__, url_prefix='/admin')
 
 
 @MOD.route('/configured', methods=['GET'])
-@time_it
 def is_configured() -> Response:
     """Has the system been configured"""
     return _build_response({'is_configured': False})
 
 
 @MOD.route('/configure', methods=['POST'])
-@time_it
 def configure() -> Response:
-    """Run the code that configures the system for operation."""
-    utilities = domain.DataUtilities()
-    utilities.apply_indexes()
-    utilities.populate_regions()
-    return _build_response({'is_configured': True})
+    """Start the job that configures the system for operation."""
+    job_id = domain.Job().start_configure()
+    href = '/admin/jobs/' + job_id
+    return _build_response({
+        'jobId': job_id,
+        'href': href
+    }, status.HTTP_202_ACCEPTED, {'Location': href})
+
+
+@MOD.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id) -> Response:
+    """Get the progress of a background job"""
+    data = domain.Job().get(job_id)
+    if data is None:
+        return _build_response(None, status.HTTP_404_NOT_FOUND)
+    return _build_response(data)
+
+
+@MOD.route('/indexes', methods=['GET'])
+@requires_session
+def get_indexes() -> Response:
+    """Report which indexes are missing, changed, unknown or unused"""
+    return _build_response({'indexes': domain.Indexes().report()})
+
+
+@MOD.route('/indexes/sync', methods=['POST'])
+@requires_session
+def sync_indexes() -> Response:
+    """Create the missing indexes and rebuild the changed ones"""
+    payload = request.get_json(silent=True) or {}
+    return _build_response({
+        'indexes':
+        domain.Indexes().sync(bool(payload.get('dropUnknown', False)))
+    })
@@ -0,0 +1,21 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from flask import Blueprint, Response
+
+from api.controllers import _build_response
+from api import metrics
+
+MOD = Blueprint('metrics', __name__, url_prefix='')
+
+
+@MOD.route('/metrics', methods=['GET'])
+def get_metrics() -> Response:
+    """Metrics of this worker in the Prometheus text format"""
+    return _build_response(
+        metrics.REGISTRY.render(),
+        headers={'Content-Type': 'text/plain; version=0.0.4'})
@@ -0,0 +1,90 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from urllib.parse import urlencode
+
+from flask import Blueprint, Response, request
+from flask_api import status
+
+from api.controllers import _build_response, _stream_response
+from api import domain
+from api.errors import ValidationError
+
+MOD = Blueprint('regions', __name__, url_prefix='/regions')
+
+
+def _get_int_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError('%s must be an integer' % name)
+
+
+@MOD.route('', methods=['GET'])
+def list_regions() -> Response:
+    """Browse regions a page at a time
+
+    Supports the after, limit, name (prefix) and fields (comma separated)
+    query parameters. When more regions remain the next link carries the same
+    parameters with after moved to the end of this page.
+    """
+    name_prefix = request.args.get('name')
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [field for field in fields.split(',') if field]
+
+    try:
+        data = domain.Region().find(
+            _get_int_arg('after'), _get_int_arg('limit'), name_prefix, fields)
+    except ValidationError as ex:
+        data = {'message': ex.args[0]}
+        return _build_response(data, status.HTTP_400_BAD_REQUEST)
+
+    if data['next'] is not None:
+        args = request.args.to_dict()
+        args['after'] = data['next']
+        data['next'] = '/regions?' + urlencode(sorted(args.items()))
+    return _build_response(data)
+
+
+@MOD.route('/export', methods=['GET'])
+def export_regions() -> Response:
+    """Stream every region in one response
+
+    Supports the name (prefix) and fields (comma separated) query parameters
+    of list_regions, along with batch, the regions read and sent at a time,
+    and format, json for a single array or ndjson for one region per line.
+    """
+    name_prefix = request.args.get('name')
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [field for field in fields.split(',') if field]
+    output = request.args.get('format', 'json')
+
+    try:
+        if output not in ('json', 'ndjson'):
+            raise ValidationError('format must be json or ndjson')
+        batch_size = _get_int_arg('batch')
+        regions = domain.Region().stream(name_prefix, fields, batch_size)
+    except ValidationError as ex:
+        data = {'message': ex.args[0]}
+        return _build_response(data, status.HTTP_400_BAD_REQUEST)
+
+    return _stream_response(regions, batch_size, output == 'ndjson')
+
+
+@MOD.route('/<int:region_id>', methods=['GET'])
+def get_region(region_id) -> Response:
+    """Get a single region"""
+    data = domain.Region().get(region_id)
+    if data is None:
+        return _build_response(None, status.HTTP_404_NOT_FOUND)
+    return _build_response(data)
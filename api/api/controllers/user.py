@@ -5,12 +5,13 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
-import rfc3339
 from flask import Blueprint, Response, request
 from flask_api import status
 
+import api.constants as const
 from api.controllers import _build_response
-from api.helpers import time_it, get_originator_ip_chain, update_dict_key
+from api.helpers import (get_originator_ip_chain, requires_session,
+                         update_dict_key)
 from api import domain
 from api.errors import ValidationError
 
@@ -18,7 +19,6 @@ MOD = Blueprint('user', __name__, url_prefix='')
 
 
 @MOD.route('/login', methods=['POST'])
-@time_it
 def login() -> Response:
     """User login endpoint"""
     payload = request.get_json()
@@ -27,16 +27,20 @@ def login() -> Response:
     update_dict_key(payload, 'un', 'username')
     update_dict_key(payload, 'pw', 'password')
 
+    username = payload.get('username')
+    password = payload.get('password')
+    if not (isinstance(username, str) and isinstance(password, str)
+            and domain.User().authenticate(username, password)):
+        return Response(None, status.HTTP_401_UNAUTHORIZED)
+
     payload['addressChain'] = get_originator_ip_chain()
 
     data = session.create(payload)
-    data['expires'] = rfc3339.format(data['expireAt'], True, False)
-    del data['expireAt']
+    data['expires'] = data.pop('expireAt')
     return _build_response(data)
 
 
 @MOD.route('/register', methods=['POST'])
-@time_it
 def register() -> Response:
     """Register new user endpoint"""
     payload = request.get_json()
@@ -51,8 +55,31 @@ def register() -> Response:
     return _build_response(None, status.HTTP_201_CREATED)
 
 
+@MOD.route('/register/bulk', methods=['POST'])
+@requires_session
+def register_bulk() -> Response:
+    """Register many new users endpoint"""
+    payload = request.get_json()
+    if not isinstance(payload, list):
+        data = {'message': 'Expected a list of users'}
+        return _build_response(data, status.HTTP_400_BAD_REQUEST)
+
+    if len(payload) > const.REGISTER_BULK_LIMIT:
+        data = {
+            'message':
+            'At most %s users may be registered at once' %
+            const.REGISTER_BULK_LIMIT
+        }
+        return _build_response(data, status.HTTP_400_BAD_REQUEST)
+
+    results = domain.User().create_many(payload)
+    data = {'results': results}
+    for result in results:
+        data[result['status']] = data.get(result['status'], 0) + 1
+    return _build_response(data)
+
+
 @MOD.route('/logout', methods=['POST'])
-@time_it
 def logout() -> Response:
     """User login endpoint"""
     payload = request.get_json()
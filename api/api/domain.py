@@ -5,25 +5,42 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
-import random
 from datetime import datetime, timedelta
-import string
+import os
+import threading
 
-import bcrypt
-
-from api import repos
+import api.constants as const
+from api import caching, importers, jobs, passwords, repos, tokens
 from api.errors import ValidationError
 
 
 class Session(object):
-    """Class to house the domain logic for sessions"""
+    """Class to house the domain logic for sessions
+
+    Validated sessions are kept in a process wide cache. Logging out drops the
+    session from the local cache and publishes a revocation that every other
+    worker applies the next time it validates a token, at most once every
+    SESSION_REVOCATION_POLL seconds.
+    """
+
+    _CACHE = caching.TTLCache(const.SESSION_CACHE_TTL,
+                              const.SESSION_CACHE_SIZE)
+    _REVOCATIONS_LOCK = threading.Lock()
+    _REVOCATIONS_CHECKED_AT = None
 
-    def __init__(self, session_repo: repos.SessionRepo = None):
+    def __init__(self,
+                 session_repo: repos.SessionRepo = None,
+                 token_secret: bytes = None):
         self._session_repo = session_repo or repos.SessionRepo()
 
-    @staticmethod
-    def _generate_token(size=128, chars=string.ascii_letters + string.digits):
-        return ''.join(random.choice(chars) for _ in range(size))
+        if token_secret is None and os.environ.get(const.ENV_TOKEN_SECRET):
+            token_secret = os.environ[const.ENV_TOKEN_SECRET].encode('utf8')
+        self._token_secret = token_secret
+
+    def _generate_token(self, expiry):
+        if self._token_secret:
+            return tokens.sign_token(expiry, self._token_secret)
+        return tokens.generate_token()
 
     def create(self, payload):
         """Create a new session for the given payload"""
@@ -35,7 +52,7 @@ class Session(object):
 
         expiry = datetime.utcnow() + timedelta(minutes=10)
         data = {
-            'token': self._generate_token(),
+            'token': self._generate_token(expiry),
             'addressChain': payload['addressChain'],
             'username': payload['username'],
             'userRole': 'user',
@@ -51,57 +68,328 @@ class Session(object):
     def expire(self, payload):
         """Expire the provided payload"""
         self._session_repo.remove(payload)
+        Session._CACHE.invalidate(payload['token'])
+        self._session_repo.publish_revocation(payload['token'])
+
+    def _apply_revocations(self):
+        """Drop cached sessions that other workers have revoked"""
+        if not Session._REVOCATIONS_LOCK.acquire(False):
+            return
+
+        try:
+            now = datetime.utcnow()
+            checked_at = Session._REVOCATIONS_CHECKED_AT
+            if checked_at and (now - checked_at).total_seconds() < (
+                    const.SESSION_REVOCATION_POLL):
+                return
+
+            if checked_at:
+                # NOTE: Look back a little further than the last check so
+                # clock skew between workers cannot hide a revocation.
+                since = checked_at - timedelta(seconds=5)
+                for token in self._session_repo.get_revoked_tokens(since):
+                    Session._CACHE.invalidate(token)
+            Session._REVOCATIONS_CHECKED_AT = now
+        finally:
+            Session._REVOCATIONS_LOCK.release()
+
+    def validate(self, token):
+        """Get the live session for the provided token
+
+        Signed tokens that are forged or past their expiry are rejected without
+        a trip to the database.
+
+        :return: A copy of the session document, or None when the token is not
+                 valid
+        """
+        if not token:
+            return None
+
+        if tokens.is_signed(token):
+            if not self._token_secret or not tokens.verify_token(
+                    token, self._token_secret):
+                return None
+
+        self._apply_revocations()
+        now = datetime.utcnow()
+
+        session = Session._CACHE.get(token)
+        if session is None:
+            session = self._session_repo.get_by_keys({'token': token})
+            if session is None:
+                return None
+
+            ttl = min(const.SESSION_CACHE_TTL,
+                      (session['expireAt'] - now).total_seconds())
+            if ttl > 0:
+                Session._CACHE.set(token, session, ttl)
+
+        if session['expireAt'] <= now:
+            return None
+        # NOTE: A copy, changes made while handling a request must not reach
+        # the cached session every later request is handed.
+        return dict(session)
 
 
 class User(object):
     """Class to house the domain logic for users"""
 
-    def __init__(self, user_repo: repos.UserRepo = None):
+    def __init__(self,
+                 user_repo: repos.UserRepo = None,
+                 hasher: passwords.PasswordHasher = None):
         self._user_repo = user_repo or repos.UserRepo()
+        self._hasher = hasher or passwords.PasswordHasher()
 
     def authenticate(self, username, password):
-        """Attempt to authenticate the user with the provided credentials"""
-        db_user = self._user_repo.get_by_keys({'username': username})
-        return False if db_user is None else bcrypt.checkpw(
-            password, db_user.password)
+        """Attempt to authenticate the user with the provided credentials
 
-    def create(self, payload):
-        """Create a new user in the system"""
+        Users whose password was hashed with a different work factor than the
+        one currently configured have it rehashed on a successful login.
+        """
+        db_user = self._user_repo.get_by_keys(
+            {'username': username}, repos.UserCredentials)
+        if db_user is None:
+            return False
+
+        if isinstance(password, str):
+            password = password.encode('utf8')
+
+        if not self._hasher.check(password, db_user.password):
+            return False
+
+        if self._hasher.needs_rehash(db_user.password):
+            self._user_repo.update_password(username,
+                                            self._hasher.hash(password))
+        return True
+
+    @staticmethod
+    def _validate(payload):
         required_keys = ['username', 'password', 'email']
 
+        if not isinstance(payload, dict):
+            raise ValidationError('User must be an object')
+
         for key in required_keys:
             if key not in payload or not payload[key]:
                 raise ValidationError('Missing required key: %s' % key)
+            if not isinstance(payload[key], str):
+                raise ValidationError('%s must be a string' % key)
+
+    def create(self, payload):
+        """Create a new user in the system"""
+        self._validate(payload)
 
         password = payload['password'].encode('utf8')
         data = {
             'username': payload['username'],
-            'password': bcrypt.hashpw(password, bcrypt.gensalt()),
+            'password': self._hasher.hash(password),
             'email': payload['email']
         }
 
         self._user_repo.save(data)
 
+    def create_many(self, payloads) -> list:
+        """Create new users in the system in bulk
+
+        Existing users are never overwritten. Every payload gets a result, in
+        the order provided, with a status of created, duplicate or invalid.
+        """
+        results = []
+        pending = []
+        seen = set()
+        for payload in payloads:
+            result = {}
+            results.append(result)
+            if isinstance(payload, dict) and 'username' in payload:
+                result['username'] = payload['username']
+
+            try:
+                self._validate(payload)
+            except ValidationError as ex:
+                result['status'] = 'invalid'
+                result['message'] = ex.args[0]
+                continue
+
+            username = payload['username']
+            if username in seen:
+                result['status'] = 'duplicate'
+                continue
+            seen.add(username)
+            pending.append((result, payload))
+
+        hashes = self._hasher.hash_many(
+            payload['password'].encode('utf8') for _, payload in pending)
+        created = self._user_repo.create_many([{
+            'username': payload['username'],
+            'password': password_hash,
+            'email': payload['email']
+        } for (_, payload), password_hash in zip(pending, hashes)])
+
+        for index, (result, _) in enumerate(pending):
+            result['status'] = 'created' if index in created else 'duplicate'
+        return results
+
+
+class Indexes(object):
+    """Class to house the domain logic for managing database indexes"""
+
+    def __init__(self, index_repos: list = None):
+        """
+        :param index_repos: The repos whose indexes are managed. Defaults to
+                            every repo backed by the database.
+        """
+        self._index_repos = index_repos
+        if self._index_repos is None:
+            self._index_repos = [
+                repos.ConfigRepo(),
+                repos.EsiResourceRepo(),
+                repos.EsiSpecRepo(),
+                repos.JobRepo(),
+                repos.LimitRepo(),
+                repos.SessionRepo(),
+                repos.UserRepo(),
+                repos.RegionRepo(),
+                repos.ConstellationRepo(),
+                repos.SystemRepo(),
+                repos.StargateRepo()
+            ]
+
+    def report(self) -> list:
+        """Report which indexes are missing, changed, unknown or unused"""
+        return [
+            entry for repo in self._index_repos
+            for entry in repo.check_indexes()
+        ]
+
+    def sync(self, drop_unknown=False) -> list:
+        """Create the missing indexes and rebuild the changed ones
+
+        :param drop_unknown: Drop indexes that no repo declares
+        """
+        return [
+            entry for repo in self._index_repos
+            for entry in repo.sync_indexes(drop_unknown)
+        ]
+
 
 class DataUtilities(object):
     """Class to house the domain logic for data initialization"""
 
     def __init__(self,
                  region_repo: repos.RegionRepo = None,
-                 region_api: repos.EveRegionRepo = None,
-                 session_repo: repos.SessionRepo = None):
+                 region_api: repos.EveUniverseRepo = None,
+                 session_repo: repos.SessionRepo = None,
+                 constellation_repo: repos.ConstellationRepo = None,
+                 system_repo: repos.SystemRepo = None,
+                 stargate_repo: repos.StargateRepo = None,
+                 indexes: Indexes = None):
         self._region_repo = region_repo or repos.RegionRepo()
-        self._region_api = region_api or repos.EveRegionRepo()
+        self._region_api = region_api or repos.EveUniverseRepo()
         self._session_repo = session_repo or repos.SessionRepo()
+        self._constellation_repo = (constellation_repo or
+                                    repos.ConstellationRepo())
+        self._system_repo = system_repo or repos.SystemRepo()
+        self._stargate_repo = stargate_repo or repos.StargateRepo()
+        self._indexes = indexes or Indexes()
 
     def apply_indexes(self):
         """Coordinate applying indexes to the data store"""
-        self._session_repo.apply_indexes()
-
-    def populate_regions(self, force=False):
-        """Coordinate loading regions from the EVE endpoints."""
-        if force or not self._region_repo.has_any():
-            region_ids = self._region_api.get_region_ids()
-            for region_id in region_ids:
-                details = self._region_api.get_region_details(region_id)
-                self._region_repo.save(details)
+        self._indexes.sync()
+
+    def populate_universe(self, force=False, progress=None):
+        """Coordinate loading the whole universe from the EVE endpoints
+
+        Anything already loaded is skipped unless force is set, so this can be
+        re-run to finish an interrupted import. Without force the children
+        already stored for a region or constellation are reused, so only a
+        forced run finds systems added to one that was already imported.
+        """
+        importer = importers.UniverseImporter(
+            self._region_api, self._region_repo, self._constellation_repo,
+            self._system_repo, self._stargate_repo)
+        importer.run(force=force, progress=progress)
+
+    def configure(self, progress=None):
+        """Coordinate everything needed to make the system operational"""
+        self.apply_indexes()
+        self.populate_universe(progress=progress)
+
+
+class Region(object):
+    """Class to house the domain logic for browsing regions"""
+
+    def __init__(self, region_repo: repos.RegionRepo = None):
+        self._region_repo = region_repo or repos.RegionRepo()
+
+    def find(self, after=None, limit=None, name_prefix=None, fields=None):
+        """Get one page of regions and the cursor for the next page
+
+        :param after: The region id the previous page ended on
+        :param limit: The max regions on the page
+        :param name_prefix: Only include regions whose name starts with this
+        :param fields: Optional list of fields to include for each region
+        :return: Dict with the regions under items and the cursor under next,
+                 next being None on the final page
+        """
+        limit = const.PAGE_SIZE if limit is None else limit
+        if not 0 < limit <= const.PAGE_SIZE_MAX:
+            raise ValidationError(
+                'limit must be between 1 and %s' % const.PAGE_SIZE_MAX)
+
+        if fields:
+            fields = sorted(set(fields) | {'region_id'})
+
+        # NOTE: One extra region is loaded to learn if another page exists.
+        regions = self._region_repo.find_regions(after, limit + 1,
+                                                 name_prefix, fields or [])
+        next_after = None
+        if len(regions) > limit:
+            regions = regions[:limit]
+            next_after = regions[-1]['region_id']
+        return {'items': regions, 'next': next_after}
+
+    def get(self, region_id):
+        """Get the region with the provided id"""
+        return self._region_repo.get_by_keys({'region_id': region_id},
+                                             fields=[])
+
+    def stream(self, name_prefix=None, fields=None, batch_size=None):
+        """Get every region ordered by region id, read as it is consumed
+
+        :param name_prefix: Only include regions whose name starts with this
+        :param fields: Optional list of fields to include for each region
+        :param batch_size: The max regions read from the database at once
+        :return: An iterator over the regions
+        """
+        batch_size = const.STREAM_BATCH_SIZE if batch_size is None else (
+            batch_size)
+        if not 0 < batch_size <= const.STREAM_BATCH_SIZE_MAX:
+            raise ValidationError('batch must be between 1 and %s' %
+                                  const.STREAM_BATCH_SIZE_MAX)
+
+        if fields:
+            fields = sorted(set(fields) | {'region_id'})
+        return self._region_repo.iter_regions(name_prefix, fields or [],
+                                              batch_size)
+
+
+def _configure_job(progress):
+    DataUtilities().configure(progress)
+
+
+class Job(object):
+    """Class to house the domain logic for background jobs"""
+
+    def __init__(self, job_runner: jobs.JobRunner = None):
+        self._job_runner = job_runner or jobs.JobRunner()
+
+    def start_configure(self) -> str:
+        """Start configuring the system in the background"""
+        return self._job_runner.submit('configure', _configure_job)
+
+    def get(self, job_id):
+        """Get the current state of the provided job"""
+        job = self._job_runner.get(job_id)
+        if job is not None:
+            del job['_id']
+        return job
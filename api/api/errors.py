@@ -10,3 +10,38 @@ of the project.
 class ValidationError(Exception):
     """Error to raise when corp-hq specific validations fail."""
     pass
+
+
+class ServiceUnavailableError(Exception):
+    """Error to raise when the system is too busy to take on more work."""
+    pass
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Error to raise when calls to a failing dependency are being refused."""
+    pass
+
+
+class TransientError(Exception):
+    """Error to raise when a failed call is worth retrying."""
+
+    def __init__(self, message, retry_after=None):
+        """
+        :param message: What went wrong
+        :param retry_after: Optional seconds to wait before trying again
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ThrottledError(TransientError):
+    """Error to raise when a call is held back by a limit before it is sent."""
+    pass
+
+
+class EveApiError(Exception):
+    """Error to raise when the EVE API rejects a request."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
@@ -0,0 +1,456 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+import esipy
+from esipy.cache import BaseCache
+from esipy.client import CachedResponse
+from pyswagger.getter import DictGetter
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import api.constants as const
+from api.errors import EveApiError, TransientError
+
+
+def _default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.environ.get(const.ENV_ESI_CACHE_DIR,
+                          os.path.join(cache_home, 'corp-hq', 'esi'))
+
+
+def _private_dir(path) -> bool:
+    """Create the folder if needed and check no one else can write to it
+
+    Cached specs are unpickled, so a folder another user could write to would
+    let them run code in this process.
+
+    :return: True when the folder is safe to cache in, False otherwise
+    """
+    logger = logging.getLogger(const.SYS_LOGGER_NAME)
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.stat(path)
+    except OSError as ex:
+        logger.warning('ESI cache folder %s is unusable, not caching: %s',
+                       path, ex)
+        return False
+
+    if (info.st_uid != os.getuid() or info.st_mode & 0o022
+            or not os.access(path, os.W_OK)):
+        logger.warning(
+            'ESI cache folder %s is not private to this user, not caching',
+            path)
+        return False
+    return True
+
+
+def get_header(response, name):
+    """Get the first value of a header from an esipy response"""
+    values = response.header.get(name)
+    return values[0] if values else None
+
+
+def _error_limit_reset(response):
+    """Seconds until the ESI error limit resets, if it is nearly used up"""
+    try:
+        remain = int(get_header(response, 'X-Esi-Error-Limit-Remain'))
+        reset = int(get_header(response, 'X-Esi-Error-Limit-Reset'))
+    except (TypeError, ValueError):
+        return None
+    if response.status == 420 or remain <= const.EVE_API_ERROR_LIMIT_THRESHOLD:
+        return reset
+    return None
+
+
+def check_response(response):
+    """Raise an error for ESI responses that did not succeed
+
+    Error limited (420) and server side (5xx) failures raise a TransientError
+    that waits for the ESI error limit to reset when it is nearly used up. Any
+    other failure raises an EveApiError.
+
+    :return: The response when it succeeded
+    """
+    status = response.status
+    if status < 400:
+        return response
+
+    message = 'ESI responded with %s: %s' % (status, response.raw)
+    if status == 420 or status >= 500:
+        raise TransientError(message, _error_limit_reset(response))
+    raise EveApiError(message, status)
+
+
+class EsiClient(esipy.EsiClient):
+    """esipy client that can send extra headers with a single request
+
+    pyswagger clients take the headers of one request alongside its options,
+    but esipy drops them, so they are added to the request here before esipy
+    prepares it.
+    """
+
+    def _request(self, req_and_resp, raw_body_only=None, opt=None,
+                 headers=None):
+        """
+        :param headers: Headers to send with this request only
+        :type headers: dict
+        """
+        if headers:
+            # NOTE: esipy resets the request before preparing it, which keeps
+            # the parameters it was made with so the headers are added there.
+            req_and_resp[0]._p['header'].update(headers)
+        return super()._request(req_and_resp, raw_body_only, opt)
+
+
+def _write_atomic(path, data):
+    """Write data to path without readers ever seeing a partial file"""
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class SpecCache(object):
+    """Class to house caching of the prepared ESI swagger specification
+
+    Building an esipy.App means downloading and then walking the whole swagger
+    spec which takes tens of seconds. The prepared App is pickled to local disk
+    keyed by the spec URL and ETag so a fresh worker only has to unpickle it.
+    The raw spec is also kept on disk, and in mongo when a spec repo is given,
+    so workers on a new host can skip the download. Whenever a cached copy is
+    used the spec is revalidated in the background with a conditional GET.
+
+    Nothing is read from or written to a cache folder that is not private to
+    the current user.
+    """
+
+    def __init__(self, cache_dir=None, spec_repo=None, timeout=30):
+        """
+        :param cache_dir: The folder to keep the cached specs in
+        :param spec_repo: Optional repo to share raw specs between hosts
+        :type spec_repo: api.repos.EsiSpecRepo
+        :param timeout: Seconds to wait on the spec download
+        """
+        self._cache_dir = cache_dir or _default_cache_dir()
+        self._use_disk = _private_dir(self._cache_dir)
+        self._spec_repo = spec_repo
+        self._timeout = timeout
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+    def _path(self, url, extension):
+        name = hashlib.sha1(url.encode('utf8')).hexdigest()
+        return os.path.join(self._cache_dir, name + extension)
+
+    @staticmethod
+    def _build_app(url, spec):
+        app = esipy.App.load(url, getter=DictGetter([url], {url: spec}))
+        app.prepare()
+        return app
+
+    def _load_app(self, url):
+        if not self._use_disk:
+            return None
+        try:
+            with open(self._path(url, '.pickle'), 'rb') as app_file:
+                entry = pickle.load(app_file)
+        except Exception:  # pylint: disable=broad-except
+            # NOTE: A missing, corrupt or stale pickle just means rebuilding.
+            return None
+        return entry if entry.get('url') == url else None
+
+    def _load_spec(self, url):
+        if self._use_disk:
+            try:
+                with open(self._path(url, '.json'), 'rb') as spec_file:
+                    entry = json.loads(spec_file.read().decode('utf8'))
+                if entry.get('url') == url:
+                    return entry
+            except (OSError, ValueError):
+                pass
+
+        if self._spec_repo:
+            entry = self._spec_repo.get_by_keys({'url': url})
+            if entry:
+                entry.pop('_id', None)
+                entry['spec'] = json.loads(entry['spec'])
+                return entry
+        return None
+
+    def _store(self, entry, app):
+        if self._use_disk:
+            try:
+                _write_atomic(
+                    self._path(entry['url'], '.json'),
+                    json.dumps(entry).encode('utf8'))
+                _write_atomic(
+                    self._path(entry['url'], '.pickle'),
+                    pickle.dumps({
+                        'url': entry['url'],
+                        'etag': entry['etag'],
+                        'app': app
+                    }))
+            except OSError as ex:
+                logging.getLogger(const.SYS_LOGGER_NAME).warning(
+                    'ESI spec for %s could not be cached: %s', entry['url'],
+                    ex)
+
+        if self._spec_repo:
+            document = dict(entry)
+            document['spec'] = json.dumps(entry['spec'])
+            self._spec_repo.save(document)
+
+    def _fetch(self, url, etag=None):
+        """Download the spec, returning None when it has not changed"""
+        headers = {'If-None-Match': etag} if etag else {}
+        response = requests.get(url, headers=headers, timeout=self._timeout)
+        if response.status_code == 304:
+            return None
+
+        response.raise_for_status()
+        return {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'spec': response.json()
+        }
+
+    def revalidate(self, url, etag, on_change=None) -> bool:
+        """Refresh the cached spec if the server has a newer one
+
+        :param url: The URL of the spec
+        :param etag: The ETag of the cached copy
+        :param on_change: Called with the new App when the spec changed
+        :return: True when the spec changed, False otherwise
+        """
+        entry = self._fetch(url, etag)
+        if entry is None:
+            return False
+
+        app = self._build_app(url, entry['spec'])
+        self._store(entry, app)
+        if on_change:
+            on_change(app)
+        return True
+
+    def _revalidate_in_background(self, url, etag, on_change):
+        with self._lock:
+            if url in self._revalidating:
+                return
+            self._revalidating.add(url)
+
+        def _run():
+            logger = logging.getLogger(const.SYS_LOGGER_NAME)
+            try:
+                if self.revalidate(url, etag, on_change):
+                    logger.info('ESI spec at %s changed and was refreshed',
+                                url)
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.warning('ESI spec at %s failed to revalidate: %s', url,
+                               ex)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(url)
+
+        thread = threading.Thread(target=_run, name='esi-spec-revalidate')
+        thread.daemon = True
+        thread.start()
+
+    def get_app(self, url, on_change=None):
+        """Get a prepared App for the spec at the provided URL
+
+        :param url: The URL of the spec
+        :param on_change: Called with a new App if a background revalidation
+                          finds that the spec has changed
+        """
+        entry = self._load_app(url)
+        if entry:
+            self._revalidate_in_background(url, entry['etag'], on_change)
+            return entry['app']
+
+        entry = self._load_spec(url)
+        if entry:
+            app = self._build_app(url, entry['spec'])
+            self._store(entry, app)
+            self._revalidate_in_background(url, entry['etag'], on_change)
+            return app
+
+        entry = self._fetch(url)
+        app = self._build_app(url, entry['spec'])
+        self._store(entry, app)
+        return app
+
+
+class ResponseCache(BaseCache):
+    """Class to house caching of ESI responses in a local SQLite database
+
+    Plugged into the esipy client, which stores every successful response for
+    as long as its Expires header allows. Entries are shared by every worker
+    on the host and survive restarts. Responses are kept as plain columns,
+    never pickled, and triggers keep a running total of their size so each
+    write can tell if it went past max_bytes without summing the table. Once
+    past it the least recently read responses are evicted. When a response
+    was read is only updated every ESI_RESPONSE_ACCESS_INTERVAL seconds, so
+    reads of a hot response do not all take the write lock.
+    """
+
+    _SCHEMA = """
+        BEGIN IMMEDIATE;
+        CREATE TABLE IF NOT EXISTS esi_responses (
+            key TEXT PRIMARY KEY, status INTEGER NOT NULL,
+            headers TEXT NOT NULL, content BLOB NOT NULL, url TEXT,
+            size INTEGER NOT NULL, expires REAL NOT NULL,
+            accessed REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS esi_responses_accessed
+            ON esi_responses (accessed);
+        CREATE INDEX IF NOT EXISTS esi_responses_expires
+            ON esi_responses (expires);
+        CREATE TABLE IF NOT EXISTS esi_responses_size (
+            total INTEGER NOT NULL);
+        INSERT INTO esi_responses_size (total)
+            SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM esi_responses_size);
+        CREATE TRIGGER IF NOT EXISTS esi_responses_added
+            AFTER INSERT ON esi_responses
+            BEGIN
+                UPDATE esi_responses_size SET total = total + NEW.size;
+            END;
+        CREATE TRIGGER IF NOT EXISTS esi_responses_removed
+            AFTER DELETE ON esi_responses
+            BEGIN
+                UPDATE esi_responses_size SET total = total - OLD.size;
+            END;
+        COMMIT;
+    """
+
+    def __init__(self, path=None, max_bytes=None, timeout=5):
+        """
+        :param path: The SQLite database file to keep responses in
+        :param max_bytes: The max size of the stored responses
+        :param timeout: Seconds to wait on another worker's write lock
+        """
+        self._path = path or os.path.join(_default_cache_dir(),
+                                          'responses.sqlite')
+        self._use_disk = _private_dir(os.path.dirname(self._path))
+        self._max_bytes = max_bytes or int(
+            os.environ.get(const.ENV_ESI_RESPONSE_CACHE_BYTES,
+                           const.ESI_RESPONSE_CACHE_BYTES))
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        """Get the connection for this thread, opening it if needed"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        connection = sqlite3.connect(
+            self._path, timeout=self._timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        # NOTE: Replacing a response deletes the old row, which only fires
+        # the delete trigger with recursive triggers on.
+        connection.execute('PRAGMA recursive_triggers=ON')
+        connection.executescript(self._SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key, default=None):
+        """Get the response stored for key if it has not expired"""
+        if not self._use_disk:
+            return default
+
+        key = self._hash(key)
+        connection = self._connect()
+        row = connection.execute(
+            'SELECT status, headers, content, url, expires, accessed '
+            'FROM esi_responses WHERE key = ?', (key, )).fetchone()
+        if row is None:
+            return default
+
+        now = time.time()
+        if row[4] <= now:
+            connection.execute('DELETE FROM esi_responses WHERE key = ?',
+                               (key, ))
+            return default
+
+        if now - row[5] >= const.ESI_RESPONSE_ACCESS_INTERVAL:
+            connection.execute(
+                'UPDATE esi_responses SET accessed = ? WHERE key = ?',
+                (now, key))
+        return CachedResponse(
+            status_code=row[0],
+            headers=CaseInsensitiveDict(json.loads(row[1])),
+            content=bytes(row[2]),
+            url=row[3])
+
+    def set(self, key, value, timeout=300):
+        """Store the response for key for timeout seconds
+
+        :type value: esipy.client.CachedResponse
+        """
+        if timeout <= 0 or not self._use_disk:
+            # NOTE: esipy asks for responses without an Expires header to be
+            # stored with a negative timeout, they would never be read back.
+            return
+
+        headers = json.dumps(dict(value.headers))
+        size = len(headers) + len(value.content)
+        now = time.time()
+        connection = self._connect()
+        connection.execute(
+            'INSERT OR REPLACE INTO esi_responses '
+            '(key, status, headers, content, url, size, expires, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (self._hash(key), value.status_code, headers,
+             sqlite3.Binary(value.content), value.url, size, now + timeout,
+             now))
+        self._evict(connection, now)
+
+    def invalidate(self, key):
+        """Remove the response stored for key if present"""
+        if self._use_disk:
+            self._connect().execute('DELETE FROM esi_responses WHERE key = ?',
+                                    (self._hash(key), ))
+
+    def _total(self, connection) -> int:
+        return connection.execute(
+            'SELECT total FROM esi_responses_size').fetchone()[0]
+
+    def _evict(self, connection, now):
+        """Drop expired then least recently read responses past max_bytes"""
+        total = self._total(connection)
+        if total <= self._max_bytes:
+            return
+
+        connection.execute('DELETE FROM esi_responses WHERE expires <= ?',
+                           (now, ))
+        total = self._total(connection)
+        evicted = []
+        rows = connection.execute(
+            'SELECT key, size FROM esi_responses ORDER BY accessed')
+        for key, size in rows:
+            if total <= self._max_bytes:
+                break
+            total -= size
+            evicted.append((key, ))
+        rows.close()
+        connection.executemany('DELETE FROM esi_responses WHERE key = ?',
+                               evicted)
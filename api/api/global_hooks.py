@@ -5,8 +5,13 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
+import time
 import traceback
-from flask import Flask, Response, current_app
+from flask import Flask, Response, current_app, g, request
+from flask_api import status
+
+from api import metrics
+from api.errors import ServiceUnavailableError
 
 
 def _set_headers(headers):
@@ -23,6 +28,19 @@ def _set_headers(headers):
             'X-CSRF-Token, Authorization')
 
 
+def _record_request(status_code):
+    start = g.get('request_start')
+    if start is None:
+        return
+
+    # NOTE: The route pattern rather than the path keeps one set of metrics
+    # per endpoint no matter which ids are requested.
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_LATENCY.observe(time.perf_counter() - start,
+                                 (endpoint, request.method))
+    metrics.HTTP_REQUESTS.inc((endpoint, request.method, status_code))
+
+
 def initialize_hooks(app: Flask) -> None:
     """Initializes the global flask hooks for the application
 
@@ -30,11 +48,28 @@ def initialize_hooks(app: Flask) -> None:
     'global' things that should take place on every request this application
     serves."""
 
+    @app.before_request
+    def _before_each_request():  # pylint: disable=unused-variable
+        g.request_start = time.perf_counter()
+        metrics.HTTP_IN_FLIGHT.inc()
+
     @app.after_request
     def _after_each_request(response):  # pylint: disable=unused-variable
         _set_headers(response.headers)
+        _record_request(response.status_code)
         return response
 
+    @app.teardown_request
+    def _teardown_each_request(_):  # pylint: disable=unused-variable
+        if g.pop('request_start', None) is not None:
+            metrics.HTTP_IN_FLIGHT.dec()
+
+    @app.errorhandler(ServiceUnavailableError)
+    def _on_busy(_):  # pylint: disable=unused-variable
+        headers = {'Retry-After': '1'}
+        _set_headers(headers)
+        return Response(None, status.HTTP_503_SERVICE_UNAVAILABLE, headers)
+
     @app.errorhandler(Exception)
     def _on_error(_):  # pylint: disable=unused-variable
         current_app.logger.error(traceback.format_exc())
@@ -5,26 +5,35 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
-from datetime import datetime
 from functools import wraps
-import logging
 
-from flask import request
+from flask import Response, g, request
+from flask_api import status
 
-import api.constants as const
+from api import domain
 
 
-def time_it(func):
-    """Emits the total time that the wrapped function took to execute"""
+def get_request_token():
+    """Get the session token from the Authorization header, if any"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' else None
+
+
+def requires_session(func):
+    """Rejects the request unless it carries a valid session token
+
+    The token is read from an "Authorization: Bearer <token>" header and the
+    matching session is made available to the wrapped function as g.session.
+    """
 
     @wraps(func)
     def _wrapped(*args, **kwargs):
-        logger = logging.getLogger(const.SYS_LOGGER_NAME)
-        start = datetime.now()
-        result = func(*args, **kwargs)
-        end = datetime.now()
-        logger.debug('%s took %s', request.full_path, end - start)
-        return result
+        session = domain.Session().validate(get_request_token())
+        if session is None:
+            return Response(None, status.HTTP_401_UNAUTHORIZED)
+
+        g.session = session
+        return func(*args, **kwargs)
 
     return _wrapped
 
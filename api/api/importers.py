@@ -0,0 +1,274 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import asyncio
+from collections import namedtuple
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import threading
+import time
+
+import api.constants as const
+from api.repos import NOT_MODIFIED, AsyncEveUniverseRepo
+
+ImportResult = namedtuple('ImportResult', ['saved', 'unchanged', 'errors'])
+ImportStage = namedtuple('ImportStage',
+                         ['name', 'key', 'fetch', 'fetch_many', 'repo',
+                          'children'])
+
+
+def fetch_concurrently(func, items, max_workers, executor=None):
+    """Apply func to every item using a bounded pool of worker threads
+
+    Results are yielded as (item, result, error) tuples in the order they
+    complete. At most twice max_workers calls are queued at any one time so
+    memory stays bounded no matter how many items are provided. The provided
+    executor is used when given, so callers fetching many small batches can
+    keep their threads between them, otherwise one is made for this call.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from fetch_concurrently(func, items, max_workers, executor)
+        return
+
+    items = iter(items)
+    max_pending = max_workers * 2
+
+    pending = {}
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_pending:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[executor.submit(func, item)] = item
+
+        if not pending:
+            break
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            error = future.exception()
+            yield (item, None if error else future.result(), error)
+
+
+def run_async(coroutine):
+    """Run a coroutine to completion from synchronous code
+
+    A new event loop is used every time so this works from job worker threads
+    as well as the main thread.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def _chunks(items, size):
+    """Yield lists of at most size items without reading items all at once"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class UniverseImporter(object):
+    """Class to house the import of the universe from the EVE APIs
+
+    Regions, constellations, solar systems and stargates are imported as a
+    chain of generators. Each stage reads ids from the stage before it in
+    batches, fetches and saves the documents it does not already have, and
+    passes the ids of their children on to the next stage. Only a few batches
+    are held in memory at once no matter how large the universe is, and since
+    documents already saved are skipped an interrupted import can simply be
+    run again to pick up where it left off. A forced run refreshes the saved
+    documents with conditional requests instead, only rewriting the ones that
+    changed.
+    """
+
+    def __init__(self,
+                 universe_api,
+                 region_repo,
+                 constellation_repo,
+                 system_repo,
+                 stargate_repo,
+                 max_workers=const.EVE_API_MAX_WORKERS,
+                 batch_size=const.IMPORT_BATCH_SIZE):
+        """
+        :param universe_api: The EVE API repo to fetch details from. Each
+                             batch is fetched from an event loop rather than
+                             worker threads when it is an
+                             AsyncEveUniverseRepo.
+        :type universe_api: api.repos.EveUniverseRepo
+
+        :param region_repo: The repo imported regions are saved to
+        :type region_repo: api.repos.RegionRepo
+
+        :param constellation_repo: The repo imported constellations are saved
+                                   to
+        :type constellation_repo: api.repos.ConstellationRepo
+
+        :param system_repo: The repo imported solar systems are saved to
+        :type system_repo: api.repos.SystemRepo
+
+        :param stargate_repo: The repo imported stargates are saved to
+        :type stargate_repo: api.repos.StargateRepo
+
+        :param max_workers: The number of concurrent fetches to allow per stage
+        :param batch_size: The number of documents to write per bulk write
+        """
+        self._universe_api = universe_api
+        self._max_workers = max_workers
+        self._batch_size = batch_size
+        api = universe_api
+        many = isinstance(api, AsyncEveUniverseRepo)
+        self._stages = [
+            ImportStage('region', 'region_id', api.get_region_details,
+                        many and api.get_region_details_many, region_repo,
+                        'constellations'),
+            ImportStage('constellation', 'constellation_id',
+                        api.get_constellation_details,
+                        many and api.get_constellation_details_many,
+                        constellation_repo, 'systems'),
+            ImportStage('system', 'system_id', api.get_system_details,
+                        many and api.get_system_details_many, system_repo,
+                        'stargates'),
+            ImportStage('stargate', 'stargate_id', api.get_stargate_details,
+                        many and api.get_stargate_details_many,
+                        stargate_repo, None),
+        ]
+        self._lock = threading.Lock()
+        self._saved = 0
+        self._unchanged = 0
+        self._completed = 0
+        self._total = 0
+        self._errors = {}
+
+    def _count(self, completed=0, discovered=0, progress=None):
+        with self._lock:
+            self._completed += completed
+            self._total += discovered
+            if progress and completed:
+                progress.update(self._completed, self._total)
+
+    def _children(self, stage, documents):
+        if not stage.children:
+            return
+
+        for document in documents:
+            child_ids = document.get(stage.children) or []
+            self._count(discovered=len(child_ids))
+            yield from child_ids
+
+    @staticmethod
+    async def _fetch_many(stage, ids, existing):
+        """Fetch ids with the async api, conditionally for existing ones"""
+        results = []
+        new_ids = [item_id for item_id in ids if item_id not in existing]
+        if new_ids:
+            results.extend(await stage.fetch_many(new_ids))
+        known_ids = [item_id for item_id in ids if item_id in existing]
+        if known_ids:
+            results.extend(await stage.fetch_many(known_ids, if_changed=True))
+        return results
+
+    def _run_stage(self, stage, ids, force, progress, executor):
+        """Import the documents for ids, yielding the ids of their children"""
+        logger = logging.getLogger(const.SYS_LOGGER_NAME)
+
+        for chunk in _chunks(ids, self._batch_size):
+            fields = [stage.key, stage.children or stage.key]
+            existing = {
+                document[stage.key]: document
+                for document in stage.repo.get_many(
+                    [{stage.key: item_id} for item_id in chunk], fields)
+            }
+            if not force:
+                self._count(len(existing), progress=progress)
+                yield from self._children(stage, existing.values())
+
+            def _fetch(item_id):
+                return stage.fetch(item_id, if_changed=item_id in existing)
+
+            pending = [i for i in chunk if force or i not in existing]
+            if stage.fetch_many:
+                fetched = run_async(
+                    self._fetch_many(stage, pending, existing))
+            else:
+                fetched = fetch_concurrently(_fetch, pending,
+                                             self._max_workers, executor)
+
+            batch = []
+            for item_id, details, error in fetched:
+                self._count(1, progress=progress)
+                if error:
+                    message = '%s %s failed to import: %s' % (
+                        stage.name.capitalize(), item_id, error)
+                    logger.warning(message)
+                    self._errors[(stage.name, item_id)] = error
+                    if progress:
+                        progress.error(message)
+                elif details is NOT_MODIFIED:
+                    self._unchanged += 1
+                    yield from self._children(stage, [existing[item_id]])
+                else:
+                    batch.append(details)
+
+            if batch:
+                stage.repo.save_many(batch)
+                self._saved += len(batch)
+                yield from self._children(stage, batch)
+
+    def run(self, region_ids=None, force=False,
+            progress=None) -> ImportResult:
+        """Import the provided regions and everything inside them
+
+        :param region_ids: The regions to import. Defaults to every region the
+                           EVE API knows about.
+        :param force: Refresh documents that are already saved. They are
+                      fetched conditionally, and only rewritten if changed.
+        :param progress: Optional progress handle to report to. The total
+                         grows as each stage discovers more to import.
+        :type progress: api.jobs.JobProgress
+        """
+        logger = logging.getLogger(const.SYS_LOGGER_NAME)
+        start = time.monotonic()
+        self._saved = self._unchanged = self._completed = self._total = 0
+        self._errors = {}
+
+        if region_ids is None:
+            region_ids = self._universe_api.get_region_ids()
+        region_ids = list(region_ids)
+        self._count(discovered=len(region_ids))
+
+        # NOTE: Each stage keeps one pool of threads for the whole run rather
+        # than starting a new one for every batch it fetches.
+        with ExitStack() as stack:
+            ids = iter(region_ids)
+            for stage in self._stages:
+                executor = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=self._max_workers))
+                ids = self._run_stage(stage, ids, force, progress, executor)
+            for _ in ids:
+                pass
+
+        logger.info(
+            'Imported %s universe documents in %.3fs with %s unchanged and %s '
+            'errors', self._saved, time.monotonic() - start, self._unchanged,
+            len(self._errors))
+        return ImportResult(self._saved, self._unchanged, self._errors)
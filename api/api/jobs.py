@@ -0,0 +1,131 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+import os
+import threading
+import traceback
+import uuid
+
+import api.constants as const
+from api import repos
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETE = 'complete'
+STATUS_FAILED = 'failed'
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+_EXECUTOR_PID = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the process wide pool that jobs are run on
+
+    NOTE: Under uWSGI the app needs to be run with enable-threads for the pool
+    to make progress between requests.
+    """
+    global _EXECUTOR, _EXECUTOR_PID  # pylint: disable=global-statement
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None or _EXECUTOR_PID != os.getpid():
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=int(os.environ.get(const.ENV_JOB_WORKERS, '2')))
+            _EXECUTOR_PID = os.getpid()
+        return _EXECUTOR
+
+
+class JobProgress(object):
+    """Handle given to a running job to report its progress"""
+
+    def __init__(self, job_repo: repos.JobRepo, job_id: str):
+        self._job_repo = job_repo
+        self._job_id = job_id
+        self._percent = 0
+
+    def update(self, completed, total):
+        """Record that completed of total units of work are finished
+
+        The job document is only written when the whole percentage changes so
+        reporting on every unit of work stays cheap.
+        """
+        percent = int(completed * 100 / total) if total else 0
+        if percent == self._percent and completed != total:
+            return
+
+        self._percent = percent
+        self._job_repo.update(self._job_id, {
+            'completed': completed,
+            'total': total,
+            'percentComplete': percent
+        })
+
+    def error(self, message):
+        """Record a non fatal error against the job"""
+        self._job_repo.update(self._job_id, {}, error=message)
+
+
+class JobRunner(object):
+    """Class to house running long operations in the background"""
+
+    def __init__(self, job_repo: repos.JobRepo = None, executor=None):
+        self._job_repo = job_repo or repos.JobRepo()
+        self._executor = executor
+
+    def submit(self, name, func) -> str:
+        """Queue func to be run in the background
+
+        :param name: A human readable name for the job
+        :param func: The callable to run. It is given a JobProgress to report
+                     through.
+        :return: The id of the created job
+        """
+        job_id = uuid.uuid4().hex
+        self._job_repo.save({
+            'jobId': job_id,
+            'name': name,
+            'status': STATUS_QUEUED,
+            'completed': 0,
+            'total': 0,
+            'percentComplete': 0,
+            'errors': [],
+            'createdAt': datetime.utcnow()
+        })
+
+        executor = self._executor or _get_executor()
+        executor.submit(self._run, job_id, func)
+        return job_id
+
+    def _run(self, job_id, func):
+        logger = logging.getLogger(const.SYS_LOGGER_NAME)
+        self._job_repo.update(job_id, {
+            'status': STATUS_RUNNING,
+            'startedAt': datetime.utcnow()
+        })
+
+        try:
+            func(JobProgress(self._job_repo, job_id))
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.error(traceback.format_exc())
+            self._job_repo.update(
+                job_id, {
+                    'status': STATUS_FAILED,
+                    'finishedAt': datetime.utcnow()
+                },
+                error=str(ex))
+        else:
+            self._job_repo.update(job_id, {
+                'status': STATUS_COMPLETE,
+                'percentComplete': 100,
+                'finishedAt': datetime.utcnow()
+            })
+
+    def get(self, job_id):
+        """Load the job with the provided id"""
+        return self._job_repo.get_by_keys({'jobId': job_id})
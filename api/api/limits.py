@@ -0,0 +1,229 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import asyncio
+import threading
+import time
+
+import api.constants as const
+from api.errors import ThrottledError
+from api import esi, metrics
+
+
+class TokenBucket(object):
+    """Process local token bucket
+
+    Tokens refill at rate per second up to burst. Callers that find the bucket
+    empty reserve the next token and sleep until it is due, so waiting callers
+    are served in order without polling.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: Tokens added per second
+        :param burst: The max tokens that can build up while idle
+        """
+        self._rate = rate
+        self._burst = burst or rate
+        self._tokens = self._burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _reserve(self, now) -> float:
+        """Take a token, returning the seconds until it may be used"""
+        with self._lock:
+            tokens, self._updated = refill(self._tokens, self._updated, now,
+                                           self._rate, self._burst)
+            self._tokens = tokens - 1
+            return delay_for(self._tokens, self._rate)
+
+    def acquire(self):
+        """Block until the caller may make its next call"""
+        delay = self._reserve(time.time())
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Wait on the event loop until the caller may make its next call"""
+        delay = self._reserve(time.time())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket shared by every worker through mongo
+
+    The bucket state is updated with compare and swap on a version number
+    bumped by every update, so concurrent workers never hand out the same
+    token twice. The last update time is a float that several updates can
+    leave unchanged, so it cannot tell them apart.
+    """
+
+    def __init__(self, limit_repo, name, rate, burst=None):
+        """
+        :param limit_repo: The repo the bucket state is kept in
+        :type limit_repo: api.repos.LimitRepo
+        :param name: The name of the bucket
+        :param rate: Tokens added per second
+        :param burst: The max tokens that can build up while idle
+        """
+        super().__init__(rate, burst)
+        self._limit_repo = limit_repo
+        self._name = name
+
+    def _reserve(self, now) -> float:
+        while True:
+            state = self._limit_repo.get_bucket(self._name)
+            if state is None:
+                version, tokens, updated = None, self._burst, now
+            else:
+                version = state['version']
+                tokens, updated = refill(state['tokens'], state['updated'],
+                                         now, self._rate, self._burst)
+            if self._limit_repo.swap_bucket(self._name, version, tokens - 1,
+                                            updated):
+                return delay_for(tokens - 1, self._rate)
+            now = time.time()
+
+
+def refill(tokens, updated, now, rate, burst):
+    """Get the tokens in a bucket after refilling it up to now"""
+    if updated is not None:
+        tokens = min(burst, tokens + max(0, now - updated) * rate)
+    return tokens, max(now, updated or now)
+
+
+def delay_for(tokens, rate) -> float:
+    """Seconds until a bucket holding tokens gets back to zero"""
+    return -tokens / rate if tokens < 0 else 0
+
+
+class ErrorBudget(object):
+    """Process local tracker of the ESI error limit
+
+    ESI reports how many more errors it will accept before the limit resets
+    on every response. Once that drops to the threshold calls are refused
+    with a ThrottledError carrying the time left until the reset, which the
+    retry wrapper either waits out or gives up on.
+    """
+
+    def __init__(self, threshold=const.EVE_API_ERROR_LIMIT_THRESHOLD):
+        """
+        :param threshold: The remaining errors at which calls stop
+        """
+        self._threshold = threshold
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        return self._state
+
+    def _store(self, remain, reset_at):
+        with self._lock:
+            self._state = {'remain': remain, 'resetAt': reset_at}
+
+    def check(self):
+        """Raise a ThrottledError while the error budget is spent"""
+        state = self._load()
+        if not state or state['remain'] > self._threshold:
+            return
+
+        wait = state['resetAt'] - time.time()
+        if wait > 0:
+            raise ThrottledError(
+                'ESI error budget spent, %s errors left' % state['remain'],
+                wait)
+
+    def record(self, response):
+        """Update the budget from the headers of an ESI response"""
+        try:
+            remain = int(esi.get_header(response, 'X-Esi-Error-Limit-Remain'))
+            reset = int(esi.get_header(response, 'X-Esi-Error-Limit-Reset'))
+        except (TypeError, ValueError):
+            return
+        self._store(remain, time.time() + reset)
+
+
+class SharedErrorBudget(ErrorBudget):
+    """Tracker of the ESI error limit shared by every worker through mongo
+
+    ESI counts errors per client address, so every worker on a host sees the
+    same limit. Sharing what was last reported lets a worker stop before it
+    spends errors another worker already used.
+    """
+
+    def __init__(self,
+                 limit_repo,
+                 name,
+                 threshold=const.EVE_API_ERROR_LIMIT_THRESHOLD):
+        """
+        :param limit_repo: The repo the budget state is kept in
+        :type limit_repo: api.repos.LimitRepo
+        :param name: The name of the budget
+        :param threshold: The remaining errors at which calls stop
+        """
+        super().__init__(threshold)
+        self._limit_repo = limit_repo
+        self._name = name
+        self._stored = None
+
+    def _load(self):
+        return self._limit_repo.get_budget(self._name)
+
+    def _store(self, remain, reset_at):
+        # NOTE: Every response in a window reports the same errors left and a
+        # reset counting down to the same moment, so only a change is written
+        # rather than one write per response.
+        stored = self._stored
+        if stored and stored[0] == remain and abs(stored[1] - reset_at) < 1:
+            return
+        self._stored = (remain, reset_at)
+        self._limit_repo.save_budget(self._name, remain, reset_at)
+
+
+class LimitedClient(object):
+    """Class to house sending ESI requests within the rate and error limits"""
+
+    def __init__(self, client, bucket, budget):
+        """
+        :param client: The client to send requests with
+        :type client: esipy.EsiClient
+        :param bucket: The limit on the request rate
+        :type bucket: TokenBucket
+        :param budget: The tracker of the ESI error limit
+        :type budget: ErrorBudget
+        """
+        self._client = client
+        self._bucket = bucket
+        self._budget = budget
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    @property
+    def bucket(self) -> TokenBucket:
+        """The limit on the request rate"""
+        return self._bucket
+
+    @property
+    def budget(self) -> ErrorBudget:
+        """The tracker of the ESI error limit"""
+        return self._budget
+
+    def request(self, req_and_resp, *args, **kwargs):
+        """Send the request once the limits allow it"""
+        # NOTE: Read before sending, preparing the request fills in the path
+        # parameters and a series per entity id would grow without bound.
+        operation = req_and_resp[0].path
+        self._budget.check()
+        self._bucket.acquire()
+        start = time.perf_counter()
+        response = self._client.request(req_and_resp, *args, **kwargs)
+        metrics.ESI_LATENCY.observe(time.perf_counter() - start,
+                                    (operation, response.status))
+        self._budget.record(response)
+        return response
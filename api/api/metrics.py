@@ -0,0 +1,236 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from bisect import bisect_left
+import threading
+
+from api import resilience
+
+# NOTE: Seconds. Wide enough to cover a cached read as well as a slow ESI call.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in pairs)
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """Value that only goes up, kept per combination of label values"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        """
+        :param name: The metric name
+        :param documentation: The help text shown with the metric
+        :param labels: The names of the labels the metric is kept by
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        """Add amount to the value for the label values"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+        """Get the value for the label values"""
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        """Yield (name, label text, value) for every value kept"""
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Gauge(Counter):
+    """Value that goes up and down, kept per combination of label values"""
+
+    type_name = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        """Take amount away from the value for the label values"""
+        self.inc(labels, -amount)
+
+    def set(self, value, labels=()):
+        """Replace the value for the label values"""
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(object):
+    """Distribution of observed values, kept per combination of label values
+
+    Only the bucket an observation falls in is counted when it is observed.
+    The cumulative counts Prometheus expects are worked out when rendering so
+    observing stays cheap.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        """
+        :param name: The metric name
+        :param documentation: The help text shown with the metric
+        :param labels: The names of the labels the metric is kept by
+        :param buckets: The upper bounds of the buckets, in ascending order
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        """Count a value for the label values"""
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [
+                    [0] * (len(self._buckets) + 1), 0, 0.0
+                ]
+            state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def get(self, labels=()) -> tuple:
+        """Get the count and sum of the values for the label values"""
+        with self._lock:
+            state = self._values.get(labels)
+            return (state[1], state[2]) if state else (0, 0.0)
+
+    def samples(self):
+        """Yield (name, label text, value) for every value kept"""
+        with self._lock:
+            values = sorted((labels, (list(state[0]), state[1], state[2]))
+                            for labels, state in self._values.items())
+        for labels, (counts, count, total) in values:
+            text = _format_labels(self.labels, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets + (float('inf'), ),
+                                           counts):
+                cumulative += bucket_count
+                bucket = ('le', _format_value(bound))
+                yield (self.name + '_bucket',
+                       _format_labels(self.labels, labels, bucket), cumulative)
+            yield self.name + '_count', text, count
+            yield self.name + '_sum', text, total
+
+
+class Registry(object):
+    """Class to house the metrics of this process
+
+    NOTE: Every worker process keeps its own metrics, so each scrape only
+    covers the worker that happened to answer it.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        """Create and register a counter"""
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()) -> Gauge:
+        """Create and register a gauge"""
+        return self._add(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        """Create and register a histogram"""
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector):
+        """Register a function returning extra metrics to render on demand"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type_name))
+            for name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (name, labels, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _collect_retries():
+    retries = Counter('corp_hq_retry_events_total',
+                      'Calls to unreliable dependencies by outcome',
+                      ('name', 'event'))
+    for key, value in resilience.get_stats().items():
+        name, _, event = key.rpartition('.')
+        retries.inc((name, event), value)
+    return [retries]
+
+
+REGISTRY = Registry()
+REGISTRY.add_collector(_collect_retries)
+
+HTTP_REQUESTS = REGISTRY.counter('corp_hq_http_requests_total',
+                                 'HTTP requests answered',
+                                 ('endpoint', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('corp_hq_http_request_duration_seconds',
+                                  'Time taken to answer HTTP requests',
+                                  ('endpoint', 'method'))
+HTTP_IN_FLIGHT = REGISTRY.gauge('corp_hq_http_requests_in_flight',
+                                'HTTP requests being answered')
+MONGO_LATENCY = REGISTRY.histogram('corp_hq_mongo_command_duration_seconds',
+                                   'Time taken by mongo commands',
+                                   ('collection', 'command'))
+MONGO_COMMANDS = REGISTRY.counter('corp_hq_mongo_commands_total',
+                                  'Mongo commands run by outcome',
+                                  ('collection', 'command', 'outcome'))
+MONGO_SLOW_COMMANDS = REGISTRY.counter(
+    'corp_hq_mongo_slow_commands_total',
+    'Mongo commands slower than CORP_HQ_MONGO_SLOW_MS',
+    ('collection', 'command'))
+ESI_LATENCY = REGISTRY.histogram('corp_hq_esi_request_duration_seconds',
+                                 'Time taken by requests to ESI',
+                                 ('operation', 'status'))
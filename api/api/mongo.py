@@ -0,0 +1,170 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+import api.constants as const
+from api import metrics
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENTS_PID = os.getpid()
+
+
+# NOTE: Where each command keeps the part worth logging when it is slow.
+_FILTER_FIELDS = {
+    'aggregate': 'pipeline',
+    'count': 'query',
+    'delete': 'deletes',
+    'distinct': 'query',
+    'find': 'filter',
+    'findAndModify': 'query',
+    'update': 'updates'
+}
+
+
+def filter_shape(value):
+    """Get the shape of a query with every value replaced by "?"
+
+    Field names and operators are kept so the query can be matched to the
+    code that sent it, without logging any of the data it was sent with.
+    Lists are reduced to the shape of their first item.
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(value[0])] if value else []
+    return '?'
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Records how long every mongo command takes and logs the slow ones
+
+    Commands are timed and counted per collection and command name. The ones
+    slower than slow_ms are also counted as slow and logged along with the
+    shape of their filter.
+    """
+
+    def __init__(self, slow_ms=None):
+        """
+        :param slow_ms: Milliseconds after which a command counts as slow.
+                        Defaults to CORP_HQ_MONGO_SLOW_MS.
+        """
+        self._slow_seconds = (slow_ms or float(
+            os.environ.get(const.ENV_MONGO_SLOW_MS, None) or
+            const.MONGO_SLOW_MS)) / 1000
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        name = event.command_name
+        collection = command.get('collection' if name == 'getMore' else name)
+        if not isinstance(collection, str):
+            collection = ''
+        # NOTE: Only the finished events carry a duration, and only the
+        # started event carries the command.
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection, command)
+
+    def succeeded(self, event):
+        self._finish(event, 'ok')
+
+    def failed(self, event):
+        self._finish(event, 'failed')
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            collection, command = self._pending.pop(
+                (event.connection_id, event.request_id), ('', None))
+
+        seconds = event.duration_micros / 1000000
+        labels = (collection, event.command_name)
+        metrics.MONGO_LATENCY.observe(seconds, labels)
+        metrics.MONGO_COMMANDS.inc(labels + (outcome, ))
+        if seconds < self._slow_seconds or command is None:
+            return
+
+        metrics.MONGO_SLOW_COMMANDS.inc(labels)
+        shape = {}
+        field = _FILTER_FIELDS.get(event.command_name)
+        if field in command:
+            shape[field] = filter_shape(command[field])
+        if 'sort' in command:
+            shape['sort'] = dict(command['sort'])
+        logging.getLogger(const.SYS_LOGGER_NAME).warning(
+            'Slow mongo %s on %s.%s took %.1fms: %s', event.command_name,
+            event.database_name, collection, seconds * 1000,
+            json.dumps(shape, sort_keys=True, default=str))
+
+
+COMMAND_MONITOR = CommandMonitor()
+
+
+def _client_options() -> dict:
+    """Compute the pool options for new clients from the environment"""
+    # NOTE: connect=False defers the first connection until an operation is
+    # issued. This keeps clients built in the uWSGI master from opening sockets
+    # that would then be shared with the forked workers.
+    options = {'connect': False, 'event_listeners': [COMMAND_MONITOR]}
+
+    max_pool_size = os.environ.get(const.ENV_MONGO_MAX_POOL_SIZE)
+    if max_pool_size:
+        options['maxPoolSize'] = int(max_pool_size)
+
+    wait_queue_timeout = os.environ.get(const.ENV_MONGO_WAIT_QUEUE_TIMEOUT_MS)
+    if wait_queue_timeout:
+        options['waitQueueTimeoutMS'] = int(wait_queue_timeout)
+
+    return options
+
+
+def get_client(host: str = None) -> MongoClient:
+    """Get the process wide client for the provided host
+
+    Clients are created on first use and shared by every caller in the process
+    after that. When the process has been forked since the client was created
+    the registry is discarded so the child builds clients of its own.
+
+    :param host: The host or mongo URI to connect to. Defaults to the host
+                 provided via the CORP_HQ_MONGO_HOST environment variable.
+    """
+    global _CLIENTS_PID  # pylint: disable=global-statement
+    host = host or os.environ.get(const.ENV_MONGO_HOST)
+
+    with _CLIENTS_LOCK:
+        if _CLIENTS_PID != os.getpid():
+            # NOTE: The inherited clients belong to the parent process. Closing
+            # them here would tear down the parents sockets so just drop them.
+            _CLIENTS.clear()
+            _CLIENTS_PID = os.getpid()
+
+        client = _CLIENTS.get(host)
+        if client is None:
+            client = MongoClient(host=host, **_client_options())
+            _CLIENTS[host] = client
+
+    return client
+
+
+def close_clients() -> None:
+    """Close and forget every client this process has created"""
+    with _CLIENTS_LOCK:
+        if _CLIENTS_PID == os.getpid():
+            for client in _CLIENTS.values():
+                client.close()
+        _CLIENTS.clear()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,115 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+import bcrypt
+
+import api.constants as const
+from api.errors import ServiceUnavailableError
+
+_EXECUTOR = None
+_EXECUTOR_PID = None
+_LOCK = threading.Lock()
+_PENDING = 0
+
+
+def _max_workers() -> int:
+    return int(
+        os.environ.get(const.ENV_HASH_WORKERS, None) or os.cpu_count() or 1)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the process wide pool that hashing is run on
+
+    NOTE: bcrypt releases the GIL while it works so threads are enough for
+    hashing to use every core, without the fork concerns of a process pool
+    inside uWSGI workers.
+    """
+    # pylint: disable=global-statement
+    global _EXECUTOR, _EXECUTOR_PID, _PENDING
+    with _LOCK:
+        if _EXECUTOR is None or _EXECUTOR_PID != os.getpid():
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_max_workers())
+            _EXECUTOR_PID = os.getpid()
+            _PENDING = 0
+        return _EXECUTOR
+
+
+def _release(_):
+    global _PENDING  # pylint: disable=global-statement
+    with _LOCK:
+        _PENDING -= 1
+
+
+class PasswordHasher(object):
+    """Class to house hashing and checking passwords off the request thread
+
+    Work is queued on a process wide pool. Once more than max_queue hashes are
+    waiting new work is refused with a ServiceUnavailableError rather than
+    letting requests pile up behind a login storm.
+    """
+
+    def __init__(self, rounds=None, max_queue=None):
+        """
+        :param rounds: The bcrypt work factor for new hashes
+        :param max_queue: The max hashes allowed to be waiting or running
+        """
+        self._rounds = rounds or int(
+            os.environ.get(const.ENV_BCRYPT_ROUNDS, const.BCRYPT_ROUNDS))
+        self._max_queue = max_queue or int(
+            os.environ.get(const.ENV_HASH_QUEUE_LIMIT, None) or
+            _max_workers() * 4)
+
+    def _submit(self, func, *args):
+        global _PENDING  # pylint: disable=global-statement
+        executor = _get_executor()
+        with _LOCK:
+            if _PENDING >= self._max_queue:
+                raise ServiceUnavailableError('Password hashing queue full')
+            _PENDING += 1
+
+        future = executor.submit(func, *args)
+        future.add_done_callback(_release)
+        return future
+
+    def _hash(self, password: bytes) -> bytes:
+        return bcrypt.hashpw(password, bcrypt.gensalt(self._rounds))
+
+    def hash(self, password: bytes) -> bytes:
+        """Hash the provided password with the configured work factor"""
+        return self._submit(self._hash, password).result()
+
+    def hash_many(self, passwords) -> list:
+        """Hash the provided passwords in parallel, preserving order
+
+        Passwords are queued in chunks no larger than half the queue limit so
+        a large batch does not starve concurrent logins.
+        """
+        passwords = list(passwords)
+        chunk_size = max(1, self._max_queue // 2)
+        hashed = []
+        for start in range(0, len(passwords), chunk_size):
+            futures = [
+                self._submit(self._hash, p)
+                for p in passwords[start:start + chunk_size]
+            ]
+            hashed.extend(future.result() for future in futures)
+        return hashed
+
+    def check(self, password: bytes, hashed: bytes) -> bool:
+        """True if the password matches the hash, false otherwise"""
+        return self._submit(bcrypt.checkpw, password, hashed).result()
+
+    def needs_rehash(self, hashed: bytes) -> bool:
+        """True if the hash was made with a different work factor"""
+        try:
+            return int(hashed.split(b'$')[2]) != self._rounds
+        except (IndexError, ValueError):
+            return True
@@ -6,40 +6,76 @@ For full license details please see the LICENSE file located in the root folder
 of the project.
 """
 from abc import ABCMeta, abstractmethod
+import asyncio
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import hashlib
+import json
 import logging
 import os
-import random
-from time import sleep
+import re
+import threading
+import time
 
-import esipy
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
 from pymongo.collection import Collection
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import api.constants as const
+from api import caching, esi, limits, metrics, mongo, resilience
+from api.errors import TransientError
 
+_MISSING = object()
 
-def retry(limit):
-    """Retry wrapper for any method"""
+# NOTE: Returned by EVE API reads made with if_changed when the resource is
+# the same as when it was last read.
+NOT_MODIFIED = object()
 
-    def _wrap(func):
-        def _wrapped(*args, **kwargs):
-            logger = logging.getLogger(const.SYS_LOGGER_NAME)
-            tries = 0
-            while tries < limit:
-                try:
-                    tries += 1
-                    result = func(*args, **kwargs)
-                    return result
-                except Exception as ex:  # pylint: disable=broad-except
-                    sleep(random.randint(tries, tries * 3))
-                    if tries == limit:
-                        logger.error(ex)
-                        raise
-                    else:
-                        logger.warning(ex)
+_ESI_BREAKER = resilience.CircuitBreaker('esi')
+
+# NOTE: The error code mongo reports a unique index violation with.
+_DUPLICATE_KEY = 11000
+
+_HTTP_ERRORS = (asyncio.TimeoutError, OSError)
+if aiohttp is not None:
+    _HTTP_ERRORS += (aiohttp.ClientError, )
+
+IndexSpec = namedtuple('IndexSpec', ['keys', 'options', 'collection'])
+UserCredentials = namedtuple('UserCredentials', ['username', 'password'])
+
+
+# NOTE: The options that change how an index behaves. Any others, such as
+# background, only affect how it is built.
+_INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds',
+                  'partialFilterExpression')
+
+
+def index_spec(keys, collection=None, **options) -> IndexSpec:
+    """Declare an index a repo relies on
 
-        return _wrapped
+    :param keys: A field name or a list of (field, direction) pairs
+    :param collection: The collection to index when not the repo's own
+    :param options: The index options, such as unique or expireAfterSeconds
+    """
+    if isinstance(keys, str):
+        keys = [(keys, ASCENDING)]
+    return IndexSpec(tuple(keys), options, collection)
 
-    return _wrap
+
+def _index_name(keys) -> str:
+    """The name mongo gives an index on keys when it is not named"""
+    return '_'.join('%s_%s' % (field, direction) for field, direction in keys)
+
+
+def _index_options(info) -> dict:
+    return {
+        option: info[option]
+        for option in _INDEX_OPTIONS if info.get(option) not in (None, False)
+    }
 
 
 class BaseRepo:
@@ -48,8 +84,7 @@ class BaseRepo:
 
     def __init__(self, client: MongoClient = None):
         self._db = None
-        self._client = client or MongoClient(
-            host=os.environ.get(const.ENV_MONGO_HOST))
+        self._client = client or mongo.get_client()
 
     @property
     @abstractmethod
@@ -62,6 +97,141 @@ class BaseRepo:
     def _col(self) -> Collection:
         raise NotImplementedError
 
+    @property
+    def _indexes(self) -> list:
+        """The indexes the repo relies on
+
+        Every repo gets a unique index on its keys, which every lookup and
+        upsert by key filters on. Repos declare any others in _extra_indexes.
+        """
+        return [
+            index_spec([(key, ASCENDING) for key in self._keys], unique=True)
+        ] + self._extra_indexes
+
+    @property
+    def _extra_indexes(self) -> list:
+        return []
+
+    @staticmethod
+    def _index_usage(collection):
+        """Get the times each index was used since the server started
+
+        :return: The uses keyed by index name, None if the server won't say
+        """
+        try:
+            return {
+                stats['name']: stats['accesses']['ops']
+                for stats in collection.aggregate([{
+                    '$indexStats': {}
+                }])
+            }
+        # NOTE: mongomock raises NotImplementedError for $indexStats.
+        except (PyMongoError, NotImplementedError):
+            return None
+
+    def _diff_indexes(self):
+        """Yield (collection, name, keys, spec, status) for every index
+
+        Status is ok, missing, changed when the options differ from the spec,
+        or unknown for indexes in the database that are not declared.
+        """
+        collections = []
+        specs = {}
+        for spec in self._indexes:
+            collection = spec.collection or self._col
+            if collection.full_name not in specs:
+                collections.append(collection)
+                specs[collection.full_name] = []
+            specs[collection.full_name].append(spec)
+
+        for collection in collections:
+            existing = collection.index_information()
+            declared = set()
+            for spec in specs[collection.full_name]:
+                name = _index_name(spec.keys)
+                declared.add(name)
+                info = existing.get(name)
+                if info is None:
+                    status = 'missing'
+                elif _index_options(info) != _index_options(spec.options):
+                    status = 'changed'
+                else:
+                    status = 'ok'
+                yield collection, name, spec.keys, spec, status
+
+            for name, info in sorted(existing.items()):
+                if name != '_id_' and name not in declared:
+                    yield collection, name, info['key'], None, 'unknown'
+
+    def check_indexes(self) -> list:
+        """Compare the indexes in the database with the ones declared
+
+        :return: A dict per index with its collection, name, keys, status and
+                 whether it is unused. Unused is None when not known.
+        """
+        report = []
+        usage = {}
+        for collection, name, keys, _, status in self._diff_indexes():
+            if collection.full_name not in usage:
+                usage[collection.full_name] = self._index_usage(collection)
+            uses = usage[collection.full_name]
+            unused = None
+            if uses is not None and name in uses:
+                unused = uses[name] == 0
+            report.append({
+                'collection': collection.full_name,
+                'name': name,
+                'keys': [list(key) for key in keys],
+                'status': status,
+                'unused': unused
+            })
+        return report
+
+    def sync_indexes(self, drop_unknown=False) -> list:
+        """Create the declared indexes that are missing or changed
+
+        Safe to run as often as wanted, indexes that match are left alone.
+        Changed indexes are dropped and built again. Indexes that fail to
+        build, such as a unique index over duplicated keys, are reported as
+        failed rather than stopping the others.
+
+        :param drop_unknown: Drop indexes that are not declared
+        :return: A dict per index with its collection, name, keys and status
+        """
+        logger = logging.getLogger(const.SYS_LOGGER_NAME)
+        report = []
+        for collection, name, keys, spec, status in list(self._diff_indexes()):
+            entry = {
+                'collection': collection.full_name,
+                'name': name,
+                'keys': [list(key) for key in keys],
+                'status': status
+            }
+            report.append(entry)
+            try:
+                if status == 'unknown' and drop_unknown:
+                    collection.drop_index(name)
+                    entry['status'] = 'dropped'
+                elif status in ('missing', 'changed'):
+                    if status == 'changed':
+                        collection.drop_index(name)
+                    collection.create_index(
+                        list(keys), name=name, background=True,
+                        **spec.options)
+                    entry['status'] = ('created' if status == 'missing' else
+                                       'rebuilt')
+            except PyMongoError as ex:
+                entry['status'] = 'failed'
+                entry['error'] = str(ex)
+                logger.error('Index %s on %s failed to sync: %s', name,
+                             collection.full_name, ex)
+                continue
+
+            if entry['status'] != status:
+                logger.info('Index %s on %s %s', name, collection.full_name,
+                            entry['status'])
+        return report
+
     def _validate(self, item):
         for key in self._keys:
             if key not in item:
@@ -73,15 +243,194 @@ class BaseRepo:
             key_filter[key] = item[key]
         return key_filter
 
+    @staticmethod
+    def _build_projection(fields):
+        """Build the mongo projection for the requested fields
+
+        :param fields: None for whole documents, a list of field names or a
+                       namedtuple type whose fields should be loaded. An empty
+                       list loads everything except the mongo _id.
+        """
+        if fields is None:
+            return None
+        names = getattr(fields, '_fields', fields)
+        projection = {name: True for name in names}
+        projection.setdefault('_id', False)
+        return projection
+
+    @staticmethod
+    def _build_result(document, fields):
+        """Wrap the document in the requested result type, if any"""
+        if document is None or not hasattr(fields, '_fields'):
+            return document
+        return fields(*(document.get(name) for name in fields._fields))
+
     def save(self, item):
         """Save the provided item to the database after verification passes"""
         self._validate(item)
         self._col.replace_one(self._build_filter(item), item, upsert=True)
 
-    def get_by_keys(self, keys):
-        """Load the item from the database that matches the provided keys"""
+    def _build_multi_filter(self, items):
+        """Build a filter matching every one of the provided items"""
+        if len(self._keys) == 1:
+            key = self._keys[0]
+            return {key: {'$in': [item[key] for item in items]}}
+        return {'$or': [self._build_filter(item) for item in items]}
+
+    def _bulk_write(self, requests, ordered, batch_size):
+        """Run the requests in batches, yielding (offset, result) per batch"""
+        batch_size = batch_size or const.REPO_BATCH_SIZE
+        for offset in range(0, len(requests), batch_size):
+            batch = requests[offset:offset + batch_size]
+            yield offset, self._col.bulk_write(batch, ordered=ordered)
+
+    def save_many(self, items, ordered=False, batch_size=None):
+        """Save the provided items to the database using bulk writes
+
+        :param items: The items to upsert
+        :param ordered: Stop at the first failed write when True
+        :param batch_size: The max items sent per round trip
+        """
+        requests = []
+        for item in items:
+            self._validate(item)
+            requests.append(
+                ReplaceOne(self._build_filter(item), item, upsert=True))
+
+        for _ in self._bulk_write(requests, ordered, batch_size):
+            pass
+
+    def create_many(self, items, ordered=False, batch_size=None) -> set:
+        """Insert the provided items that do not already exist
+
+        Existing documents are left untouched.
+
+        :param items: The items to insert
+        :param ordered: Stop at the first failed write when True
+        :param batch_size: The max items sent per round trip
+        :return: The indexes of the items that were created
+        """
+        requests = []
+        for item in items:
+            self._validate(item)
+            requests.append(
+                UpdateOne(
+                    self._build_filter(item), {'$setOnInsert': item},
+                    upsert=True))
+
+        batch_size = batch_size or const.REPO_BATCH_SIZE
+        created = set()
+        for offset in range(0, len(requests), batch_size):
+            batch = requests[offset:offset + batch_size]
+            try:
+                upserted = self._col.bulk_write(
+                    batch, ordered=ordered).upserted_ids
+            except BulkWriteError as ex:
+                # NOTE: Two writers upserting the same new keys at once race
+                # on the unique index and the loser fails with a duplicate
+                # key error. That item already exists, the rest were written.
+                if ordered or any(error['code'] != _DUPLICATE_KEY
+                                  for error in ex.details['writeErrors']):
+                    raise
+                upserted = [item['index'] for item in ex.details['upserted']]
+            created.update(offset + index for index in upserted)
+        return created
+
+    def get_many(self, items, fields=None, batch_size=None) -> list:
+        """Load every item from the database matching the provided keys
+
+        :param items: The keys of the items to load
+        :param fields: Optional field names or namedtuple type to load
+        :param batch_size: The max keys sent per query
+        :return: The matching items in no particular order
+        """
+        items = list(items)
+        for item in items:
+            self._validate(item)
+
+        batch_size = batch_size or const.REPO_BATCH_SIZE
+        projection = self._build_projection(fields)
+        found = []
+        for offset in range(0, len(items), batch_size):
+            batch = items[offset:offset + batch_size]
+            found.extend(
+                self._build_result(document, fields)
+                for document in self._col.find(
+                    self._build_multi_filter(batch), projection))
+        return found
+
+    def remove_many(self, items, batch_size=None) -> int:
+        """Delete every item from the database matching the provided keys
+
+        :param items: The keys of the items to delete
+        :param batch_size: The max keys sent per delete
+        :return: The number of items deleted
+        """
+        items = list(items)
+        for item in items:
+            self._validate(item)
+
+        batch_size = batch_size or const.REPO_BATCH_SIZE
+        deleted = 0
+        for offset in range(0, len(items), batch_size):
+            batch = items[offset:offset + batch_size]
+            result = self._col.delete_many(self._build_multi_filter(batch))
+            deleted += result.deleted_count
+        return deleted
+
+    def find_page(self, query=None, after=None, limit=None, fields=None):
+        """Load one page of items ordered by the primary key
+
+        Pages are found by seeking past the last key of the previous page
+        rather than skipping, so late pages cost the same as early ones.
+
+        :param query: Optional filter the items must match
+        :param after: The primary key of the last item on the previous page
+        :param limit: The max items on the page
+        :param fields: Optional field names or namedtuple type to load
+        """
+        cursor = self._page_cursor(query, after, limit, fields)
+        return [self._build_result(document, fields) for document in cursor]
+
+    def _page_cursor(self, query=None, after=None, limit=None, fields=None):
+        key = self._keys[0]
+        query = dict(query or {})
+        if after is not None:
+            query[key] = {'$gt': after}
+
+        return self._col.find(query, self._build_projection(fields)).sort(
+            key, ASCENDING).limit(limit or const.PAGE_SIZE)
+
+    def iter_items(self, query=None, fields=None, batch_size=None):
+        """Yield every item matching the query ordered by the primary key
+
+        Documents are read from the server batch_size at a time as the items
+        are consumed, so memory stays flat no matter how many match.
+
+        :param query: Optional filter the items must match
+        :param fields: Optional field names or namedtuple type to load
+        :param batch_size: The max documents fetched per round trip
+        """
+        cursor = self._col.find(query or {}, self._build_projection(fields))
+        cursor = cursor.sort(self._keys[0], ASCENDING).batch_size(
+            batch_size or const.STREAM_BATCH_SIZE)
+        try:
+            for document in cursor:
+                yield self._build_result(document, fields)
+        finally:
+            # NOTE: Frees the server side cursor when the consumer stops
+            # early, such as a client hanging up mid response.
+            cursor.close()
+
+    def get_by_keys(self, keys, fields=None):
+        """Load the item from the database that matches the provided keys
+
+        :param keys: The filter to find the item with
+        :param fields: Optional field names or namedtuple type to load
+        """
         self._validate(keys)
-        return self._col.find_one(keys)
+        document = self._col.find_one(keys, self._build_projection(fields))
+        return self._build_result(document, fields)
 
     def remove(self, item):
         """Delete the item from the database that matches the provided keys"""
@@ -96,7 +445,12 @@ class BaseEveRepo:  # pylint: disable=too-few-public-methods
     _ESI_APP = None
     _ESI_CLIENT = None
 
-    def __init__(self, config_repo=None, app=None, client=None):
+    def __init__(self,
+                 config_repo=None,
+                 app=None,
+                 client=None,
+                 spec_cache=None,
+                 resource_repo=None):
         """ Initialize the components for the base Eve repository.
 
         :param config_repo: The config repo where connection details are stored
@@ -106,30 +460,150 @@ class BaseEveRepo:  # pylint: disable=too-few-public-methods
         :type app: esipy.App
 
         :param client: The esi client with which to execute requests
-        :type client: esipy.EsiClient
+        :type client: esi.EsiClient
+
+        :param spec_cache: The cache to build the esi application from
+        :type spec_cache: esi.SpecCache
+
+        :param resource_repo: Where the cache validators of each resource read
+                              from the EVE APIs are kept
+        :type resource_repo: EsiResourceRepo
         """
         self._config_repo = config_repo or ConfigRepo()
+        self._resource_repo = resource_repo or EsiResourceRepo()
 
         if not app and not BaseEveRepo._ESI_APP:
-            BaseEveRepo._ESI_APP = esipy.App.create(
-                url=self._config_repo.get_by_keys({
-                    'key': 'eve_api_url'
-                })['value'])
+            spec_cache = spec_cache or esi.SpecCache(spec_repo=EsiSpecRepo())
+            BaseEveRepo._ESI_APP = spec_cache.get_app(
+                self._config_repo.get_value('eve_api_url'),
+                on_change=BaseEveRepo._set_app)
 
         if not client and not BaseEveRepo._ESI_CLIENT:
-            BaseEveRepo._ESI_CLIENT = esipy.EsiClient(
-                retry_requests=True,
-                header={
-                    'User-Agent':
-                    self._config_repo.get_by_keys({
-                        'key': 'eve_api_user_agent'
-                    })['value']
-                },
-                raw_body_only=False)
+            BaseEveRepo._ESI_CLIENT = limits.LimitedClient(
+                esi.EsiClient(
+                    retry_requests=False,
+                    headers={
+                        'User-Agent':
+                        self._config_repo.get_value('eve_api_user_agent')
+                    },
+                    raw_body_only=False,
+                    cache=esi.ResponseCache()), *self._build_limits())
 
         self._app = app or BaseEveRepo._ESI_APP
         self._client = client or BaseEveRepo._ESI_CLIENT
 
+    @staticmethod
+    def _build_limits():
+        """Build the rate limit and error budget for the shared client
+
+        Both are kept in mongo when CORP_HQ_ESI_SHARED_LIMITS is set so every
+        worker talking to ESI is counted together.
+        """
+        rate = float(
+            os.environ.get(const.ENV_ESI_REQUESTS_PER_SECOND, None) or
+            const.EVE_API_REQUESTS_PER_SECOND)
+        burst = max(rate, const.EVE_API_BURST)
+        if os.environ.get(const.ENV_ESI_SHARED_LIMITS):
+            limit_repo = LimitRepo()
+            return (limits.SharedTokenBucket(limit_repo, 'esi-requests', rate,
+                                             burst),
+                    limits.SharedErrorBudget(limit_repo, 'esi-errors'))
+        return limits.TokenBucket(rate, burst), limits.ErrorBudget()
+
+    @staticmethod
+    def _set_app(app):
+        """Swap in a newer esi application for repos created from now on"""
+        BaseEveRepo._ESI_APP = app
+
+    @staticmethod
+    def _get_expires(response):
+        value = esi.get_header(response, 'Expires')
+        try:
+            expires = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if expires.tzinfo:
+            expires = expires.astimezone(timezone.utc).replace(tzinfo=None)
+        return expires
+
+    @staticmethod
+    def _hash(data):
+        body = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha1(body.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def _is_fresh(meta) -> bool:
+        """True if the last copy read has not expired yet"""
+        return bool(meta and meta.get('expires') and
+                    meta['expires'] > datetime.utcnow())
+
+    @staticmethod
+    def _conditional_headers(meta) -> dict:
+        """The headers making a request conditional on the validators kept
+        for the resource, when there are any"""
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('lastModified'):
+            headers['If-Modified-Since'] = meta['lastModified']
+        return headers
+
+    def _read_response(self, response, resource, meta):
+        """Get the result of a response and the validators to save for it
+
+        :return: The response data or NOT_MODIFIED, and the validators of the
+                 resource if they need saving
+        """
+        if meta and response.status == 304:
+            meta['expires'] = self._get_expires(response)
+            return NOT_MODIFIED, meta
+
+        if response.status != 200:
+            return response.data, None
+
+        digest = self._hash(response.data)
+        validators = {
+            'key': resource,
+            'etag': esi.get_header(response, 'ETag'),
+            'lastModified': esi.get_header(response, 'Last-Modified'),
+            'expires': self._get_expires(response),
+            'hash': digest
+        }
+        if meta and meta.get('hash') == digest:
+            return NOT_MODIFIED, validators
+        return response.data, validators
+
+    def _request(self, operation, resource, if_changed=False):
+        """Run the operation, remembering the validators of the resource
+
+        The ETag, Last-Modified and Expires headers and a hash of the body of
+        every successful read are saved. When if_changed is set those are
+        used to avoid the request entirely while the last copy has not
+        expired, to make the request conditional otherwise, and to spot
+        bodies that did not change even though the server sent them again.
+
+        :param operation: The request and response pair from the esi app
+        :param resource: The key to keep the validators under
+        :param if_changed: Return NOT_MODIFIED when the resource is unchanged
+        :return: The response data, or NOT_MODIFIED
+        """
+        meta = None
+        if if_changed:
+            meta = self._resource_repo.get_by_keys({'key': resource})
+        if self._is_fresh(meta):
+            return NOT_MODIFIED
+
+        headers = self._conditional_headers(meta)
+        if headers:
+            response = self._client.request(operation, headers=headers)
+        else:
+            response = self._client.request(operation)
+        response = esi.check_response(response)
+        result, validators = self._read_response(response, resource, meta)
+        if validators:
+            self._resource_repo.save(validators)
+        return result
+
 
 class RegionRepo(BaseRepo):
     """Class to house region specific data layer operations"""
@@ -151,6 +625,106 @@ class RegionRepo(BaseRepo):
         """True if there are any records in the database, false otherwise"""
         return self._col.count() != 0
 
+    @property
+    def _extra_indexes(self) -> list:
+        # NOTE: Region id first, pages filtered by a name prefix are still
+        # read in order without a sort and the name is checked from the index.
+        return [index_spec([('region_id', ASCENDING), ('name', ASCENDING)])]
+
+    def find_regions(self, after=None, limit=None, name_prefix=None,
+                     fields=None) -> list:
+        """Load one page of regions ordered by region id
+
+        :param after: The region id of the last region on the previous page
+        :param limit: The max regions on the page
+        :param name_prefix: Only load regions whose name starts with this
+        :param fields: Optional field names or namedtuple type to load
+        """
+        return self.find_page(
+            self._name_query(name_prefix), after, limit, fields)
+
+    def iter_regions(self, name_prefix=None, fields=None, batch_size=None):
+        """Yield every region ordered by region id, batch_size at a time
+
+        :param name_prefix: Only load regions whose name starts with this
+        :param fields: Optional field names or namedtuple type to load
+        :param batch_size: The max regions fetched per round trip
+        """
+        return self.iter_items(
+            self._name_query(name_prefix), fields, batch_size)
+
+    @staticmethod
+    def _name_query(name_prefix) -> dict:
+        query = {}
+        if name_prefix:
+            # NOTE: Anchored, case sensitive patterns are the only kind mongo
+            # can answer from the name index.
+            query['name'] = {'$regex': '^' + re.escape(name_prefix)}
+        return query
+
+
+class ConstellationRepo(BaseRepo):
+    """Class to house constellation specific data layer operations"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['eve-static-data']
+
+    @property
+    def _keys(self):
+        return ['constellation_id']
+
+    @property
+    def _col(self) -> Collection:
+        return self._db['constellations']
+
+    @property
+    def _extra_indexes(self) -> list:
+        return [index_spec('region_id')]
+
+
+class SystemRepo(BaseRepo):
+    """Class to house solar system specific data layer operations"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['eve-static-data']
+
+    @property
+    def _keys(self):
+        return ['system_id']
+
+    @property
+    def _col(self) -> Collection:
+        return self._db['systems']
+
+    @property
+    def _extra_indexes(self) -> list:
+        return [index_spec('constellation_id')]
+
+
+class StargateRepo(BaseRepo):
+    """Class to house stargate specific data layer operations"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['eve-static-data']
+
+    @property
+    def _keys(self):
+        return ['stargate_id']
+
+    @property
+    def _col(self) -> Collection:
+        return self._db['stargates']
+
+    @property
+    def _extra_indexes(self) -> list:
+        return [index_spec('system_id')]
+
 
 class SessionRepo(BaseRepo):
     """Class to house session specific data layer operations"""
@@ -168,9 +742,35 @@ class SessionRepo(BaseRepo):
     def _col(self) -> Collection:
         return self._db['sessions']
 
-    def apply_indexes(self):
-        """Apply session specific indexes to the database"""
-        self._col.create_index('expireAt', expireAfterSeconds=1)
+    @property
+    def _revocations_col(self) -> Collection:
+        return self._db['session_revocations']
+
+    @property
+    def _extra_indexes(self) -> list:
+        return [
+            index_spec('expireAt', expireAfterSeconds=1),
+            index_spec(
+                'revokedAt',
+                self._revocations_col,
+                expireAfterSeconds=const.SESSION_CACHE_TTL * 2)
+        ]
+
+    def publish_revocation(self, token):
+        """Let other workers know the provided token is no longer valid"""
+        self._revocations_col.insert_one({
+            'token': token,
+            'revokedAt': datetime.utcnow()
+        })
+
+    def get_revoked_tokens(self, since) -> list:
+        """Get the tokens revoked at or after the provided time"""
+        cursor = self._revocations_col.find({
+            'revokedAt': {
+                '$gte': since
+            }
+        }, {'token': True})
+        return [item['token'] for item in cursor]
 
 
 class UserRepo(BaseRepo):
@@ -189,9 +789,24 @@ class UserRepo(BaseRepo):
     def _col(self) -> Collection:
         return self._db['users']
 
+    def update_password(self, username, password):
+        """Replace the stored password hash of the provided user"""
+        self._col.update_one({'username': username},
+                             {'$set': {
+                                 'password': password
+                             }})
+
 
 class ConfigRepo(BaseRepo):
-    """Class to house system configuration specific data layer operations"""
+    """Class to house system configuration specific data layer operations
+
+    Lookups by key are served from a process wide cache. Entries expire after
+    a short TTL so changes made by other workers are picked up, and are dropped
+    immediately when this process saves or removes them.
+    """
+
+    _CACHE = caching.TTLCache(const.CONFIG_CACHE_TTL)
+    _WATCHING = False
 
     def __init__(self, client: MongoClient = None):
         super().__init__(client)
@@ -206,6 +821,201 @@ class ConfigRepo(BaseRepo):
     def _col(self):
         return self._db['config']
 
+    def save(self, item):
+        super().save(item)
+        ConfigRepo._CACHE.invalidate(item['key'])
+
+    def remove(self, item):
+        super().remove(item)
+        ConfigRepo._CACHE.invalidate(item['key'])
+
+    def save_many(self, items, ordered=False, batch_size=None):
+        items = list(items)
+        try:
+            super().save_many(items, ordered, batch_size)
+        finally:
+            for item in items:
+                ConfigRepo._CACHE.invalidate(item.get('key'))
+
+    def remove_many(self, items, batch_size=None) -> int:
+        items = list(items)
+        try:
+            return super().remove_many(items, batch_size)
+        finally:
+            for item in items:
+                ConfigRepo._CACHE.invalidate(item.get('key'))
+
+    def get_by_keys(self, keys, fields=None):
+        if set(keys) != {'key'} or fields is not None:
+            return super().get_by_keys(keys, fields)
+
+        item = ConfigRepo._CACHE.get(keys['key'], _MISSING)
+        if item is _MISSING:
+            item = super().get_by_keys(keys)
+            ConfigRepo._CACHE.set(keys['key'], item)
+
+        return None if item is None else dict(item)
+
+    def get_value(self, key, default=None):
+        """Get the value of the provided config key"""
+        item = self.get_by_keys({'key': key})
+        return default if item is None else item['value']
+
+    def watch_changes(self) -> bool:
+        """Clear the cache whenever any worker changes the configuration
+
+        Requires pymongo 3.6 or later and a MongoDB 3.6 or later replica set.
+
+        :return: True if a watcher is running, False if unsupported
+        """
+        if not hasattr(self._col, 'watch'):
+            return False
+
+        if ConfigRepo._WATCHING:
+            return True
+        ConfigRepo._WATCHING = True
+
+        def _watch():
+            logger = logging.getLogger(const.SYS_LOGGER_NAME)
+            try:
+                with self._col.watch() as stream:
+                    for _ in stream:
+                        ConfigRepo._CACHE.clear()
+            except PyMongoError as ex:
+                logger.warning('Config change stream stopped: %s', ex)
+            finally:
+                ConfigRepo._WATCHING = False
+
+        thread = threading.Thread(target=_watch, name='config-watch')
+        thread.daemon = True
+        thread.start()
+        return True
+
+
+class EsiSpecRepo(BaseRepo):
+    """Class to house cached ESI swagger spec data layer operations"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['corp-hq']
+
+    @property
+    def _keys(self):
+        return ['url']
+
+    @property
+    def _col(self):
+        return self._db['esi_specs']
+
+
+class EsiResourceRepo(BaseRepo):
+    """Class to house the cache validators of resources read from ESI"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['corp-hq']
+
+    @property
+    def _keys(self):
+        return ['key']
+
+    @property
+    def _col(self):
+        return self._db['esi_resources']
+
+
+class LimitRepo(BaseRepo):
+    """Class to house rate limit state shared between workers"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['corp-hq']
+
+    @property
+    def _keys(self):
+        return ['name']
+
+    @property
+    def _col(self):
+        return self._db['limits']
+
+    def get_bucket(self, name):
+        """Get the tokens, last update time and version of a token bucket"""
+        return self.get_by_keys({'name': name},
+                                ['tokens', 'updated', 'version'])
+
+    def swap_bucket(self, name, version, tokens, updated) -> bool:
+        """Store the new state of a token bucket if nobody else has since
+
+        :param version: The version of the state that was read, None if the
+                        bucket did not exist
+        :return: True if stored, False if the bucket changed in the meantime
+        """
+        if version is None:
+            try:
+                self._col.insert_one({
+                    'name': name,
+                    'tokens': tokens,
+                    'updated': updated,
+                    'version': 1
+                })
+                return True
+            except DuplicateKeyError:
+                return False
+
+        result = self._col.update_one({
+            'name': name,
+            'version': version
+        }, {
+            '$set': {
+                'tokens': tokens,
+                'updated': updated
+            },
+            '$inc': {
+                'version': 1
+            }
+        })
+        return result.modified_count == 1
+
+    def get_budget(self, name):
+        """Get the errors remaining and reset time of an error budget"""
+        return self.get_by_keys({'name': name}, ['remain', 'resetAt'])
+
+    def save_budget(self, name, remain, reset_at):
+        """Store the errors remaining and reset time of an error budget"""
+        self.save({'name': name, 'remain': remain, 'resetAt': reset_at})
+
+
+class JobRepo(BaseRepo):
+    """Class to house background job specific data layer operations"""
+
+    def __init__(self, client: MongoClient = None):
+        super().__init__(client)
+
+        self._db = self._client['corp-hq']
+
+    @property
+    def _keys(self):
+        return ['jobId']
+
+    @property
+    def _col(self):
+        return self._db['jobs']
+
+    def update(self, job_id, changes, error=None):
+        """Apply the provided changes and error, if any, to a job"""
+        update = {}
+        if changes:
+            update['$set'] = changes
+        if error:
+            update['$push'] = {'errors': error}
+
+        if update:
+            self._col.update_one({'jobId': job_id}, update)
+
 
 class EveRegionRepo(BaseEveRepo):
     """Class to house region operations against the eve APIs."""
@@ -214,35 +1024,264 @@ class EveRegionRepo(BaseEveRepo):
                  app=None,
                  client=None,
                  config_repo=None,
-                 region_repo=None):
+                 region_repo=None,
+                 resource_repo=None):
         """
         :param app:
         :type app: esipy.App
 
         :param client:
-        :type client: esipy.EsiClient
+        :type client: esi.EsiClient
 
         :param config_repo:
         :type config_repo: ConfigRepo
 
         :param region_repo:
         :type region_repo: RegionRepo
+
+        :param resource_repo:
+        :type resource_repo: EsiResourceRepo
         """
-        super().__init__(config_repo, app, client)
+        super().__init__(
+            config_repo, app, client, resource_repo=resource_repo)
 
         self._region_repo = region_repo or RegionRepo()
 
-    @retry(3)
+    @resilience.retry('esi', breaker=_ESI_BREAKER)
     def get_region_ids(self):
         """Gets available regions from the EVE API"""
         get_universe_regions = self._app.op['get_universe_regions']()
-        response = self._client.request(get_universe_regions)
+        response = esi.check_response(
+            self._client.request(get_universe_regions))
         return response.data
 
-    @retry(3)
-    def get_region_details(self, region_id):
-        """Gets details of a region from the EVE API"""
+    @resilience.retry('esi', breaker=_ESI_BREAKER)
+    def get_region_details(self, region_id, if_changed=False):
+        """Gets details of a region from the EVE API
+
+        :param if_changed: Return NOT_MODIFIED if the region has not changed
+                           since it was last fetched
+        """
         get_universe_regions_region_id = self._app.op[
             'get_universe_regions_region_id'](region_id=region_id)
-        response = self._client.request(get_universe_regions_region_id)
-        return response.data
+        return self._request(get_universe_regions_region_id,
+                             'region:%s' % region_id, if_changed)
+
+
+class EveUniverseRepo(EveRegionRepo):
+    """Class to house universe operations against the eve APIs.
+
+    Extends the region operations with the constellations, solar systems and
+    stargates that make up each region.
+    """
+
+    @resilience.retry('esi', breaker=_ESI_BREAKER)
+    def get_constellation_details(self, constellation_id, if_changed=False):
+        """Gets details of a constellation from the EVE API
+
+        :param if_changed: Return NOT_MODIFIED if the constellation has not
+                           changed since it was last fetched
+        """
+        operation = self._app.op[
+            'get_universe_constellations_constellation_id'](
+                constellation_id=constellation_id)
+        return self._request(operation, 'constellation:%s' % constellation_id,
+                             if_changed)
+
+    @resilience.retry('esi', breaker=_ESI_BREAKER)
+    def get_system_details(self, system_id, if_changed=False):
+        """Gets details of a solar system from the EVE API
+
+        :param if_changed: Return NOT_MODIFIED if the system has not changed
+                           since it was last fetched
+        """
+        operation = self._app.op['get_universe_systems_system_id'](
+            system_id=system_id)
+        return self._request(operation, 'system:%s' % system_id, if_changed)
+
+    @resilience.retry('esi', breaker=_ESI_BREAKER)
+    def get_stargate_details(self, stargate_id, if_changed=False):
+        """Gets details of a stargate from the EVE API
+
+        :param if_changed: Return NOT_MODIFIED if the stargate has not changed
+                           since it was last fetched
+        """
+        operation = self._app.op['get_universe_stargates_stargate_id'](
+            stargate_id=stargate_id)
+        return self._request(operation, 'stargate:%s' % stargate_id,
+                             if_changed)
+
+
+class AsyncEveUniverseRepo(EveUniverseRepo):
+    """Class to house fetching many universe details from the EVE APIs at once
+
+    The *_many methods send their requests from an asyncio event loop over a
+    single pooled, keep-alive aiohttp session, with at most max_concurrency
+    requests in flight. They honor the same rate limit, error budget, circuit
+    breaker and cache validators as the synchronous methods, so both can be
+    used side by side. They do not read or fill the client's ResponseCache
+    though, so unexpired documents are only skipped through their validators.
+    """
+
+    def __init__(self,
+                 app=None,
+                 client=None,
+                 config_repo=None,
+                 region_repo=None,
+                 resource_repo=None,
+                 session_factory=None,
+                 max_concurrency=const.EVE_API_MAX_WORKERS):
+        """
+        :param session_factory: Builds the http session requests are sent
+                                with. Defaults to a pooled aiohttp session.
+        :param max_concurrency: The max requests in flight at once
+        """
+        super().__init__(app, client, config_repo, region_repo, resource_repo)
+
+        self._session_factory = session_factory or self._build_session
+        self._max_concurrency = max_concurrency
+        if isinstance(self._client, limits.LimitedClient):
+            self._bucket = self._client.bucket
+            self._budget = self._client.budget
+        else:
+            self._bucket, self._budget = self._build_limits()
+
+    def _build_session(self):
+        if aiohttp is None:
+            raise RuntimeError('aiohttp is required to use %s' %
+                               self.__class__.__name__)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self._max_concurrency),
+            headers={
+                'User-Agent': self._config_repo.get_value('eve_api_user_agent')
+            })
+
+    async def _send(self, session, operation, headers=None):
+        """Send the operation, returning the checked esi response
+
+        :param headers: Headers to send with this request only
+        """
+        request, response = operation
+        # NOTE: The path template, prepare fills in the path parameters.
+        path = request.path
+        schemes = [s for s in ('https', 'http') if s in request.schemes]
+        if not schemes:
+            raise ValueError('No schemes available: %s' % request.schemes)
+        request.prepare(scheme=schemes[0], handle_files=False)
+        header = dict(request.header)
+        header.update(headers or {})
+
+        self._budget.check()
+        await self._bucket.acquire_async()
+        start = time.perf_counter()
+        try:
+            async with session.get(
+                    request.url, params=request.query,
+                    headers=header) as raw:
+                body = await raw.read()
+        except _HTTP_ERRORS as ex:
+            raise TransientError('%s failed: %s' % (request.url, ex))
+        metrics.ESI_LATENCY.observe(time.perf_counter() - start,
+                                    (path, raw.status))
+
+        response.apply_with(
+            status=raw.status, header=list(raw.headers.items()), raw=body)
+        self._budget.record(response)
+        return esi.check_response(response)
+
+    @resilience.retry_async('esi', breaker=_ESI_BREAKER)
+    async def _fetch(self, session, operation_id, params, resource, meta):
+        operation = self._app.op[operation_id](**params)
+        if self._is_fresh(meta):
+            return NOT_MODIFIED, None
+
+        response = await self._send(session, operation,
+                                    self._conditional_headers(meta))
+        return self._read_response(response, resource, meta)
+
+    async def _request_many(self, operation_id, param, resource, ids,
+                            if_changed):
+        """Run the operation for every id, at most max_concurrency at a time
+
+        The validators of every resource are loaded and saved in bulk rather
+        than one at a time around each request.
+
+        :return: (id, result, error) tuples in the order they completed
+        """
+        ids = list(ids)
+        metas = {}
+        if if_changed:
+            metas = {
+                meta['key']: meta
+                for meta in self._resource_repo.get_many(
+                    [{'key': resource % item_id} for item_id in ids])
+            }
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        results = []
+        changed = []
+
+        async def _run(session, item_id):
+            key = resource % item_id
+            async with semaphore:
+                try:
+                    result, validators = await self._fetch(
+                        session, operation_id, {param: item_id}, key,
+                        metas.get(key))
+                except Exception as ex:  # pylint: disable=broad-except
+                    results.append((item_id, None, ex))
+                    return
+            results.append((item_id, result, None))
+            if validators:
+                changed.append(validators)
+
+        async with self._session_factory() as session:
+            await asyncio.gather(*[_run(session, item_id) for item_id in ids])
+
+        if changed:
+            self._resource_repo.save_many(changed)
+        return results
+
+    async def get_region_details_many(self, region_ids, if_changed=False):
+        """Gets details of many regions from the EVE API concurrently
+
+        :param if_changed: Return NOT_MODIFIED for regions that have not
+                           changed since they were last fetched
+        :return: (region_id, details, error) tuples in the order they
+                 completed
+        """
+        return await self._request_many('get_universe_regions_region_id',
+                                        'region_id', 'region:%s', region_ids,
+                                        if_changed)
+
+    async def get_constellation_details_many(self,
+                                             constellation_ids,
+                                             if_changed=False):
+        """Gets details of many constellations from the EVE API concurrently
+
+        :return: (constellation_id, details, error) tuples in the order they
+                 completed
+        """
+        return await self._request_many(
+            'get_universe_constellations_constellation_id', 'constellation_id',
+            'constellation:%s', constellation_ids, if_changed)
+
+    async def get_system_details_many(self, system_ids, if_changed=False):
+        """Gets details of many solar systems from the EVE API concurrently
+
+        :return: (system_id, details, error) tuples in the order they
+                 completed
+        """
+        return await self._request_many('get_universe_systems_system_id',
+                                        'system_id', 'system:%s', system_ids,
+                                        if_changed)
+
+    async def get_stargate_details_many(self, stargate_ids, if_changed=False):
+        """Gets details of many stargates from the EVE API concurrently
+
+        :return: (stargate_id, details, error) tuples in the order they
+                 completed
+        """
+        return await self._request_many('get_universe_stargates_stargate_id',
+                                        'stargate_id', 'stargate:%s',
+                                        stargate_ids, if_changed)
@@ -0,0 +1,272 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import asyncio
+from collections import Counter
+import functools
+import logging
+import random
+import socket
+import threading
+import time
+
+from pymongo.errors import ConnectionFailure
+import requests
+
+import api.constants as const
+from api.errors import CircuitOpenError, ThrottledError, TransientError
+
+_STATS = Counter()
+_STATS_LOCK = threading.Lock()
+
+_TRANSIENT_ERRORS = (TransientError, requests.ConnectionError,
+                     requests.Timeout, ConnectionFailure, socket.timeout,
+                     ConnectionError, TimeoutError)
+
+
+def _count(name, event):
+    with _STATS_LOCK:
+        _STATS['%s.%s' % (name, event)] += 1
+
+
+def get_stats() -> dict:
+    """Get the retry counters, keyed by "<name>.<event>"
+
+    Events are attempts, retries, gave_up (transient failures that used up
+    every attempt or would have waited too long) and short_circuited (calls
+    refused by an open circuit breaker).
+    """
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def reset_stats():
+    """Zero every retry counter"""
+    with _STATS_LOCK:
+        _STATS.clear()
+
+
+def is_transient(error) -> bool:
+    """True if the error is worth retrying, false for everything else
+
+    Only timeouts, dropped connections and errors explicitly raised as
+    TransientError count. Programming errors and bad requests fail at once.
+    """
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt, base_delay, max_delay) -> float:
+    """Seconds to wait before the next attempt
+
+    Exponential backoff with full jitter, so workers that failed together do
+    not all retry together.
+
+    :param attempt: The number of attempts made so far, starting at 1
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**(attempt - 1)))
+
+
+class CircuitBreaker(object):
+    """Class to house failing fast while a dependency is down
+
+    After failure_threshold transient failures in a row the circuit opens and
+    every call is refused with a CircuitOpenError for reset_timeout seconds.
+    Calls held back by a ThrottledError never reached the dependency and do
+    not count.
+    The first call after that is let through as a trial, closing the circuit
+    again if it succeeds and reopening it if it fails.
+    """
+
+    def __init__(self,
+                 name,
+                 failure_threshold=const.CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=const.CIRCUIT_RESET_TIMEOUT):
+        """
+        :param name: The name reported in errors and stats
+        :param failure_threshold: Failures in a row that open the circuit
+        :param reset_timeout: Seconds the circuit stays open for
+        """
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being refused"""
+        with self._lock:
+            return self._opened_at is not None and (
+                self._trial or
+                time.monotonic() - self._opened_at < self._reset_timeout)
+
+    def before_call(self):
+        """Raise a CircuitOpenError if the call should not be made"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+
+            elapsed = time.monotonic() - self._opened_at
+            if self._trial or elapsed < self._reset_timeout:
+                _count(self.name, 'short_circuited')
+                raise CircuitOpenError(
+                    '%s is unavailable, retry in %.1fs' %
+                    (self.name, max(0, self._reset_timeout - elapsed)))
+            self._trial = True
+
+    def record_success(self):
+        """Close the circuit"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_skipped(self):
+        """Forget a call that was held back before reaching the dependency
+
+        It says nothing about the dependency, so it is not counted either way,
+        but a held back trial lets the next call be the trial instead.
+        """
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        """Count a transient failure, opening the circuit past the limit"""
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self._failure_threshold:
+                if self._opened_at is None or self._trial:
+                    logging.getLogger(const.SYS_LOGGER_NAME).warning(
+                        'Circuit for %s opened after %s failures', self.name,
+                        self._failures)
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+def _failure_delay(name, attempt, attempts, base_delay, max_delay, breaker,
+                   transient, error):
+    """Seconds to wait before retrying after error, None to give up"""
+    if not transient(error):
+        # NOTE: The dependency answered, it just did not like what it was
+        # asked.
+        if breaker:
+            breaker.record_success()
+        return None
+
+    logger = logging.getLogger(const.SYS_LOGGER_NAME)
+    if breaker and isinstance(error, ThrottledError):
+        breaker.record_skipped()
+    elif breaker:
+        breaker.record_failure()
+    delay = max(
+        backoff_delay(attempt, base_delay, max_delay),
+        getattr(error, 'retry_after', None) or 0)
+    if attempt >= attempts or delay > max_delay:
+        _count(name, 'gave_up')
+        logger.error('%s failed after %s attempts: %s', name, attempt, error)
+        return None
+
+    _count(name, 'retries')
+    logger.warning('%s failed, retrying in %.2fs: %s', name, delay, error)
+    return delay
+
+
+def retry(name,
+          attempts=const.RETRY_ATTEMPTS,
+          base_delay=const.RETRY_BASE_DELAY,
+          max_delay=const.RETRY_MAX_DELAY,
+          breaker=None,
+          transient=is_transient):
+    """Retry wrapper for calls to unreliable dependencies
+
+    Transient errors are retried with exponential backoff and jitter. When a
+    TransientError carries a retry_after longer than max_delay the call gives
+    up straight away rather than stalling the worker. Any other error is
+    raised without retrying. The last error is raised as soon as the final
+    attempt fails.
+
+    :param name: The name the retries are counted under
+    :param attempts: The max number of calls to make
+    :param base_delay: Seconds to wait after the first failure
+    :param max_delay: The max seconds to wait between attempts
+    :param breaker: Optional circuit breaker guarding the dependency
+    :type breaker: CircuitBreaker
+    :param transient: Decides which errors are worth retrying
+    """
+
+    def _wrap(func):
+        @functools.wraps(func)
+        def _wrapped(*args, **kwargs):
+            attempt = 0
+            while True:
+                attempt += 1
+                if breaker:
+                    breaker.before_call()
+                _count(name, 'attempts')
+
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as ex:  # pylint: disable=broad-except
+                    delay = _failure_delay(name, attempt, attempts,
+                                           base_delay, max_delay, breaker,
+                                           transient, ex)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    continue
+
+                if breaker:
+                    breaker.record_success()
+                return result
+
+        return _wrapped
+
+    return _wrap
+
+
+def retry_async(name,
+                attempts=const.RETRY_ATTEMPTS,
+                base_delay=const.RETRY_BASE_DELAY,
+                max_delay=const.RETRY_MAX_DELAY,
+                breaker=None,
+                transient=is_transient):
+    """Retry wrapper for coroutines calling unreliable dependencies
+
+    Works the same as retry, but waits between attempts with asyncio.sleep so
+    the other calls on the event loop carry on in the meantime.
+    """
+
+    def _wrap(func):
+        @functools.wraps(func)
+        async def _wrapped(*args, **kwargs):
+            attempt = 0
+            while True:
+                attempt += 1
+                if breaker:
+                    breaker.before_call()
+                _count(name, 'attempts')
+
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as ex:  # pylint: disable=broad-except
+                    delay = _failure_delay(name, attempt, attempts,
+                                           base_delay, max_delay, breaker,
+                                           transient, ex)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+
+                if breaker:
+                    breaker.record_success()
+                return result
+
+        return _wrapped
+
+    return _wrap
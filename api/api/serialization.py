@@ -0,0 +1,173 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import base64
+from datetime import date, datetime, timezone
+import json
+import os
+import threading
+
+from bson import ObjectId
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+import api.constants as const
+
+_SERIALIZER = None
+_LOCK = threading.Lock()
+
+
+def _format_datetime(value) -> str:
+    """Format a datetime as RFC 3339 in UTC, to the second
+
+    Naive datetimes are taken to already be in UTC, as everything this
+    service stores is.
+    """
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc)
+    # NOTE: Formatted by hand, strftime takes twice as long.
+    return '%04d-%02d-%02dT%02d:%02d:%02dZ' % (
+        value.year, value.month, value.day, value.hour, value.minute,
+        value.second)
+
+
+def to_json(value):
+    """Convert a value json cannot encode into one it can
+
+    Datetimes become RFC 3339 strings, ObjectIds their hex string and bytes
+    their base64 encoding.
+    """
+    if isinstance(value, datetime):
+        return _format_datetime(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError('%r is not JSON serializable' % (value, ))
+
+
+class JsonSerializer(object):
+    """Serializer backed by the standard library json module"""
+
+    name = 'json'
+    _ENCODER = json.JSONEncoder(separators=(',', ':'), default=to_json)
+
+    def dumps(self, value) -> bytes:
+        """Serialize the value to UTF-8 encoded JSON"""
+        return self._ENCODER.encode(value).encode('utf8')
+
+
+class OrjsonSerializer(JsonSerializer):
+    """Serializer backed by orjson
+
+    Datetimes are passed through to to_json, orjson would keep the offset of
+    aware ones rather than converting them to UTC.
+    """
+
+    name = 'orjson'
+
+    def dumps(self, value) -> bytes:
+        return orjson.dumps(
+            value,
+            default=to_json,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+def _encode_bytes(value):
+    """Copy value with any bytes in it base64 encoded, as to_json does"""
+    if isinstance(value, dict):
+        return {key: _encode_bytes(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_encode_bytes(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return to_json(value)
+    return value
+
+
+class UjsonSerializer(JsonSerializer):
+    """Serializer backed by ujson
+
+    ujson handles bytes itself and never passes them to default, raising or
+    writing them as text depending on its version. They are base64 encoded
+    beforehand, which walks the whole value, so ujson is only used when asked
+    for by name.
+    """
+
+    name = 'ujson'
+
+    def dumps(self, value) -> bytes:
+        return ujson.dumps(
+            _encode_bytes(value),
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+            default=to_json).encode('utf8')
+
+
+# NOTE: Fastest first.
+_SERIALIZERS = (OrjsonSerializer, UjsonSerializer, JsonSerializer)
+_AUTOMATIC = (OrjsonSerializer, JsonSerializer)
+
+
+def _is_installed(name) -> bool:
+    modules = {'orjson': orjson, 'ujson': ujson, 'json': json}
+    return modules.get(name) is not None
+
+
+def build_serializer(name=None) -> JsonSerializer:
+    """Build the serializer with the provided name
+
+    :param name: orjson, ujson or json. Defaults to orjson when installed,
+                 otherwise json.
+    :raises ValueError: When the serializer is unknown or not installed
+    """
+    if name is None:
+        name = next(serializer_type.name for serializer_type in _AUTOMATIC
+                    if _is_installed(serializer_type.name))
+
+    for serializer_type in _SERIALIZERS:
+        if serializer_type.name == name:
+            if not _is_installed(name):
+                raise ValueError('%s is not installed' % name)
+            return serializer_type()
+    raise ValueError('Unknown JSON serializer: %s' % name)
+
+
+def get_serializer() -> JsonSerializer:
+    """Get the process wide serializer
+
+    Built on first use from CORP_HQ_JSON_SERIALIZER when set, otherwise orjson
+    is used when installed and json when not.
+    """
+    global _SERIALIZER  # pylint: disable=global-statement
+    if _SERIALIZER is None:
+        with _LOCK:
+            if _SERIALIZER is None:
+                _SERIALIZER = build_serializer(
+                    os.environ.get(const.ENV_JSON_SERIALIZER) or None)
+    return _SERIALIZER
+
+
+def reset_serializer():
+    """Forget the process wide serializer so the next use builds it again"""
+    global _SERIALIZER  # pylint: disable=global-statement
+    with _LOCK:
+        _SERIALIZER = None
+
+
+def dumps(value) -> bytes:
+    """Serialize the value to UTF-8 encoded JSON with the serializer in use"""
+    return get_serializer().dumps(value)
@@ -15,7 +15,8 @@ from os import path
 
 import flask
 
-from api import global_hooks
+import api.constants as const
+from api import domain, global_hooks, repos
 
 CURRENT_DIR = path.abspath(__file__).replace('.pyc', '.py').replace(
     'server.py', '')
@@ -71,4 +72,13 @@ def build_app() -> flask.Flask:
     _register_blueprints(app)
     global_hooks.initialize_hooks(app)
 
+    if (os.environ.get(const.ENV_CONFIG_WATCH)
+            and not repos.ConfigRepo().watch_changes()):
+        logging.getLogger(const.SYS_LOGGER_NAME).warning(
+            '%s is set but change streams need pymongo 3.6 or later, config '
+            'is refreshed every %s seconds instead', const.ENV_CONFIG_WATCH,
+            const.CONFIG_CACHE_TTL)
+    if os.environ.get(const.ENV_SYNC_INDEXES):
+        domain.Indexes().sync()
+
     return app
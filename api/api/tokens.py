@@ -0,0 +1,80 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import base64
+import binascii
+from datetime import datetime
+import hashlib
+import hmac
+import os
+import struct
+
+_EPOCH = datetime(1970, 1, 1)
+_EXPIRY = struct.Struct('>I')
+_MAC_SIZE = 16
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _mac(secret: bytes, body: bytes) -> bytes:
+    return hmac.new(secret, body, hashlib.sha256).digest()[:_MAC_SIZE]
+
+
+def generate_token(size=32) -> str:
+    """Generate a random URL safe token from size bytes of OS entropy"""
+    return _encode(os.urandom(size))
+
+
+def is_signed(token: str) -> bool:
+    """True if the token was produced by sign_token, false otherwise"""
+    return '.' in token
+
+
+def sign_token(expires: datetime, secret: bytes, size=16) -> str:
+    """Generate a random token that carries its own expiry and signature
+
+    The token is laid out as "<random bytes + expiry>.<hmac>" with both parts
+    base64 encoded so that it can be checked with verify_token without looking
+    it up anywhere.
+
+    :param expires: The naive UTC time the token stops being valid at
+    :param secret: The key used to sign the token
+    :param size: The number of random bytes to include
+    """
+    seconds = int((expires - _EPOCH).total_seconds())
+    body = os.urandom(size) + _EXPIRY.pack(seconds)
+    return _encode(body) + '.' + _encode(_mac(secret, body))
+
+
+def verify_token(token: str, secret: bytes, now: datetime = None):
+    """Check the signature and expiry of a token built by sign_token
+
+    :return: The naive UTC expiry of the token when it is valid, None when it is
+             malformed, forged or expired.
+    """
+    try:
+        encoded_body, encoded_mac = token.split('.')
+        body = _decode(encoded_body)
+        mac = _decode(encoded_mac)
+    except (ValueError, binascii.Error):
+        return None
+
+    if len(body) <= _EXPIRY.size or not hmac.compare_digest(
+            mac, _mac(secret, body)):
+        return None
+
+    seconds, = _EXPIRY.unpack(body[-_EXPIRY.size:])
+    expires = datetime.utcfromtimestamp(seconds)
+    if expires <= (now or datetime.utcnow()):
+        return None
+    return expires
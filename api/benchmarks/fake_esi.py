@@ -0,0 +1,330 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+
+Local stand-in for the ESI endpoints the universe importers use.
+
+Serves the recorded swagger spec from tests/fixtures along with a generated,
+deterministic universe. Latency, the share of requests failing with a 502 and
+the ESI error limit are all configurable, so imports can be measured offline
+and the same run gives the same failures every time.
+
+    python -m benchmarks.fake_esi --regions 100 --latency 0.05
+"""
+import argparse
+from collections import Counter
+from contextlib import contextmanager
+from email.utils import formatdate
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+SPEC = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'fixtures', 'swagger.json')
+BASE_PATH = '/latest'
+
+REGION_BASE = 10000000
+CONSTELLATION_BASE = 20000000
+SYSTEM_BASE = 30000000
+STARGATE_BASE = 50000000
+
+_ROUTE = re.compile(r'^/latest/universe/(\w+)/(?:(\d+)/)?$')
+
+
+class FakeEsi(object):
+    """WSGI application answering like ESI for a generated universe
+
+    Every region has the same number of constellations and every
+    constellation the same number of systems. The systems of a constellation
+    are joined in a ring by a stargate each.
+
+    Whether a request fails is decided from the seed, its path and how many
+    times that path was asked for, so the order concurrent requests arrive in
+    does not change which ones fail.
+    """
+
+    def __init__(self,
+                 regions=10,
+                 constellations=3,
+                 systems=4,
+                 latency=0.0,
+                 error_rate=0.0,
+                 error_limit=100,
+                 error_window=60,
+                 expires=300,
+                 seed=0):
+        """
+        :param regions: The regions in the universe
+        :param constellations: The constellations in every region
+        :param systems: The systems in every constellation
+        :param latency: Seconds every response is delayed by
+        :param error_rate: The share of requests that fail with a 502
+        :param error_limit: The errors allowed per window before every
+                            request is refused with a 420
+        :param error_window: Seconds until the error limit resets
+        :param expires: Seconds responses may be cached for
+        :param seed: Changes which requests fail
+        """
+        self.regions = regions
+        self.constellations = constellations
+        self.systems = systems
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_limit = error_limit
+        self.error_window = error_window
+        self.expires = expires
+        self.seed = seed
+
+        with open(SPEC) as spec_file:
+            self._spec = json.load(spec_file)
+        self._attempts = Counter()
+        self._statuses = Counter()
+        self._errors_remain = error_limit
+        self._window_ends = None
+        self._lock = threading.Lock()
+
+    def region_ids(self) -> list:
+        """The ids of every region in the universe"""
+        return [REGION_BASE + index + 1 for index in range(self.regions)]
+
+    def stats(self) -> dict:
+        """Get the requests answered so far, keyed by status code"""
+        with self._lock:
+            return dict(self._statuses)
+
+    def _children(self, base, parent_index, count):
+        return [base + parent_index * count + index + 1
+                for index in range(count)]
+
+    @staticmethod
+    def _position(entity_id):
+        return {'x': float(entity_id), 'y': 0.0, 'z': -float(entity_id)}
+
+    def _region(self, region_id):
+        index = region_id - REGION_BASE - 1
+        if not 0 <= index < self.regions:
+            return None
+        return {
+            'region_id': region_id,
+            'name': 'Region %s' % (index + 1),
+            'constellations': self._children(CONSTELLATION_BASE, index,
+                                             self.constellations)
+        }
+
+    def _constellation(self, constellation_id):
+        index = constellation_id - CONSTELLATION_BASE - 1
+        if not 0 <= index < self.regions * self.constellations:
+            return None
+        return {
+            'constellation_id': constellation_id,
+            'name': 'Constellation %s' % (index + 1),
+            'position': self._position(constellation_id),
+            'region_id': REGION_BASE + index // self.constellations + 1,
+            'systems': self._children(SYSTEM_BASE, index, self.systems)
+        }
+
+    def _system(self, system_id):
+        index = system_id - SYSTEM_BASE - 1
+        if not 0 <= index < self.regions * self.constellations * self.systems:
+            return None
+        return {
+            'system_id': system_id,
+            'name': 'System %s' % (index + 1),
+            'position': self._position(system_id),
+            'security_status': 0.5,
+            'constellation_id':
+            CONSTELLATION_BASE + index // self.systems + 1,
+            'stargates': [STARGATE_BASE + index + 1]
+        }
+
+    def _stargate(self, stargate_id):
+        system_index = stargate_id - STARGATE_BASE - 1
+        system = self._system(SYSTEM_BASE + system_index + 1)
+        if system is None:
+            return None
+        # NOTE: The gate leads to the next system of the same constellation.
+        first = system_index - system_index % self.systems
+        target = first + (system_index + 1) % self.systems
+        return {
+            'stargate_id': stargate_id,
+            'name': 'Stargate (%s)' % system['name'],
+            'position': self._position(stargate_id),
+            'system_id': system['system_id'],
+            'type_id': 16,
+            'destination': {
+                'stargate_id': STARGATE_BASE + target + 1,
+                'system_id': SYSTEM_BASE + target + 1
+            }
+        }
+
+    def _lookup(self, kind, entity_id):
+        if kind == 'regions' and entity_id is None:
+            return self.region_ids()
+        lookups = {
+            'regions': self._region,
+            'constellations': self._constellation,
+            'systems': self._system,
+            'stargates': self._stargate
+        }
+        if kind not in lookups or entity_id is None:
+            return None
+        return lookups[kind](int(entity_id))
+
+    def _spec_for(self, host):
+        spec = dict(self._spec)
+        spec['host'] = host
+        spec['schemes'] = ['http']
+        return spec
+
+    def _should_fail(self, path) -> bool:
+        """Decide if this request fails, counting the attempt"""
+        with self._lock:
+            self._attempts[path] += 1
+            attempt = self._attempts[path]
+        if not self.error_rate:
+            return False
+        draw = random.Random('%s:%s:%s' % (self.seed, path, attempt)).random()
+        return draw < self.error_rate
+
+    def _error_limit(self, failed):
+        """Count an error against the limit
+
+        :return: The errors remaining and seconds until the limit resets
+        """
+        with self._lock:
+            now = time.time()
+            if self._window_ends is None or now >= self._window_ends:
+                self._window_ends = now + self.error_window
+                self._errors_remain = self.error_limit
+            if failed:
+                self._errors_remain = max(0, self._errors_remain - 1)
+            return self._errors_remain, int(self._window_ends - now) + 1
+
+    def _respond(self, request):
+        path = request.path
+        if path == BASE_PATH + '/swagger.json':
+            return 200, self._spec_for(request.host), {}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        remain, reset = self._error_limit(False)
+        limit_headers = {
+            'X-Esi-Error-Limit-Remain': str(remain),
+            'X-Esi-Error-Limit-Reset': str(reset)
+        }
+        if remain <= 0:
+            return 420, {
+                'error': 'This software has exceeded the error limit for ESI.'
+            }, limit_headers
+
+        match = _ROUTE.match(path)
+        body = self._lookup(*match.groups()) if match else None
+        failed = body is None or self._should_fail(path)
+        if failed:
+            remain, reset = self._error_limit(True)
+            limit_headers['X-Esi-Error-Limit-Remain'] = str(remain)
+            limit_headers['X-Esi-Error-Limit-Reset'] = str(reset)
+            if body is None:
+                return 404, {'error': 'Not found'}, limit_headers
+            return 502, {'error': 'Bad gateway'}, limit_headers
+
+        limit_headers['Expires'] = formatdate(
+            time.time() + self.expires, usegmt=True)
+        return 200, body, limit_headers
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        status, body, headers = self._respond(request)
+
+        data = json.dumps(body).encode('utf8')
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        if status == 200:
+            headers['ETag'] = etag
+            if request.headers.get('If-None-Match') == etag:
+                status, data = 304, b''
+
+        with self._lock:
+            self._statuses[status] += 1
+        response = Response(
+            data, status, headers, content_type='application/json')
+        return response(environ, start_response)
+
+
+@contextmanager
+def serve(fake_esi):
+    """Serve the fake on a free local port, yielding the swagger spec url
+
+    :type fake_esi: FakeEsi
+    """
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, fake_esi, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%s%s/swagger.json' % (server.server_port,
+                                                       BASE_PATH)
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def build_args_parse():
+    """Build the arg_parse object
+
+    :return: arg parse object
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description='Local stand-in for ESI')
+    parser.add_argument(
+        '--port', type=int, default=8999, help='the port to listen upon.')
+    parser.add_argument(
+        '--regions', type=int, default=10, help='the regions to serve.')
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='seconds every response is delayed by.')
+    parser.add_argument(
+        '--error-rate',
+        type=float,
+        default=0.0,
+        help='the share of requests that fail with a 502.')
+    parser.add_argument(
+        '--error-limit',
+        type=int,
+        default=100,
+        help='the errors allowed before requests are refused with a 420.')
+    parser.add_argument(
+        '--seed', type=int, default=0, help='changes which requests fail.')
+    return parser
+
+
+def main():
+    """Serve the fake until interrupted"""
+    args = build_args_parse().parse_args()
+    fake_esi = FakeEsi(
+        regions=args.regions,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_limit=args.error_limit,
+        seed=args.seed)
+    print('Serving the ESI spec at http://127.0.0.1:%s%s/swagger.json' %
+          (args.port, BASE_PATH))
+    make_server('127.0.0.1', args.port, fake_esi,
+                threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+
+Load test harness for the login hot path.
+
+Serves build_app() from a threaded WSGI server on a free local port, backed by
+mongomock or a local mongod, and sends requests at it from a pool of client
+threads. Reports requests per second and p50/p95/p99 latency per endpoint.
+
+    python -m benchmarks.load --requests 2000 --concurrency 20
+"""
+import argparse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+import uuid
+
+import mongomock
+import requests
+from werkzeug.serving import make_server
+
+import api.constants as const
+from api import mongo
+from api.server import build_app
+
+ENDPOINTS = ('health', 'login', 'register', 'logout')
+
+# NOTE: Logins share a few users registered up front rather than one each,
+# registering hashes a password which is what /register is measured on.
+LOGIN_USERS = 10
+
+LoadResult = namedtuple('LoadResult',
+                        ['endpoint', 'requests', 'errors', 'seconds',
+                         'latencies'])
+
+
+def percentile(latencies, pct) -> float:
+    """Nearest rank percentile of the sorted latencies"""
+    if not latencies:
+        return 0.0
+    rank = max(1, int(math.ceil(pct / 100.0 * len(latencies))))
+    return latencies[rank - 1]
+
+
+def summarize(result) -> dict:
+    """Get the throughput and latency percentiles of a run
+
+    Latencies are reported in milliseconds.
+    """
+    return {
+        'endpoint': result.endpoint,
+        'requests': result.requests,
+        'errors': result.errors,
+        'requestsPerSecond': result.requests / result.seconds
+                             if result.seconds else 0.0,
+        'p50': percentile(result.latencies, 50) * 1000,
+        'p95': percentile(result.latencies, 95) * 1000,
+        'p99': percentile(result.latencies, 99) * 1000
+    }  # yapf: disable
+
+
+@contextmanager
+def serve(mongo_host=None, bcrypt_rounds=None):
+    """Serve the application on a free local port, yielding its base url
+
+    :param mongo_host: The mongod to use. Defaults to an in memory mongomock.
+    :param bcrypt_rounds: The work factor new password hashes are made with
+    """
+    with ExitStack() as stack:
+        env = {}
+        if mongo_host:
+            env[const.ENV_MONGO_HOST] = mongo_host
+        else:
+            client = mongomock.MongoClient()
+            stack.enter_context(
+                patch.object(mongo, 'get_client', return_value=client))
+        if bcrypt_rounds:
+            env[const.ENV_BCRYPT_ROUNDS] = str(bcrypt_rounds)
+        stack.enter_context(patch.dict(os.environ, env))
+
+        app = build_app()
+        # NOTE: Logging every request would measure the log handler.
+        logging.getLogger(const.SYS_LOGGER_NAME).setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield 'http://127.0.0.1:%s' % server.server_port
+        finally:
+            server.shutdown()
+            thread.join()
+
+
+def _user():
+    username = 'load-%s' % uuid.uuid4().hex
+    return {
+        'username': username,
+        'password': 'load test password',
+        'email': username + '@example.com'
+    }
+
+
+def _register_users(session, base_url, count) -> list:
+    """Register count new users, returning the login payload of each"""
+    logins = []
+    for _ in range(count):
+        user = _user()
+        session.post(base_url + '/register', json=user).raise_for_status()
+        logins.append({'un': user['username'], 'pw': user['password']})
+    return logins
+
+
+def prepare(base_url, endpoint, count) -> list:
+    """Build the (method, url, payload) of every request to send
+
+    Logging in needs registered users and logging out needs live sessions,
+    so those are created up front and not counted in the results. Every
+    login checks a password hash, the same as a real one.
+    """
+    url = base_url + '/' + endpoint
+    if endpoint == 'health':
+        return [('GET', url, None)] * count
+    if endpoint == 'register':
+        return [('POST', url, _user()) for _ in range(count)]
+
+    with requests.Session() as session:
+        logins = _register_users(session, base_url, min(count, LOGIN_USERS))
+        logins = [logins[index % len(logins)] for index in range(count)]
+        if endpoint == 'login':
+            return [('POST', url, login) for login in logins]
+
+        tokens = []
+        for login in logins:
+            response = session.post(base_url + '/login', json=login)
+            response.raise_for_status()
+            tokens.append(response.json()['token'])
+    return [('POST', url, {'token': token}) for token in tokens]
+
+
+def send(endpoint, planned, concurrency) -> LoadResult:
+    """Send the planned requests from concurrency client threads
+
+    Any request that fails or answers with a 4xx or 5xx counts as an error.
+    Registrations answer 503 once more passwords are waiting to be hashed
+    than CORP_HQ_HASH_QUEUE_LIMIT allows.
+    """
+    local = threading.local()
+
+    def _send(request):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+
+        method, url, payload = request
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, json=payload)
+            failed = response.status_code >= 400
+        except requests.RequestException:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        outcomes = list(executor.map(_send, planned))
+    seconds = time.perf_counter() - start
+
+    return LoadResult(endpoint, len(outcomes),
+                      sum(1 for _, failed in outcomes if failed), seconds,
+                      sorted(latency for latency, _ in outcomes))
+
+
+def run_endpoint(base_url, endpoint, count, concurrency) -> LoadResult:
+    """Send count requests to the endpoint from concurrency client threads"""
+    return send(endpoint, prepare(base_url, endpoint, count), concurrency)
+
+
+def run(endpoints=ENDPOINTS, count=1000, concurrency=10, mongo_host=None,
+        bcrypt_rounds=None) -> list:
+    """Load test each endpoint in turn against a freshly served application
+
+    :return: The summary of each endpoint, in the order provided
+    """
+    with serve(mongo_host, bcrypt_rounds) as base_url:
+        return [
+            summarize(run_endpoint(base_url, endpoint, count, concurrency))
+            for endpoint in endpoints
+        ]
+
+
+def build_args_parse():
+    """Build the arg_parse object
+
+    :return: arg parse object
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        description='Load test the login hot path')
+    parser.add_argument(
+        '--endpoints',
+        nargs='+',
+        choices=ENDPOINTS,
+        default=list(ENDPOINTS),
+        help='the endpoints to load test.')
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=1000,
+        help='the requests to send to each endpoint.')
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=10,
+        help='the requests to keep in flight at once.')
+    parser.add_argument(
+        '--mongo-host',
+        default=None,
+        help='the local mongod to use instead of mongomock.')
+    parser.add_argument(
+        '--bcrypt-rounds',
+        type=int,
+        default=const.BCRYPT_ROUNDS,
+        help='the work factor for the passwords of new users.')
+    parser.add_argument(
+        '--max-p99-ms',
+        type=float,
+        default=None,
+        help='exit with an error when any endpoint is slower than this.')
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='print the results as json.')
+    return parser
+
+
+def main():
+    """Run the load test and print the results"""
+    args = build_args_parse().parse_args()
+    results = run(args.endpoints, args.requests, args.concurrency,
+                  args.mongo_host, args.bcrypt_rounds)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print('%-10s %8s %7s %10s %9s %9s %9s' %
+              ('endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms',
+               'p99 ms'))
+        for result in results:
+            print('%-10s %8d %7d %10.1f %9.2f %9.2f %9.2f' %
+                  (result['endpoint'], result['requests'], result['errors'],
+                   result['requestsPerSecond'], result['p50'], result['p95'],
+                   result['p99']))
+
+    failed = any(result['errors'] for result in results)
+    if args.max_p99_ms is not None:
+        failed = failed or any(result['p99'] > args.max_p99_ms
+                               for result in results)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
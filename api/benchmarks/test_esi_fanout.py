@@ -0,0 +1,126 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import asyncio
+import json
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from api import esi, importers, limits, repos
+
+SPEC = os.path.join(
+    os.path.dirname(__file__), '..', 'tests', 'fixtures', 'swagger.json')
+SPEC_URL = 'https://esi.tech.ccp.is/latest/swagger.json'
+LATENCY = 0.02
+REGION_IDS = list(range(10000001, 10000201))
+HEADERS = {'ETag': '"abc"', 'Expires': 'Mon, 01 Jan 2018 01:00:00 GMT'}
+
+
+def _body(region_id):
+    return json.dumps({
+        'region_id': region_id,
+        'name': 'Region %s' % region_id,
+        'constellations': [20000001, 20000002]
+    }).encode('utf8')
+
+
+class _SlowClient(object):
+    """esipy client answering after a fixed latency"""
+
+    @staticmethod
+    def request(operation):
+        time.sleep(LATENCY)
+        request, response = operation
+        response.apply_with(
+            status=200,
+            header=HEADERS,
+            raw=_body(int(request._p['path']['region_id'])))
+        return response
+
+
+class _SlowResponse(object):
+    """aiohttp response answering after a fixed latency"""
+
+    def __init__(self, url):
+        self.status = 200
+        self.headers = HEADERS
+        self._region_id = int(url.rstrip('/').rsplit('/', 1)[1])
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self):
+        """Gets the body"""
+        await asyncio.sleep(LATENCY)
+        return _body(self._region_id)
+
+
+class _SlowSession(object):
+    """aiohttp session answering after a fixed latency"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    @staticmethod
+    def get(url, **_):
+        """Answers the request"""
+        return _SlowResponse(url)
+
+
+def _build_repo(repo_type, **kwargs):
+    # NOTE: Saving cache validators is left out so only the time spent
+    # getting responses back is compared.
+    with open(SPEC) as spec_file:
+        app = esi.SpecCache._build_app(SPEC_URL, json.load(spec_file))
+    client = limits.LimitedClient(_SlowClient(),
+                                  limits.TokenBucket(1e9),
+                                  limits.ErrorBudget())
+    return repo_type(
+        app,
+        client,
+        MagicMock(),
+        MagicMock(),
+        resource_repo=MagicMock(),
+        **kwargs)
+
+
+@pytest.mark.parametrize('concurrency', [10, 50])
+def test_threaded_region_details(benchmark, concurrency):
+    """Baseline: get_region_details on a pool of worker threads"""
+    repo = _build_repo(repos.EveUniverseRepo)
+
+    def _fetch():
+        return list(
+            importers.fetch_concurrently(repo.get_region_details, REGION_IDS,
+                                         concurrency))
+
+    results = benchmark.pedantic(_fetch, rounds=3, iterations=1)
+    assert all(error is None for _, _, error in results)
+
+
+@pytest.mark.parametrize('concurrency', [10, 50])
+def test_async_region_details(benchmark, concurrency):
+    """get_region_details_many on an event loop"""
+    repo = _build_repo(
+        repos.AsyncEveUniverseRepo,
+        session_factory=_SlowSession,
+        max_concurrency=concurrency)
+
+    def _fetch():
+        return importers.run_async(repo.get_region_details_many(REGION_IDS))
+
+    results = benchmark.pedantic(_fetch, rounds=3, iterations=1)
+    assert all(error is None for _, _, error in results)
@@ -0,0 +1,137 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import os
+import shutil
+import tempfile
+import tracemalloc
+from unittest.mock import MagicMock
+
+import mongomock
+import pytest
+
+import api.constants as const
+from api import domain, esi, limits, repos, resilience
+from benchmarks import fake_esi
+
+LATENCY = 0.01
+
+
+class _HttpEsiClient(esi.EsiClient):
+    """esipy client that also speaks plain http to the local stand-in"""
+
+    __schemes__ = {'http', 'https'}
+
+
+class _Import(object):
+    """Everything one import run needs, built fresh so runs do not share
+    cached specs, responses or imported documents"""
+
+    def __init__(self, spec_url, rate=const.EVE_API_REQUESTS_PER_SECOND):
+        self.cache_dir = tempfile.mkdtemp(prefix='corp-hq-bench-')
+        mongo_client = mongomock.MongoClient()
+        app = esi.SpecCache(cache_dir=self.cache_dir).get_app(spec_url)
+        client = limits.LimitedClient(
+            _HttpEsiClient(
+                retry_requests=False,
+                raw_body_only=False,
+                cache=esi.ResponseCache(
+                    os.path.join(self.cache_dir, 'responses.sqlite'))),
+            limits.TokenBucket(rate, max(rate, const.EVE_API_BURST)),
+            limits.ErrorBudget())
+        self.region_repo = repos.RegionRepo(mongo_client)
+        self.constellation_repo = repos.ConstellationRepo(mongo_client)
+        self.system_repo = repos.SystemRepo(mongo_client)
+        self.stargate_repo = repos.StargateRepo(mongo_client)
+        self.region_api = repos.EveUniverseRepo(
+            app,
+            client,
+            MagicMock(),
+            self.region_repo,
+            resource_repo=repos.EsiResourceRepo(mongo_client))
+        self.utilities = domain.DataUtilities(
+            self.region_repo,
+            self.region_api,
+            MagicMock(),
+            self.constellation_repo,
+            self.system_repo,
+            self.stargate_repo,
+            indexes=MagicMock())
+
+    def close(self):
+        """Remove the cached specs and responses"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def _run_import(benchmark, fake, target,
+                rate=const.EVE_API_REQUESTS_PER_SECOND):
+    """Benchmark an import, recording its retries, requests and memory"""
+    with fake_esi.serve(fake) as spec_url:
+        runs = []
+
+        def _setup():
+            runs.append(_Import(spec_url, rate))
+            return (runs[-1], ), {}
+
+        try:
+            resilience.reset_stats()
+            benchmark.pedantic(target, setup=_setup, rounds=3)
+            stats = resilience.get_stats()
+            statuses = fake.stats()
+
+            tracemalloc.start()
+            run = _Import(spec_url, rate)
+            runs.append(run)
+            target(run)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            for run in runs:
+                run.close()
+
+    benchmark.extra_info.update({
+        'retries': stats.get('esi.retries', 0),
+        'gaveUp': stats.get('esi.gave_up', 0),
+        'responses': {str(status): count
+                      for status, count in statuses.items()},
+        'peakMemoryKiB': peak // 1024
+    })
+    return run
+
+
+@pytest.mark.parametrize('error_rate', [0, 0.05])
+def test_populate_universe(benchmark, error_rate):
+    """Universe import end to end against a local ESI stand-in
+
+    NOTE: The ESI client sends at most EVE_API_REQUESTS_PER_SECOND requests a
+    second, which is what bounds this run.
+    """
+    fake = fake_esi.FakeEsi(
+        regions=5, latency=LATENCY, error_rate=error_rate, seed=1)
+
+    def _populate(run):
+        run.utilities.populate_universe(force=True)
+
+    run = _run_import(benchmark, fake, _populate)
+    assert len(run.region_repo.find_regions(fields=['region_id'])) == 5
+
+
+@pytest.mark.parametrize('error_rate', [0, 0.05])
+def test_populate_universe_unthrottled(benchmark, error_rate):
+    """Universe import with the ESI client rate limit lifted
+
+    Leaves the importer, the ESI client, its error budget and the repos as
+    the only things being measured.
+    """
+    fake = fake_esi.FakeEsi(
+        regions=5, latency=LATENCY, error_rate=error_rate, seed=1)
+
+    def _populate(run):
+        run.utilities.populate_universe(force=True)
+
+    run = _run_import(benchmark, fake, _populate, rate=1e9)
+    assert len(run.region_repo.find_regions(fields=['region_id'])) == 5
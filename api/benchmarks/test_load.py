@@ -0,0 +1,33 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import pytest
+
+from benchmarks import load
+
+# NOTE: Kept within the password hashing queue limit of a single core so
+# registrations are not shed with a 503.
+CONCURRENCY = 4
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    """Serve the application for every endpoint benchmark"""
+    with load.serve(bcrypt_rounds=4) as url:
+        yield url
+
+
+@pytest.mark.parametrize('endpoint', load.ENDPOINTS)
+def test_endpoint_load(benchmark, base_url, endpoint):
+    """Requests per second and latency percentiles of each endpoint"""
+    planned = load.prepare(base_url, endpoint, 100)
+    result = benchmark.pedantic(
+        load.send, (endpoint, planned, CONCURRENCY), rounds=1, iterations=1)
+
+    summary = load.summarize(result)
+    benchmark.extra_info.update(summary)
+    assert summary['errors'] == 0
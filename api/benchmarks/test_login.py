@@ -0,0 +1,81 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import mongomock
+import pytest
+
+import api.constants as const
+from api import domain, passwords, repos
+from api.controllers import _build_response
+
+SECRET = b'benchmark secret'
+PASSWORD = b'benchmark password'
+# NOTE: The lowest work factor bcrypt allows, so the benchmarks measure the
+# code around the hash rather than the hash itself.
+FAST_ROUNDS = 4
+
+
+@pytest.mark.parametrize('secret', [None, SECRET], ids=['random', 'signed'])
+def test_session_generate_token(benchmark, secret):
+    """Token generation for a new session"""
+    # pylint: disable=protected-access
+    session = domain.Session(MagicMock(), secret)
+    expiry = datetime.utcnow() + timedelta(minutes=10)
+    benchmark(session._generate_token, expiry)
+
+
+@pytest.mark.parametrize('secret', [None, SECRET], ids=['random', 'signed'])
+def test_session_create(benchmark, secret):
+    """Session creation, including the save to mongo"""
+    session = domain.Session(
+        repos.SessionRepo(mongomock.MongoClient()), secret)
+    payload = {'addressChain': ['127.0.0.1'], 'username': 'benchmark'}
+    # NOTE: mongomock gets slower as the collection grows, so the rounds are
+    # capped to keep the timings comparable between runs.
+    result = benchmark.pedantic(
+        session.create, (payload, ), rounds=500, iterations=1)
+    assert 'token' in result
+
+
+@pytest.mark.parametrize('rounds', [FAST_ROUNDS, const.BCRYPT_ROUNDS])
+def test_user_authenticate(benchmark, rounds):
+    """Password check of an existing user"""
+    hasher = passwords.PasswordHasher(rounds)
+    user_repo = repos.UserRepo(mongomock.MongoClient())
+    user_repo.save({
+        'username': 'benchmark',
+        'password': hasher.hash(PASSWORD),
+        'email': 'benchmark@example.com'
+    })
+    user = domain.User(user_repo, hasher)
+
+    assert benchmark.pedantic(
+        user.authenticate, ('benchmark', PASSWORD), rounds=10, iterations=1)
+
+
+def test_user_authenticate_unknown_user(benchmark):
+    """Login attempt for a user that does not exist"""
+    user = domain.User(
+        repos.UserRepo(mongomock.MongoClient()),
+        passwords.PasswordHasher(FAST_ROUNDS))
+    assert not benchmark(user.authenticate, 'nobody', PASSWORD)
+
+
+@pytest.mark.parametrize('size', [1, 1000])
+def test_build_response(benchmark, size):
+    """Response building for small and large payloads"""
+    data = {
+        'regions': [{
+            'region_id': 10000000 + index,
+            'name': 'Region %s' % index,
+            'constellations': list(range(20000000, 20000010))
+        } for index in range(size)]
+    }
+    assert benchmark(_build_response, data).status_code == 200
@@ -0,0 +1,65 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from datetime import datetime
+import json
+
+from bson import ObjectId
+import pytest
+
+from api import serialization
+from api.controllers import _build_response
+
+
+def _regions(count):
+    """A region listing shaped like the documents the importer saves"""
+    return {
+        'items': [{
+            '_id': ObjectId(),
+            'region_id': 10000000 + index,
+            'name': 'Region %s' % index,
+            'description': 'A region of space ' * 20,
+            'constellations': list(range(20000000, 20000012)),
+            'importedAt': datetime(2017, 1, 1)
+        } for index in range(count)],
+        'next': None
+    }
+
+
+def _legacy_dumps(data):
+    """What _build_response did before api.serialization existed
+
+    Encoded to bytes as the response does when it is given a str.
+    """
+    return json.dumps(data, default=str).encode('utf8')
+
+
+def _serializer(name):
+    try:
+        return serialization.build_serializer(name)
+    except ValueError:
+        pytest.skip('%s is not installed' % name)
+
+
+@pytest.mark.parametrize('count', [100, 5000])
+def test_legacy_dumps(benchmark, count):
+    """Baseline: stdlib json.dumps with default separators"""
+    benchmark(_legacy_dumps, _regions(count))
+
+
+@pytest.mark.parametrize('name', ['json', 'ujson', 'orjson'])
+@pytest.mark.parametrize('count', [100, 5000])
+def test_serializer_dumps(benchmark, name, count):
+    """Serialization of a region listing by each serializer"""
+    serializer = _serializer(name)
+    benchmark(serializer.dumps, _regions(count))
+
+
+@pytest.mark.parametrize('count', [100, 5000])
+def test_build_response(benchmark, count):
+    """The whole response, with the serializer in use"""
+    assert benchmark(_build_response, _regions(count)).status_code == 200
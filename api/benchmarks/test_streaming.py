@@ -0,0 +1,65 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import time
+import tracemalloc
+
+import mongomock
+import pytest
+
+from api import repos
+from api.controllers import _build_response, _stream_response
+
+REGIONS = 20000
+
+
+@pytest.fixture(scope='module')
+def region_repo():
+    """A region collection too big to want in memory at once"""
+    client = mongomock.MongoClient()
+    # NOTE: Inserted directly, upserting this many one by one takes minutes.
+    client['eve-static-data']['regions'].insert_many([{
+        'region_id': 10000000 + index,
+        'name': 'Region %s' % index,
+        'description': 'A region of space ' * 20,
+        'constellations': list(range(20000000, 20000012))
+    } for index in range(REGIONS)])
+    return repos.RegionRepo(client)
+
+
+def _buffered(repo):
+    return _build_response(list(repo.iter_regions(fields=[])))
+
+
+def _streamed(repo):
+    return _stream_response(repo.iter_regions(fields=[]))
+
+
+def _send(build, repo):
+    return sum(len(chunk) for chunk in build(repo).response)
+
+
+@pytest.mark.parametrize('build', [_buffered, _streamed],
+                         ids=['buffered', 'streamed'])
+def test_region_export(benchmark, region_repo, build):
+    """Sending every region, recording peak memory and time to first byte"""
+    assert benchmark.pedantic(_send, (build, region_repo), rounds=3) > 0
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = iter(build(region_repo).response)
+    next(chunks)
+    first_byte = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    benchmark.extra_info.update({
+        'firstByteMs': first_byte * 1000,
+        'peakMemoryKiB': peak // 1024
+    })
@@ -0,0 +1,43 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from datetime import datetime, timedelta
+import random
+import string
+
+from api import tokens
+
+SECRET = b'benchmark secret'
+
+
+def _legacy_generate_token(size=128,
+                           chars=string.ascii_letters + string.digits):
+    """The token generator sessions used before api.tokens existed"""
+    return ''.join(random.choice(chars) for _ in range(size))
+
+
+def test_legacy_generate_token(benchmark):
+    """Baseline: per character random.choice token"""
+    benchmark(_legacy_generate_token)
+
+
+def test_generate_token(benchmark):
+    """Random os.urandom backed token"""
+    benchmark(tokens.generate_token)
+
+
+def test_sign_token(benchmark):
+    """Self describing token with embedded expiry and HMAC"""
+    expires = datetime.utcnow() + timedelta(minutes=10)
+    benchmark(tokens.sign_token, expires, SECRET)
+
+
+def test_verify_token(benchmark):
+    """Signature and expiry check of a self describing token"""
+    token = tokens.sign_token(datetime.utcnow() + timedelta(minutes=10),
+                              SECRET)
+    assert benchmark(tokens.verify_token, token, SECRET) is not None
@@ -11,7 +11,8 @@ import os
 from datetime import datetime
 
 import api.constants as const
-from api.repos import ConfigRepo
+from api.domain import DataUtilities
+from api.repos import AsyncEveUniverseRepo, ConfigRepo
 from api.server import build_app
 
 
@@ -62,6 +63,41 @@ def build_and_start_server():
     app.run(host=host, port=port, debug=True)
 
 
+def build_import_args_parse():
+    """Build the arg_parse object for the universe import
+
+    :return: arg parse object
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        description='Import the EVE universe from ESI')
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='refresh documents that were already imported.')
+    parser.add_argument(
+        '--async',
+        dest='use_async',
+        action='store_true',
+        help='fetch from an event loop instead of worker threads. '
+        'Requires aiohttp.')
+    return parser
+
+
+def import_universe():
+    """imports the EVE universe into the local database."""
+    arg_parser = build_import_args_parse().parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    region_api = AsyncEveUniverseRepo() if arg_parser.use_async else None
+    start = datetime.now()
+    DataUtilities(region_api=region_api).populate_universe(
+        force=arg_parser.force)
+
+    logger = logging.getLogger(const.SYS_LOGGER_NAME)
+    logger.info('Universe imported in %s.', datetime.now() - start)
+
+
 def seed_dev_data():
     repo = ConfigRepo()
     repo.save({
@@ -27,7 +27,12 @@ setup(
     package_data={'api': ['config.yml']},
     package_dir={'api': 'api'},
     install_requires=install_reqs,
+    extras_require={
+        'async': ['aiohttp==3.6.3']
+    },
     entry_points={
-        'console_scripts':
-        ['corp-hq-api-server = developer:build_and_start_server']
+        'console_scripts': [
+            'corp-hq-api-server = developer:build_and_start_server',
+            'corp-hq-import-universe = developer:import_universe'
+        ]
     })
@@ -0,0 +1,178 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import json
+from contextlib import ExitStack
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+import mongomock
+
+from tests.controllers import BaseControllerTest
+
+AUTHORIZED = {'Authorization': 'Bearer abc'}
+
+
+# pylint: disable=invalid-name
+class TestAdmin(BaseControllerTest):
+    """Tests for the admin module"""
+
+    @staticmethod
+    def _authorize(stack, session=True):
+        mock_helpers_domain = stack.enter_context(patch('api.helpers.domain'))
+        validate = mock_helpers_domain.Session.return_value.validate
+        validate.return_value = {'userId': 'admin'} if session else None
+        return validate
+
+    def test_configure_returns_job_id(self):
+        """Test that configure starts a job and returns immediately"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_job = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.admin.domain'))
+            mock_domain.Job.return_value = mock_job
+            mock_job.start_configure.return_value = 'abc'
+
+            # Act
+            response = self.app.post('/admin/configure')
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response_data['jobId'], 'abc')
+            self.assertTrue(
+                response.headers['Location'].endswith('/admin/jobs/abc'))
+
+    def test_get_job_returns_progress(self):
+        """Test that job progress is returned with formatted dates"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_job = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.admin.domain'))
+            mock_domain.Job.return_value = mock_job
+            mock_job.get.return_value = {
+                'jobId': 'abc',
+                'status': 'running',
+                'percentComplete': 42,
+                'createdAt': datetime(2017, 1, 1)
+            }
+
+            # Act
+            response = self.app.get('/admin/jobs/abc')
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            mock_job.get.assert_called_once_with('abc')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response_data['percentComplete'], 42)
+            self.assertEqual(response_data['createdAt'],
+                             '2017-01-01T00:00:00Z')
+
+    def test_get_job_unknown_returns_404(self):
+        """Test that unknown jobs return not found"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_job = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.admin.domain'))
+            mock_domain.Job.return_value = mock_job
+            mock_job.get.return_value = None
+
+            # Act
+            response = self.app.get('/admin/jobs/abc')
+
+            # Assert
+            self.assertEqual(response.status_code, 404)
+
+    def test_get_indexes_returns_report(self):
+        """Test that the index report is returned"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_indexes = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.admin.domain'))
+            self._authorize(stack)
+            mock_domain.Indexes.return_value = mock_indexes
+            mock_indexes.report.return_value = [{
+                'name': 'pk_1',
+                'status': 'missing'
+            }]
+
+            # Act
+            response = self.app.get('/admin/indexes', headers=AUTHORIZED)
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response_data['indexes'], [{
+                'name': 'pk_1',
+                'status': 'missing'
+            }])
+
+    def test_sync_indexes_passes_drop_unknown(self):
+        """Test that syncing indexes can drop unknown indexes"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_indexes = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.admin.domain'))
+            self._authorize(stack)
+            mock_domain.Indexes.return_value = mock_indexes
+            mock_indexes.sync.return_value = []
+
+            # Act
+            default = self.app.post('/admin/indexes/sync', headers=AUTHORIZED)
+            dropping = self.app.post(
+                '/admin/indexes/sync',
+                data=json.dumps({'dropUnknown': True}),
+                content_type='application/json',
+                headers=AUTHORIZED)
+
+            # Assert
+            self.assertEqual(default.status_code, 200)
+            self.assertEqual(dropping.status_code, 200)
+            self.assertEqual(mock_indexes.sync.call_args_list[0][0], (False, ))
+            self.assertEqual(mock_indexes.sync.call_args_list[1][0], (True, ))
+
+    def test_index_routes_require_session(self):
+        """Test that indexes are neither reported nor synced anonymously"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_domain = stack.enter_context(
+                patch('api.controllers.admin.domain'))
+            self._authorize(stack, session=False)
+
+            # Act
+            report = self.app.get('/admin/indexes')
+            sync = self.app.post('/admin/indexes/sync', headers=AUTHORIZED)
+
+            # Assert
+            self.assertEqual(report.status_code, 401)
+            self.assertEqual(sync.status_code, 401)
+            mock_domain.Indexes.assert_not_called()
+
+    def test_get_indexes_reports_without_index_stats(self):
+        """Test the report when the database cannot say how indexes are used"""
+        with ExitStack() as stack:
+            # Arrange
+            self._authorize(stack)
+            stack.enter_context(
+                patch('api.repos.mongo.get_client',
+                      return_value=mongomock.MongoClient()))
+
+            # Act
+            response = self.app.get('/admin/indexes', headers=AUTHORIZED)
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response_data['indexes'])
+            self.assertEqual(
+                {entry['status'] for entry in response_data['indexes']},
+                {'missing'})
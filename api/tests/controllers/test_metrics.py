@@ -0,0 +1,54 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from api import metrics
+from tests.controllers import BaseControllerTest
+
+
+# pylint: disable=invalid-name,protected-access
+class TestMetrics(BaseControllerTest):
+    """Tests for the metrics module"""
+
+    def test_metrics_renders_prometheus_text(self):
+        """Test the metrics endpoint renders the metrics of this worker"""
+        # Act
+        response = self.app.get('/metrics')
+
+        # Assert
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn(b'# TYPE corp_hq_http_requests_total counter',
+                      response.data)
+
+    def test_requests_are_timed_by_route(self):
+        """Test that every request is counted and timed by its route"""
+        # Arrange
+        labels = ('/health', 'GET')
+        count, _ = metrics.HTTP_LATENCY.get(labels)
+        served = metrics.HTTP_REQUESTS.get(labels + (200, ))
+
+        # Act
+        self.app.get('/health')
+
+        # Assert
+        self.assertEqual(metrics.HTTP_LATENCY.get(labels)[0], count + 1)
+        self.assertEqual(
+            metrics.HTTP_REQUESTS.get(labels + (200, )), served + 1)
+        self.assertEqual(metrics.HTTP_IN_FLIGHT.get(), 0)
+
+    def test_unknown_routes_share_one_label(self):
+        """Test that unknown paths do not each get their own metrics"""
+        # Arrange
+        labels = ('unmatched', 'GET', 404)
+        served = metrics.HTTP_REQUESTS.get(labels)
+
+        # Act
+        self.app.get('/no/such/path/1')
+        self.app.get('/no/such/path/2')
+
+        # Assert
+        self.assertEqual(metrics.HTTP_REQUESTS.get(labels), served + 2)
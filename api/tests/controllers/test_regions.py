@@ -0,0 +1,200 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import json
+from contextlib import ExitStack
+from unittest.mock import patch, MagicMock
+
+from api.errors import ValidationError
+from tests.controllers import BaseControllerTest
+
+
+# pylint: disable=invalid-name
+class TestRegions(BaseControllerTest):
+    """Tests for the regions module"""
+
+    def test_list_regions_returns_page_with_next_link(self):
+        """Test that query arguments are passed on and a next link built"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.find.return_value = {
+                'items': [{
+                    'region_id': 5,
+                    'name': 'The Forge'
+                }],
+                'next': 5
+            }
+
+            # Act
+            response = self.app.get(
+                '/regions?limit=1&name=The&fields=name,region_id')
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            mock_region.find.assert_called_once_with(
+                None, 1, 'The', ['name', 'region_id'])
+            self.assertEqual(response_data['items'], [{
+                'region_id': 5,
+                'name': 'The Forge'
+            }])
+            self.assertEqual(
+                response_data['next'],
+                '/regions?after=5&fields=name%2Cregion_id&limit=1&name=The')
+
+    def test_list_regions_last_page_has_no_next_link(self):
+        """Test that the final page does not link onwards"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.find.return_value = {'items': [], 'next': None}
+
+            # Act
+            response = self.app.get('/regions?after=10')
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            mock_region.find.assert_called_once_with(10, None, None, None)
+            self.assertIsNone(response_data['next'])
+
+    def test_list_regions_rejects_bad_arguments(self):
+        """Test that malformed or out of range arguments are a bad request"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.find.side_effect = ValidationError('bad limit')
+
+            # Act
+            not_int = self.app.get('/regions?after=abc')
+            out_of_range = self.app.get('/regions?limit=0')
+
+            # Assert
+            self.assertEqual(not_int.status_code, 400)
+            self.assertEqual(out_of_range.status_code, 400)
+            self.assertEqual(
+                json.loads(out_of_range.data.decode('utf-8')),
+                {'message': 'bad limit'})
+
+    def test_get_region_returns_region(self):
+        """Test that a single region is returned by id"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.get.side_effect = (
+                lambda region_id: {'region_id': 5} if region_id == 5 else None)
+
+            # Act
+            response = self.app.get('/regions/5')
+            missing = self.app.get('/regions/6')
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                json.loads(response.data.decode('utf-8')), {'region_id': 5})
+            self.assertEqual(missing.status_code, 404)
+
+    def test_export_regions_streams_json_array(self):
+        """Test that regions are streamed as one JSON array in batches"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.stream.return_value = iter([{
+                'region_id': region_id
+            } for region_id in range(1, 6)])
+
+            # Act
+            response = self.app.get(
+                '/regions/export?name=The&fields=name&batch=2')
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Content-Type'],
+                             'application/json')
+            mock_region.stream.assert_called_once_with('The', ['name'], 2)
+            self.assertEqual(response_data, [{
+                'region_id': region_id
+            } for region_id in range(1, 6)])
+
+    def test_export_regions_streams_ndjson(self):
+        """Test that regions can be streamed one per line"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.stream.return_value = iter([{
+                'region_id': 1
+            }, {
+                'region_id': 2
+            }])
+
+            # Act
+            response = self.app.get('/regions/export?format=ndjson')
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Content-Type'],
+                             'application/x-ndjson')
+            self.assertEqual(response.data,
+                             b'{"region_id":1}\n{"region_id":2}\n')
+            mock_region.stream.assert_called_once_with(None, None, None)
+
+    def test_export_regions_empty_is_empty_array(self):
+        """Test that no regions still makes valid JSON"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.stream.return_value = iter([])
+
+            # Act
+            response = self.app.get('/regions/export')
+
+            # Assert
+            self.assertEqual(response.data, b'[]')
+
+    def test_export_regions_bad_arguments_return_400(self):
+        """Test that bad formats and batch sizes are rejected"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_region = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.regions.domain'))
+            mock_domain.Region.return_value = mock_region
+            mock_region.stream.side_effect = ValidationError('bad batch')
+
+            # Act
+            bad_format = self.app.get('/regions/export?format=xml')
+            bad_batch = self.app.get('/regions/export?batch=0')
+
+            # Assert
+            self.assertEqual(bad_format.status_code, 400)
+            self.assertEqual(bad_batch.status_code, 400)
+            self.assertEqual(
+                json.loads(bad_batch.data.decode('utf-8'))['message'],
+                'bad batch')
@@ -10,7 +10,11 @@ from contextlib import ExitStack
 from datetime import datetime
 from unittest.mock import patch, MagicMock, ANY
 
-from api.errors import ValidationError
+import mongomock
+
+import api.constants as const
+from api import domain, passwords, repos
+from api.errors import ServiceUnavailableError, ValidationError
 from tests.controllers import BaseControllerTest
 
 
@@ -25,7 +29,6 @@ class TestUser(BaseControllerTest):
             mock_session = MagicMock()
             mock_domain = stack.enter_context(
                 patch('api.controllers.user.domain'))
-            stack.enter_context(patch('api.helpers.logging'))
             mock_domain.Session.return_value = mock_session
             mock_session.create.return_value = {
                 'expireAt': datetime.now(),
@@ -47,13 +50,78 @@ class TestUser(BaseControllerTest):
             self.assertIn('token', response_keys)
             self.assertIn('expires', response_keys)
             self.assertEqual(response_data['token'], 'test token')
+            mock_domain.User.return_value.authenticate.assert_called_once_with(
+                'test', 'pass')
+
+    def test_login_invalid_credentials(self):
+        """Test the login rejects credentials that do not authenticate."""
+        for post_body, authenticated in [({'un': 'test', 'pw': 'bad'}, False),
+                                         ({'un': {'$ne': ''}, 'pw': 'x'},
+                                          True)]:
+            with ExitStack() as stack:
+                # Arrange
+                mock_domain = stack.enter_context(
+                    patch('api.controllers.user.domain'))
+                mock_user = mock_domain.User.return_value
+                mock_user.authenticate.return_value = authenticated
+
+                # Act
+                response = self.app.post(
+                    '/login',
+                    data=json.dumps(post_body),
+                    content_type='application/json')
+
+                # Assert
+                self.assertEqual(response.status_code, 401)
+                mock_domain.Session.return_value.create.assert_not_called()
+
+    def _login_stored_user(self, stack, password, rounds):
+        """Log in as a user stored with a password hashed at 4 rounds"""
+        client = mongomock.MongoClient()
+        stack.enter_context(
+            patch('api.repos.mongo.get_client', return_value=client))
+        stack.enter_context(
+            patch.dict('os.environ', {const.ENV_BCRYPT_ROUNDS: str(rounds)}))
+        user_repo = repos.UserRepo(client)
+        domain.User(user_repo, passwords.PasswordHasher(rounds=4)).create({
+            'username': 'test',
+            'password': 'pass',
+            'email': 'test@example.com'
+        })
+
+        response = self.app.post(
+            '/login',
+            data=json.dumps({'un': 'test', 'pw': password}),
+            content_type='application/json')
+        stored = user_repo.get_by_keys({'username': 'test'},
+                                       repos.UserCredentials)
+        return response, stored.password
+
+    def test_login_wrong_password_for_stored_user(self):
+        """Test the login rejects a stored user's wrong password."""
+        with ExitStack() as stack:
+            # Act
+            response, stored = self._login_stored_user(stack, 'bad', 5)
+
+            # Assert
+            self.assertEqual(response.status_code, 401)
+            self.assertTrue(stored.startswith(b'$2b$04$'))
+
+    def test_login_rehashes_password_at_new_work_factor(self):
+        """Test the login rehashes a password hashed at an old work factor."""
+        with ExitStack() as stack:
+            # Act
+            response, stored = self._login_stored_user(stack, 'pass', 5)
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(stored.startswith(b'$2b$05$'))
 
     def test_register_valid_information(self):
         """Test the login when valid credentials are provided."""
         with ExitStack() as stack:
             # Arrange
             mock_user = MagicMock()
-            stack.enter_context(patch('api.helpers.logging'))
             mock_domain = stack.enter_context(
                 patch('api.controllers.user.domain'))
             mock_domain.User.return_value = mock_user
@@ -73,7 +141,6 @@ class TestUser(BaseControllerTest):
         with ExitStack() as stack:
             # Arrange
             mock_user = MagicMock()
-            stack.enter_context(patch('api.helpers.logging'))
             mock_domain = stack.enter_context(
                 patch('api.controllers.user.domain'))
             mock_domain.User.return_value = mock_user
@@ -91,12 +158,137 @@ class TestUser(BaseControllerTest):
             self.assertEqual(response.status_code, 400)
             self.assertIn('message', response_data)
 
+    def test_register_when_busy_returns_503(self):
+        """Test the register when password hashing is saturated."""
+        with ExitStack() as stack:
+            # Arrange
+            mock_user = MagicMock()
+            mock_domain = stack.enter_context(
+                patch('api.controllers.user.domain'))
+            mock_domain.User.return_value = mock_user
+            mock_user.create.side_effect = ServiceUnavailableError('busy')
+
+            # Act
+            response = self.app.post(
+                '/register',
+                data=json.dumps({}),
+                content_type='application/json')
+
+            # Assert
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '1')
+
+    def test_register_bulk_reports_results(self):
+        """Test bulk registration returns per user results and counts."""
+        with ExitStack() as stack:
+            # Arrange
+            mock_user = MagicMock()
+            mock_helpers_domain = stack.enter_context(
+                patch('api.helpers.domain'))
+            mock_domain = stack.enter_context(
+                patch('api.controllers.user.domain'))
+            mock_helpers_domain.Session.return_value.validate.return_value = {
+                'username': 'admin'
+            }
+            mock_domain.User.return_value = mock_user
+            mock_user.create_many.return_value = [{
+                'username': 'a',
+                'status': 'created'
+            }, {
+                'username': 'b',
+                'status': 'duplicate'
+            }]
+            users = [{'username': 'a'}, {'username': 'b'}]
+
+            # Act
+            response = self.app.post(
+                '/register/bulk',
+                data=json.dumps(users),
+                content_type='application/json',
+                headers={'Authorization': 'Bearer abc'})
+            response_data = json.loads(response.data.decode('utf-8'))
+
+            # Assert
+            mock_user.create_many.assert_called_once_with(users)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response_data['created'], 1)
+            self.assertEqual(response_data['duplicate'], 1)
+            self.assertEqual(len(response_data['results']), 2)
+
+    def test_register_bulk_requires_list(self):
+        """Test bulk registration rejects payloads that are not lists."""
+        with ExitStack() as stack:
+            # Arrange
+            mock_helpers_domain = stack.enter_context(
+                patch('api.helpers.domain'))
+            mock_domain = stack.enter_context(
+                patch('api.controllers.user.domain'))
+            mock_helpers_domain.Session.return_value.validate.return_value = {
+                'username': 'admin'
+            }
+
+            # Act
+            response = self.app.post(
+                '/register/bulk',
+                data=json.dumps({}),
+                content_type='application/json',
+                headers={'Authorization': 'Bearer abc'})
+
+            # Assert
+            self.assertEqual(response.status_code, 400)
+            mock_domain.User.assert_not_called()
+
+    def test_register_bulk_rejects_too_many_users(self):
+        """Test bulk registration refuses more users than it will hash."""
+        with ExitStack() as stack:
+            # Arrange
+            mock_helpers_domain = stack.enter_context(
+                patch('api.helpers.domain'))
+            mock_domain = stack.enter_context(
+                patch('api.controllers.user.domain'))
+            mock_helpers_domain.Session.return_value.validate.return_value = {
+                'username': 'admin'
+            }
+            users = [{
+                'username': 'user%s' % index,
+                'password': 'pw',
+                'email': 'e'
+            } for index in range(const.REGISTER_BULK_LIMIT + 1)]
+
+            # Act
+            response = self.app.post(
+                '/register/bulk',
+                data=json.dumps(users),
+                content_type='application/json',
+                headers={'Authorization': 'Bearer abc'})
+
+            # Assert
+            self.assertEqual(response.status_code, 400)
+            mock_domain.User.assert_not_called()
+
+    def test_register_bulk_requires_session(self):
+        """Test bulk registration is rejected without a session."""
+        with ExitStack() as stack:
+            # Arrange
+            mock_helpers_domain = stack.enter_context(
+                patch('api.helpers.domain'))
+            mock_helpers_domain.Session.return_value.validate.return_value = (
+                None)
+
+            # Act
+            response = self.app.post(
+                '/register/bulk',
+                data=json.dumps([]),
+                content_type='application/json')
+
+            # Assert
+            self.assertEqual(response.status_code, 401)
+
     def test_logout_valid_payload(self):
         """Tests the logout when a valid payload is provided."""
         with ExitStack() as stack:
             # Arrange
             mock_session = MagicMock()
-            stack.enter_context(patch('api.helpers.logging'))
             mock_domain = stack.enter_context(
                 patch('api.controllers.user.domain'))
             mock_domain.Session.return_value = mock_session
@@ -0,0 +1,90 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import unittest
+from unittest.mock import patch
+
+from api import caching
+
+
+# pylint: disable=invalid-name
+class TestTTLCache(unittest.TestCase):
+    """Tests for the in-process TTL cache"""
+
+    def test_get_returns_stored_value(self):
+        """Tests that a stored value is returned before it expires"""
+        # Arrange
+        cache = caching.TTLCache(10)
+        cache.set('foo', 'bar')
+
+        # Act
+        value = cache.get('foo')
+
+        # Assert
+        self.assertEqual(value, 'bar')
+
+    def test_get_returns_default_for_missing_key(self):
+        """Tests that the default is returned for unknown keys"""
+        # Arrange
+        cache = caching.TTLCache(10)
+
+        # Act
+        value = cache.get('foo', 'default')
+
+        # Assert
+        self.assertEqual(value, 'default')
+
+    def test_get_expires_entries(self):
+        """Tests that entries past their ttl are dropped"""
+        with patch('api.caching.time.monotonic') as mock_monotonic:
+            # Arrange
+            cache = caching.TTLCache(10)
+            mock_monotonic.return_value = 100
+            cache.set('foo', 'bar')
+            cache.set('baz', 'qux', ttl=30)
+            mock_monotonic.return_value = 111
+
+            # Act
+            foo = cache.get('foo')
+            baz = cache.get('baz')
+
+            # Assert
+            self.assertIsNone(foo)
+            self.assertEqual(baz, 'qux')
+            self.assertEqual(len(cache), 1)
+
+    def test_set_evicts_least_recently_used(self):
+        """Tests that a full cache evicts the least recently used entry"""
+        # Arrange
+        cache = caching.TTLCache(10, max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+
+        # Act
+        cache.set('c', 3)
+
+        # Assert
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_invalidate_and_clear_remove_entries(self):
+        """Tests that entries can be removed explicitly"""
+        # Arrange
+        cache = caching.TTLCache(10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # Act
+        cache.invalidate('a')
+        after_invalidate = len(cache)
+        cache.clear()
+
+        # Assert
+        self.assertEqual(after_invalidate, 1)
+        self.assertEqual(len(cache), 0)
@@ -6,10 +6,15 @@ For full license details please see the LICENSE file located in the root folder
 of the project.
 """
 from contextlib import ExitStack
+from datetime import datetime, timedelta
 import unittest
-from unittest.mock import patch, MagicMock, ANY, call
+from unittest.mock import patch, MagicMock, ANY
 
+import api.constants as const
 from api import domain
+from api import passwords
+from api import repos
+from api import tokens
 from api.errors import ValidationError
 
 
@@ -17,6 +22,14 @@ from api.errors import ValidationError
 class TestSession(unittest.TestCase):
     """Tests for the session domain object"""
 
+    def setUp(self):
+        domain.Session._CACHE.clear()
+        domain.Session._REVOCATIONS_CHECKED_AT = None
+
+    def tearDown(self):
+        domain.Session._CACHE.clear()
+        domain.Session._REVOCATIONS_CHECKED_AT = None
+
     def test_init_without_params(self):
         """Test that arg parser looks for config element"""
         # Arrange / Act
@@ -69,6 +82,69 @@ class TestSession(unittest.TestCase):
             # Assert
             self.assertIn('Missing required key: username', ex.args[0])
 
+    def test_create_signs_token_when_secret_configured(self):
+        """Tests that a configured secret produces self describing tokens"""
+        # Arrange
+        session_repo = MagicMock()
+        session = domain.Session(session_repo, b'secret')
+        payload = {'addressChain': '127.0.0.1', 'username': 'test_user'}
+
+        # Act
+        result = session.create(payload)
+
+        # Assert
+        self.assertTrue(tokens.is_signed(result['token']))
+        self.assertIsNotNone(tokens.verify_token(result['token'], b'secret'))
+
+    def test_validate_returns_live_session(self):
+        """Tests that a stored unexpired session is returned"""
+        # Arrange
+        session_repo = MagicMock()
+        stored = {
+            'token': 'abc',
+            'expireAt': datetime.utcnow() + timedelta(minutes=1)
+        }
+        session_repo.get_by_keys.return_value = stored
+        session = domain.Session(session_repo)
+
+        # Act
+        result = session.validate('abc')
+
+        # Assert
+        self.assertEqual(result, stored)
+        session_repo.get_by_keys.assert_called_once_with({'token': 'abc'})
+
+    def test_validate_rejects_expired_session(self):
+        """Tests that a stored session past its expiry is rejected"""
+        # Arrange
+        session_repo = MagicMock()
+        session_repo.get_by_keys.return_value = {
+            'token': 'abc',
+            'expireAt': datetime.utcnow() - timedelta(minutes=1)
+        }
+        session = domain.Session(session_repo)
+
+        # Act
+        result = session.validate('abc')
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_validate_rejects_forged_token_without_lookup(self):
+        """Tests that a badly signed token never reaches the repo"""
+        # Arrange
+        session_repo = MagicMock()
+        session = domain.Session(session_repo, b'secret')
+        token = tokens.sign_token(datetime.utcnow() + timedelta(minutes=1),
+                                  b'forged')
+
+        # Act
+        result = session.validate(token)
+
+        # Assert
+        self.assertIsNone(result)
+        session_repo.get_by_keys.assert_not_called()
+
     @staticmethod
     def test_expire_valid_payload():
         """Tests that session is removed when a valid payload is provided"""
@@ -82,6 +158,109 @@ class TestSession(unittest.TestCase):
 
         # Assert
         session_repo.remove.assert_called_once_with(payload)
+        session_repo.publish_revocation.assert_called_once_with('test token')
+
+    def test_validate_caches_sessions(self):
+        """Tests that repeated validation only loads the session once"""
+        # Arrange
+        session_repo = MagicMock()
+        session_repo.get_by_keys.return_value = {
+            'token': 'abc',
+            'expireAt': datetime.utcnow() + timedelta(minutes=1)
+        }
+        session = domain.Session(session_repo)
+
+        # Act
+        first = session.validate('abc')
+        second = domain.Session(session_repo).validate('abc')
+
+        # Assert
+        self.assertIsNotNone(first)
+        self.assertEqual(first, second)
+        session_repo.get_by_keys.assert_called_once_with({'token': 'abc'})
+
+    def test_validate_returns_copy_of_cached_session(self):
+        """Tests that changing a validated session leaves the cache alone"""
+        # Arrange
+        session_repo = MagicMock()
+        session_repo.get_by_keys.return_value = {
+            'token': 'abc',
+            'username': 'test.user',
+            'expireAt': datetime.utcnow() + timedelta(minutes=1)
+        }
+        first = domain.Session(session_repo).validate('abc')
+
+        # Act
+        del first['username']
+        second = domain.Session(session_repo).validate('abc')
+
+        # Assert
+        self.assertEqual(second['username'], 'test.user')
+        session_repo.get_by_keys.assert_called_once_with({'token': 'abc'})
+
+    def test_validate_rejects_cached_session_once_expired(self):
+        """Tests that a cached session is not used past its expiry"""
+        with ExitStack() as stack:
+            # Arrange
+            session_repo = MagicMock()
+            now = datetime(2017, 1, 1)
+            mock_datetime = stack.enter_context(
+                patch('api.domain.datetime'))
+            mock_datetime.utcnow.return_value = now
+            session_repo.get_by_keys.return_value = {
+                'token': 'abc',
+                'expireAt': now + timedelta(minutes=1)
+            }
+            session = domain.Session(session_repo)
+            session.validate('abc')
+            mock_datetime.utcnow.return_value = now + timedelta(minutes=2)
+
+            # Act
+            result = session.validate('abc')
+
+            # Assert
+            self.assertIsNone(result)
+
+    def test_expire_drops_cached_session(self):
+        """Tests that logging out stops the session validating locally"""
+        # Arrange
+        session_repo = MagicMock()
+        session_repo.get_by_keys.return_value = {
+            'token': 'abc',
+            'expireAt': datetime.utcnow() + timedelta(minutes=1)
+        }
+        session = domain.Session(session_repo)
+        session.validate('abc')
+        session_repo.get_by_keys.return_value = None
+
+        # Act
+        session.expire({'token': 'abc'})
+        result = session.validate('abc')
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_validate_applies_revocations_from_other_workers(self):
+        """Tests that revocations published elsewhere evict the cache"""
+        # Arrange
+        session_repo = MagicMock()
+        session_repo.get_by_keys.return_value = {
+            'token': 'abc',
+            'expireAt': datetime.utcnow() + timedelta(minutes=1)
+        }
+        session_repo.get_revoked_tokens.return_value = ['abc']
+        session = domain.Session(session_repo)
+        session.validate('abc')
+        session_repo.get_by_keys.return_value = None
+        domain.Session._REVOCATIONS_CHECKED_AT = (
+            datetime.utcnow() - timedelta(minutes=1))
+
+        # Act
+        result = session.validate('abc')
+
+        # Assert
+        self.assertIsNone(result)
+        session_repo.get_revoked_tokens.assert_called_once_with(ANY)
 
 
 class TestUser(unittest.TestCase):
@@ -116,15 +295,42 @@ class TestUser(unittest.TestCase):
         with ExitStack() as stack:
             # Arrange
             user_repo = MagicMock()
-            user = domain.User(user_repo)
-            mock_bcrypt = stack.enter_context(patch('api.domain.bcrypt'))
+            user_repo.get_by_keys.return_value = repos.UserCredentials(
+                'test', b'$2b$12$abc')
+            user = domain.User(user_repo, passwords.PasswordHasher(12))
+            mock_bcrypt = stack.enter_context(patch('api.passwords.bcrypt'))
+            mock_bcrypt.checkpw.return_value = True
+
+            # Act
+            result = user.authenticate('test', 'test')
+
+            # Assert
+            self.assertTrue(result)
+            user_repo.get_by_keys.assert_called_once_with(
+                {'username': 'test'}, repos.UserCredentials)
+            mock_bcrypt.checkpw.assert_called_once_with(b'test', b'$2b$12$abc')
+            user_repo.update_password.assert_not_called()
+
+    def test_check_valid_password_rehashes_on_cost_change(self):
+        """Tests that a login rehashes passwords with an outdated cost"""
+        with ExitStack() as stack:
+            # Arrange
+            user_repo = MagicMock()
+            user_repo.get_by_keys.return_value = repos.UserCredentials(
+                'test', b'$2b$10$abc')
+            user = domain.User(user_repo, passwords.PasswordHasher(12))
+            mock_bcrypt = stack.enter_context(patch('api.passwords.bcrypt'))
             mock_bcrypt.checkpw.return_value = True
+            mock_bcrypt.hashpw.return_value = b'$2b$12$def'
 
             # Act
             result = user.authenticate('test', 'test')
 
             # Assert
             self.assertTrue(result)
+            mock_bcrypt.gensalt.assert_called_once_with(12)
+            user_repo.update_password.assert_called_once_with(
+                'test', b'$2b$12$def')
 
     def test_check_invalid_password(self):
         """Tests that when provided a valid user and invalid password
@@ -134,8 +340,10 @@ class TestUser(unittest.TestCase):
         with ExitStack() as stack:
             # Arrange
             user_repo = MagicMock()
-            user = domain.User(user_repo)
-            mock_bcrypt = stack.enter_context(patch('api.domain.bcrypt'))
+            user_repo.get_by_keys.return_value = repos.UserCredentials(
+                'test', b'$2b$10$abc')
+            user = domain.User(user_repo, passwords.PasswordHasher(12))
+            mock_bcrypt = stack.enter_context(patch('api.passwords.bcrypt'))
             mock_bcrypt.checkpw.return_value = False
 
             # Act
@@ -143,6 +351,7 @@ class TestUser(unittest.TestCase):
 
             # Assert
             self.assertFalse(result)
+            user_repo.update_password.assert_not_called()
 
     def test_check_invalid_user(self):
         """Tests that when provided a valid user and invalid password
@@ -175,7 +384,7 @@ class TestUser(unittest.TestCase):
                 'password': 'test.password',
                 'email': 'test.email@noop.us'
             }
-            mock_bcrypt = stack.enter_context(patch('api.domain.bcrypt'))
+            mock_bcrypt = stack.enter_context(patch('api.passwords.bcrypt'))
             mock_bcrypt.hashpw.return_value = 'hashedpass'
 
             # Act
@@ -218,6 +427,98 @@ class TestUser(unittest.TestCase):
             user_repo.save.assert_not_called()
 
 
+    def test_create_many_reports_per_item_results(self):
+        """Tests bulk creation reports created, duplicate and invalid users"""
+        # Arrange
+        user_repo = MagicMock()
+        hasher = MagicMock()
+        user = domain.User(user_repo, hasher)
+        hasher.hash_many.side_effect = lambda pws: [b'h-' + p for p in pws]
+        user_repo.create_many.return_value = {0}
+        payloads = [
+            {'username': 'new', 'password': 'a', 'email': 'a@noop.us'},
+            {'username': 'taken', 'password': 'b', 'email': 'b@noop.us'},
+            {'username': 'new', 'password': 'c', 'email': 'c@noop.us'},
+            {'username': 'bad', 'email': 'd@noop.us'},
+            'not a user',
+        ]
+
+        # Act
+        results = user.create_many(payloads)
+
+        # Assert
+        self.assertEqual([r['status'] for r in results], [
+            'created', 'duplicate', 'duplicate', 'invalid', 'invalid'
+        ])
+        self.assertEqual(results[1]['username'], 'taken')
+        self.assertIn('password', results[3]['message'])
+        user_repo.create_many.assert_called_once_with([{
+            'username': 'new',
+            'password': b'h-a',
+            'email': 'a@noop.us'
+        }, {
+            'username': 'taken',
+            'password': b'h-b',
+            'email': 'b@noop.us'
+        }])
+
+    def test_create_many_reports_badly_typed_users_as_invalid(self):
+        """Tests bulk creation rejects fields that are not strings per item"""
+        # Arrange
+        user_repo = MagicMock()
+        hasher = MagicMock()
+        user = domain.User(user_repo, hasher)
+        hasher.hash_many.side_effect = lambda pws: [b'h-' + p for p in pws]
+        user_repo.create_many.return_value = {0}
+        payloads = [
+            {'username': 'a', 'password': 123, 'email': 'x@noop.us'},
+            {'username': ['b'], 'password': 'b', 'email': 'b@noop.us'},
+            {'username': {'c': 1}, 'password': 'c', 'email': 'c@noop.us'},
+            {'username': 'd', 'password': 'd', 'email': 4},
+            {'username': 'good', 'password': 'e', 'email': 'e@noop.us'},
+        ]
+
+        # Act
+        results = user.create_many(payloads)
+
+        # Assert
+        self.assertEqual([r['status'] for r in results],
+                         ['invalid'] * 4 + ['created'])
+        self.assertEqual(results[0]['message'], 'password must be a string')
+        self.assertEqual(results[1]['message'], 'username must be a string')
+        self.assertEqual(results[3]['message'], 'email must be a string')
+        user_repo.create_many.assert_called_once_with([{
+            'username': 'good',
+            'password': b'h-e',
+            'email': 'e@noop.us'
+        }])
+
+
+class TestIndexes(unittest.TestCase):
+    """Test the index domain object"""
+
+    def test_report_and_sync_combine_every_repo(self):
+        """Test that every repo's indexes are checked and synced"""
+        # Arrange
+        first = MagicMock()
+        second = MagicMock()
+        first.check_indexes.return_value = [{'name': 'a_1'}]
+        second.check_indexes.return_value = [{'name': 'b_1'}]
+        first.sync_indexes.return_value = [{'name': 'a_1'}]
+        second.sync_indexes.return_value = []
+        indexes = domain.Indexes([first, second])
+
+        # Act
+        report = indexes.report()
+        synced = indexes.sync(drop_unknown=True)
+
+        # Assert
+        self.assertEqual(report, [{'name': 'a_1'}, {'name': 'b_1'}])
+        self.assertEqual(synced, [{'name': 'a_1'}])
+        first.sync_indexes.assert_called_once_with(True)
+        second.sync_indexes.assert_called_once_with(True)
+
+
 class TestDataUtility(unittest.TestCase):
     """Tests for the user domain object"""
 
@@ -252,43 +553,197 @@ class TestDataUtility(unittest.TestCase):
         self.assertEqual(utility._session_repo, session_repo)
 
     @staticmethod
-    def test_apply_indexes_calls_repos():
-        """Test that apply indexes calls all the relevant repos"""
+    def test_apply_indexes_syncs_indexes():
+        """Test that apply indexes syncs the declared indexes"""
         # Arrange
-        region_repo = MagicMock()
-        region_api = MagicMock()
-        session_repo = MagicMock()
-        utility = domain.DataUtilities(region_repo, region_api, session_repo)
+        indexes = MagicMock()
+        utility = domain.DataUtilities(MagicMock(), MagicMock(), MagicMock(),
+                                       MagicMock(), MagicMock(), MagicMock(),
+                                       indexes)
 
         # Act
         utility.apply_indexes()
 
         # Assert
-        utility._session_repo.apply_indexes.assert_called_once_with()
+        indexes.sync.assert_called_once_with()
 
-    @staticmethod
-    def test_populate_regions_saves_fetched_region_details():
-        """Tests that populate regions gets details for discovered regions"""
+    def test_configure_applies_indexes_and_populates_universe(self):
+        """Test that configure runs every configuration step"""
         # Arrange
         region_repo = MagicMock()
         region_api = MagicMock()
         session_repo = MagicMock()
-        utility = domain.DataUtilities(region_repo, region_api, session_repo)
+        constellation_repo = MagicMock()
+        indexes = MagicMock()
+        utility = domain.DataUtilities(
+            region_repo,
+            region_api,
+            session_repo,
+            constellation_repo=constellation_repo,
+            system_repo=MagicMock(),
+            stargate_repo=MagicMock(),
+            indexes=indexes)
+        region_repo.get_many.return_value = []
+        constellation_repo.get_many.return_value = []
+        region_api.get_region_ids.return_value = [1]
+        region_api.get_region_details.return_value = {
+            'region_id': 1,
+            'constellations': [2]
+        }
+        region_api.get_constellation_details.return_value = {
+            'constellation_id': 2,
+            'systems': []
+        }
+        progress = MagicMock()
+
+        # Act
+        utility.configure(progress)
 
-        region_repo.has_any.return_value = False
+        # Assert
+        indexes.sync.assert_called_once_with()
+        region_repo.save_many.assert_called_once_with([{
+            'region_id': 1,
+            'constellations': [2]
+        }])
+        constellation_repo.save_many.assert_called_once_with([{
+            'constellation_id': 2,
+            'systems': []
+        }])
+        progress.update.assert_called_with(2, 2)
+
+
+class TestRegion(unittest.TestCase):
+    """Tests for the region domain object"""
+
+    def test_find_returns_page_and_next_cursor(self):
+        """Test that a full page reports where the next page starts"""
+        # Arrange
+        region_repo = MagicMock()
+        region_repo.find_regions.return_value = [{
+            'region_id': 1
+        }, {
+            'region_id': 2
+        }, {
+            'region_id': 3
+        }]
+        region = domain.Region(region_repo)
 
-        details_1 = {}
-        details_2 = {}
-        details_3 = {}
+        # Act
+        page = region.find(after=0, limit=2, name_prefix='Th', fields=['name'])
 
-        region_api.get_region_ids.return_value = [1, 2, 3]
-        region_api.get_region_details.side_effect = [
-            details_1, details_2, details_3
-        ]
+        # Assert
+        self.assertEqual(page, {
+            'items': [{
+                'region_id': 1
+            }, {
+                'region_id': 2
+            }],
+            'next': 2
+        })
+        region_repo.find_regions.assert_called_once_with(
+            0, 3, 'Th', ['name', 'region_id'])
+
+    def test_find_last_page_has_no_next_cursor(self):
+        """Test that a short page ends the listing"""
+        # Arrange
+        region_repo = MagicMock()
+        region_repo.find_regions.return_value = [{'region_id': 1}]
+        region = domain.Region(region_repo)
+
+        # Act
+        page = region.find()
+
+        # Assert
+        self.assertEqual(page, {'items': [{'region_id': 1}], 'next': None})
+        region_repo.find_regions.assert_called_once_with(
+            None, const.PAGE_SIZE + 1, None, [])
+
+    def test_find_rejects_out_of_range_limit(self):
+        """Test that a limit outside the allowed range is refused"""
+        # Arrange
+        region = domain.Region(MagicMock())
+
+        # Act / Assert
+        for limit in [0, const.PAGE_SIZE_MAX + 1]:
+            with self.assertRaises(ValidationError):
+                region.find(limit=limit)
+
+
+    def test_stream_reads_regions_in_batches(self):
+        """Test that streamed regions always carry their id"""
+        # Arrange
+        region_repo = MagicMock()
+        region_repo.iter_regions.return_value = iter([{'region_id': 1}])
+        region = domain.Region(region_repo)
+
+        # Act
+        regions = list(
+            region.stream(name_prefix='Th', fields=['name'], batch_size=10))
+
+        # Assert
+        self.assertEqual(regions, [{'region_id': 1}])
+        region_repo.iter_regions.assert_called_once_with(
+            'Th', ['name', 'region_id'], 10)
+
+    def test_stream_rejects_bad_batch_sizes(self):
+        """Test that the batch size must be within bounds"""
+        # Arrange
+        region = domain.Region(MagicMock())
+
+        # Act / Assert
+        for batch_size in [0, const.STREAM_BATCH_SIZE_MAX + 1]:
+            with self.assertRaises(ValidationError):
+                region.stream(batch_size=batch_size)
+
+
+class TestJob(unittest.TestCase):
+    """Tests for the job domain object"""
+
+    def test_init_without_params(self):
+        """Test that the init constructs a job runner if none provided"""
+        # Arrange / Act
+        with patch('api.domain.jobs'):
+            job = domain.Job()
+
+        # Assert
+        self.assertIsNotNone(job._job_runner)
+
+    def test_start_configure_submits_job(self):
+        """Test that configuration is handed to the job runner"""
+        # Arrange
+        job_runner = MagicMock()
+        job_runner.submit.return_value = 'abc'
+        job = domain.Job(job_runner)
+
+        # Act
+        job_id = job.start_configure()
+
+        # Assert
+        self.assertEqual(job_id, 'abc')
+        job_runner.submit.assert_called_once_with('configure', ANY)
+
+    def test_get_strips_internal_id(self):
+        """Test that the mongo id is not exposed"""
+        # Arrange
+        job_runner = MagicMock()
+        job_runner.get.return_value = {'_id': 1, 'jobId': 'abc'}
+        job = domain.Job(job_runner)
+
+        # Act
+        data = job.get('abc')
+
+        # Assert
+        self.assertEqual(data, {'jobId': 'abc'})
+
+    def test_get_returns_none_for_unknown_job(self):
+        """Test that unknown jobs are reported as missing"""
+        # Arrange
+        job_runner = MagicMock()
+        job_runner.get.return_value = None
+        job = domain.Job(job_runner)
 
         # Act
-        utility.populate_regions()
+        data = job.get('abc')
 
         # Assert
-        calls = [call(details_1), call(details_2), call(details_3)]
-        region_repo.save.assert_has_calls(calls)
+        self.assertIsNone(data)
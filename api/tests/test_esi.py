@@ -0,0 +1,438 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock, ANY
+
+from esipy.client import CachedResponse
+import mongomock
+
+import api.constants as const
+from api import esi
+from api import repos
+from api.errors import EveApiError, TransientError
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+SPEC_URL = 'https://esi.tech.ccp.is/latest/swagger.json?datasource=tranquility'
+
+
+def _load_spec():
+    with open(os.path.join(FIXTURES_DIR, 'swagger.json')) as spec_file:
+        return json.load(spec_file)
+
+
+def _spec_response(status_code=200, etag='"abc"'):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {'ETag': etag}
+    response.json.return_value = _load_spec()
+    return response
+
+
+# pylint: disable=invalid-name,protected-access
+class TestSpecCache(unittest.TestCase):
+    """Tests for the ESI swagger spec cache"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self._temp_dir.name
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_get_app_downloads_and_stores_spec(self):
+        """Tests that an empty cache downloads the spec and keeps it"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            mock_get.return_value = _spec_response()
+            cache = esi.SpecCache(self.cache_dir)
+
+            # Act
+            app = cache.get_app(SPEC_URL)
+
+            # Assert
+            self.assertIn('get_universe_regions', app.op)
+            mock_get.assert_called_once_with(
+                SPEC_URL, headers={}, timeout=30)
+            self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_get_app_uses_pickled_app(self):
+        """Tests that a warm cache builds the app without downloading"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            mock_get.return_value = _spec_response()
+            esi.SpecCache(self.cache_dir).get_app(SPEC_URL)
+            mock_get.reset_mock()
+            cache = esi.SpecCache(self.cache_dir)
+            mock_revalidate = stack.enter_context(
+                patch.object(cache, '_revalidate_in_background'))
+            mock_build = stack.enter_context(
+                patch.object(esi.SpecCache, '_build_app'))
+
+            # Act
+            app = cache.get_app(SPEC_URL)
+
+            # Assert
+            self.assertIn('get_universe_regions_region_id', app.op)
+            mock_get.assert_not_called()
+            mock_build.assert_not_called()
+            mock_revalidate.assert_called_once_with(SPEC_URL, '"abc"', None)
+
+    def test_get_app_uses_spec_from_repo(self):
+        """Tests that a spec shared through mongo avoids the download"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            spec_repo = repos.EsiSpecRepo(mongomock.MongoClient())
+            spec_repo.save({
+                'url': SPEC_URL,
+                'etag': '"abc"',
+                'spec': json.dumps(_load_spec())
+            })
+            cache = esi.SpecCache(self.cache_dir, spec_repo)
+            mock_revalidate = stack.enter_context(
+                patch.object(cache, '_revalidate_in_background'))
+
+            # Act
+            app = cache.get_app(SPEC_URL)
+
+            # Assert
+            self.assertIn('get_universe_regions', app.op)
+            mock_get.assert_not_called()
+            mock_revalidate.assert_called_once_with(SPEC_URL, '"abc"', None)
+
+    def test_revalidate_unchanged_spec(self):
+        """Tests that a 304 leaves the cache alone"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            mock_get.return_value = _spec_response(304)
+            on_change = MagicMock()
+            cache = esi.SpecCache(self.cache_dir)
+
+            # Act
+            changed = cache.revalidate(SPEC_URL, '"abc"', on_change)
+
+            # Assert
+            self.assertFalse(changed)
+            mock_get.assert_called_once_with(
+                SPEC_URL, headers={'If-None-Match': '"abc"'}, timeout=30)
+            on_change.assert_not_called()
+
+    def test_revalidate_changed_spec(self):
+        """Tests that a new spec is stored and handed to the callback"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            mock_get.return_value = _spec_response(etag='"def"')
+            on_change = MagicMock()
+            cache = esi.SpecCache(self.cache_dir)
+
+            # Act
+            changed = cache.revalidate(SPEC_URL, '"abc"', on_change)
+
+            # Assert
+            self.assertTrue(changed)
+            on_change.assert_called_once_with(ANY)
+            self.assertIn('get_universe_regions', on_change.call_args[0][0].op)
+            self.assertEqual(cache._load_app(SPEC_URL)['etag'], '"def"')
+
+    def test_get_app_ignores_cache_dir_others_can_write(self):
+        """Tests that a cache folder open to other users is never read"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            mock_get.return_value = _spec_response()
+            os.chmod(self.cache_dir, 0o777)
+            esi.SpecCache(self.cache_dir).get_app(SPEC_URL)
+
+            # Act
+            app = esi.SpecCache(self.cache_dir).get_app(SPEC_URL)
+
+            # Assert
+            self.assertIn('get_universe_regions', app.op)
+            self.assertEqual(mock_get.call_count, 2)
+            self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_get_app_without_usable_cache_dir(self):
+        """Tests that a cache folder that cannot be made is not an error"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_get = stack.enter_context(patch('api.esi.requests.get'))
+            mock_get.return_value = _spec_response()
+            blocker = os.path.join(self.cache_dir, 'file')
+            with open(blocker, 'w'):
+                pass
+            cache = esi.SpecCache(os.path.join(blocker, 'esi'))
+
+            # Act
+            app = cache.get_app(SPEC_URL)
+
+            # Assert
+            self.assertIn('get_universe_regions', app.op)
+
+    def test_default_cache_dir_is_per_user(self):
+        """Tests that specs are cached in the user's cache folder"""
+        with ExitStack() as stack:
+            # Arrange
+            stack.enter_context(
+                patch.dict(os.environ, {'XDG_CACHE_HOME': self.cache_dir}))
+            os.environ.pop(const.ENV_ESI_CACHE_DIR, None)
+
+            # Act
+            cache_dir = esi._default_cache_dir()
+
+            # Assert
+            self.assertEqual(cache_dir,
+                             os.path.join(self.cache_dir, 'corp-hq', 'esi'))
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for the SQLite backed ESI response cache"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._temp_dir.name, 'responses.sqlite')
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    @staticmethod
+    def _response(content=b'[1, 2]'):
+        return CachedResponse(200, {'ETag': '"abc"'}, content, 'url')
+
+    def test_get_returns_stored_response(self):
+        """Tests that responses are kept across cache instances"""
+        # Arrange
+        response = self._response()
+        esi.ResponseCache(self.path).set(('url', 1), response, 60)
+
+        # Act
+        cached = esi.ResponseCache(self.path).get(('url', 1))
+        missing = esi.ResponseCache(self.path).get(('url', 2), 'default')
+
+        # Assert
+        self.assertEqual(cached, response)
+        self.assertEqual(cached.headers['etag'], '"abc"')
+        self.assertEqual(missing, 'default')
+
+    def test_responses_are_not_pickled(self):
+        """Tests that nothing read back from disk is unpickled"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_loads = stack.enter_context(patch('pickle.loads'))
+            cache = esi.ResponseCache(self.path)
+            cache.set('key', self._response(), 60)
+
+            # Act
+            cached = cache.get('key')
+
+            # Assert
+            self.assertEqual(cached, self._response())
+            mock_loads.assert_not_called()
+
+    def test_get_drops_expired_response(self):
+        """Tests that responses past their expiry are not returned"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_time = stack.enter_context(patch('api.esi.time.time'))
+            mock_time.return_value = 100.0
+            cache = esi.ResponseCache(self.path)
+            cache.set('key', self._response(), 10)
+            mock_time.return_value = 110.0
+
+            # Act
+            value = cache.get('key')
+
+            # Assert
+            self.assertIsNone(value)
+
+    def test_set_ignores_responses_without_expiry(self):
+        """Tests that responses esipy marks as uncacheable are not stored"""
+        # Arrange
+        cache = esi.ResponseCache(self.path)
+
+        # Act
+        cache.set('key', self._response(), -1)
+
+        # Assert
+        self.assertIsNone(cache.get('key'))
+
+    def test_invalidate_removes_response(self):
+        """Tests that invalidated responses are no longer returned"""
+        # Arrange
+        cache = esi.ResponseCache(self.path)
+        cache.set('key', self._response(), 60)
+
+        # Act
+        cache.invalidate('key')
+
+        # Assert
+        self.assertIsNone(cache.get('key'))
+
+    def test_cache_dir_others_can_write_is_not_used(self):
+        """Tests that a cache folder open to other users is never read"""
+        # Arrange
+        os.chmod(self._temp_dir.name, 0o777)
+        cache = esi.ResponseCache(self.path)
+
+        # Act
+        cache.set('key', self._response(), 60)
+
+        # Assert
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(os.listdir(self._temp_dir.name), [])
+
+    def test_set_keeps_running_total_of_sizes(self):
+        """Tests that replaced and removed responses leave the total right"""
+        # Arrange
+        cache = esi.ResponseCache(self.path)
+        cache.set('a', self._response(b'x' * 100), 60)
+        cache.set('b', self._response(b'x' * 50), 60)
+
+        # Act
+        cache.set('a', self._response(b'x' * 10), 60)
+        cache.invalidate('b')
+
+        # Assert
+        connection = cache._connect()
+        self.assertEqual(
+            cache._total(connection),
+            connection.execute(
+                'SELECT SUM(size) FROM esi_responses').fetchone()[0])
+
+    def test_set_evicts_least_recently_read(self):
+        """Tests that the cache stays within its size bound"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_time = stack.enter_context(patch('api.esi.time.time'))
+            mock_time.return_value = 100.0
+            response = self._response(b'x' * 100)
+            size = len(json.dumps(response.headers)) + len(response.content)
+            cache = esi.ResponseCache(self.path, max_bytes=size * 2)
+            cache.set('a', response, 3600)
+            mock_time.return_value = 200.0
+            cache.set('b', response, 3600)
+            mock_time.return_value = 300.0
+            cache.get('a')
+
+            # Act
+            mock_time.return_value = 400.0
+            cache.set('c', response, 3600)
+
+            # Assert
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('c'))
+
+
+    def test_get_only_records_reads_once_per_interval(self):
+        """Tests that reads close together do not each write to the cache"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_time = stack.enter_context(patch('api.esi.time.time'))
+            mock_time.return_value = 100.0
+            cache = esi.ResponseCache(self.path)
+            cache.set('key', self._response(), 3600)
+            connection = cache._connect()
+
+            def _accessed():
+                return connection.execute(
+                    'SELECT accessed FROM esi_responses').fetchone()[0]
+
+            # Act
+            mock_time.return_value = 110.0
+            cache.get('key')
+            soon = _accessed()
+            mock_time.return_value = 100.0 + const.ESI_RESPONSE_ACCESS_INTERVAL
+            cache.get('key')
+            later = _accessed()
+
+            # Assert
+            self.assertEqual(soon, 100.0)
+            self.assertEqual(later, 100.0 + const.ESI_RESPONSE_ACCESS_INTERVAL)
+
+class TestEsiClient(unittest.TestCase):
+    """Tests for the esipy client sending per request headers"""
+
+    def test_request_sends_provided_headers(self):
+        """Tests that headers given for one request are sent with it only"""
+        with ExitStack() as stack:
+            # Arrange
+            app = esi.SpecCache._build_app(SPEC_URL, _load_spec())
+            client = esi.EsiClient(cache=None)
+            mock_send = stack.enter_context(
+                patch.object(client._session, 'send'))
+            mock_send.return_value = MagicMock(
+                status_code=304, headers={}, content=b'', url=SPEC_URL)
+
+            # Act
+            first = client.request(
+                app.op['get_universe_regions_region_id'](region_id=1),
+                headers={'If-None-Match': '"abc"'})
+            client.request(
+                app.op['get_universe_regions_region_id'](region_id=2))
+
+            # Assert
+            self.assertEqual(first.status, 304)
+            sent = [c[0][0].headers for c in mock_send.call_args_list]
+            self.assertEqual(sent[0]['If-None-Match'], '"abc"')
+            self.assertNotIn('If-None-Match', sent[1])
+
+
+class TestCheckResponse(unittest.TestCase):
+    """Tests for classifying ESI responses"""
+
+    @staticmethod
+    def _response(status, remain='100', reset='30'):
+        response = MagicMock()
+        response.status = status
+        response.header = {
+            'X-Esi-Error-Limit-Remain': [remain],
+            'X-Esi-Error-Limit-Reset': [reset]
+        }
+        return response
+
+    def test_success_and_not_modified_pass(self):
+        """Tests that successful responses are returned as is"""
+        for status in [200, 304]:
+            response = self._response(status)
+            self.assertEqual(esi.check_response(response), response)
+
+    def test_server_errors_are_transient(self):
+        """Tests that 5xx responses are retried without waiting"""
+        # Act
+        with self.assertRaises(TransientError) as context:
+            esi.check_response(self._response(502))
+
+        # Assert
+        self.assertIsNone(context.exception.retry_after)
+
+    def test_error_limited_waits_for_reset(self):
+        """Tests that the error limit reset is honored"""
+        for status, remain in [(420, '0'), (503, '5')]:
+            # Act
+            with self.assertRaises(TransientError) as context:
+                esi.check_response(self._response(status, remain, '17'))
+
+            # Assert
+            self.assertEqual(context.exception.retry_after, 17)
+
+    def test_client_errors_are_not_transient(self):
+        """Tests that rejected requests are not retried"""
+        # Act
+        with self.assertRaises(EveApiError) as context:
+            esi.check_response(self._response(404))
+
+        # Assert
+        self.assertEqual(context.exception.status, 404)
@@ -0,0 +1,78 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import unittest
+from unittest.mock import patch
+
+import flask
+
+from api import helpers
+
+
+# pylint: disable=invalid-name
+class TestRequiresSession(unittest.TestCase):
+    """Tests for the requires session decorator"""
+
+    def setUp(self):
+        app = flask.Flask(__name__)
+
+        @app.route('/protected')
+        @helpers.requires_session
+        def _protected():  # pylint: disable=unused-variable
+            return flask.g.session['username']
+
+        app.testing = True
+        self.app = app.test_client()
+
+    def test_missing_token_returns_401(self):
+        """Test that requests without a token are rejected"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_domain = stack.enter_context(patch('api.helpers.domain'))
+            mock_domain.Session.return_value.validate.return_value = None
+
+            # Act
+            response = self.app.get('/protected')
+
+            # Assert
+            self.assertEqual(response.status_code, 401)
+            mock_domain.Session.return_value.validate.assert_called_once_with(
+                None)
+
+    def test_invalid_token_returns_401(self):
+        """Test that requests with an unknown token are rejected"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_domain = stack.enter_context(patch('api.helpers.domain'))
+            mock_domain.Session.return_value.validate.return_value = None
+
+            # Act
+            response = self.app.get(
+                '/protected', headers={'Authorization': 'Bearer abc'})
+
+            # Assert
+            self.assertEqual(response.status_code, 401)
+            mock_domain.Session.return_value.validate.assert_called_once_with(
+                'abc')
+
+    def test_valid_token_exposes_session(self):
+        """Test that requests with a valid token reach the endpoint"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_domain = stack.enter_context(patch('api.helpers.domain'))
+            mock_domain.Session.return_value.validate.return_value = {
+                'username': 'test_user'
+            }
+
+            # Act
+            response = self.app.get(
+                '/protected', headers={'Authorization': 'Bearer abc'})
+
+            # Assert
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, b'test_user')
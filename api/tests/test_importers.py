@@ -0,0 +1,288 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import unittest
+from unittest.mock import patch, MagicMock
+
+import mongomock
+
+from api import importers
+from api import repos
+
+
+# pylint: disable=invalid-name,protected-access
+class TestFetchConcurrently(unittest.TestCase):
+    """Tests for the bounded concurrent fetch helper"""
+
+    def test_yields_result_for_every_item(self):
+        """Tests that every item is processed exactly once"""
+        # Act
+        results = list(
+            importers.fetch_concurrently(lambda x: x * 2, range(25), 3))
+
+        # Assert
+        self.assertCountEqual([r[0] for r in results], range(25))
+        for item, result, error in results:
+            self.assertEqual(result, item * 2)
+            self.assertIsNone(error)
+
+    def test_yields_errors_without_stopping(self):
+        """Tests that a failing item does not prevent the others"""
+
+        def _func(item):
+            if item == 2:
+                raise ValueError('boom')
+            return item
+
+        # Act
+        results = list(importers.fetch_concurrently(_func, range(5), 2))
+
+        # Assert
+        errors = {r[0]: r[2] for r in results if r[2]}
+        self.assertEqual(len(results), 5)
+        self.assertEqual(list(errors.keys()), [2])
+        self.assertIsInstance(errors[2], ValueError)
+
+
+class FakeUniverseApi(object):
+    """Tiny universe of two regions served from memory"""
+
+    def __init__(self, failures=None, changed=None):
+        self.calls = []
+        self.failures = failures or set()
+        self.changed = changed
+
+    def _get(self, key, item_id, document, if_changed):
+        self.calls.append((key, item_id))
+        if (key, item_id) in self.failures:
+            raise ValueError('boom')
+        if if_changed and self.changed is not None and (
+                key, item_id) not in self.changed:
+            return repos.NOT_MODIFIED
+        document[key] = item_id
+        return document
+
+    def get_region_ids(self):
+        """Gets the region ids"""
+        return [1, 2]
+
+    def get_region_details(self, region_id, if_changed=False):
+        """Gets a region with one constellation"""
+        return self._get('region_id', region_id,
+                         {'constellations': [region_id * 10]}, if_changed)
+
+    def get_constellation_details(self, constellation_id, if_changed=False):
+        """Gets a constellation with two systems"""
+        return self._get(
+            'constellation_id', constellation_id,
+            {'systems': [constellation_id * 10, constellation_id * 10 + 1]},
+            if_changed)
+
+    def get_system_details(self, system_id, if_changed=False):
+        """Gets a system with one stargate"""
+        return self._get('system_id', system_id,
+                         {'stargates': [system_id * 10]}, if_changed)
+
+    def get_stargate_details(self, stargate_id, if_changed=False):
+        """Gets a stargate"""
+        return self._get('stargate_id', stargate_id, {}, if_changed)
+
+
+class FakeAsyncUniverseApi(FakeUniverseApi, repos.AsyncEveUniverseRepo):
+    """The same tiny universe served through the async api"""
+
+    def _many(self, fetch, item_ids, if_changed):
+        results = []
+        for item_id in item_ids:
+            try:
+                results.append((item_id, fetch(item_id, if_changed), None))
+            except ValueError as ex:
+                results.append((item_id, None, ex))
+        return results
+
+    async def get_region_details_many(self, region_ids, if_changed=False):
+        """Gets many regions"""
+        return self._many(self.get_region_details, region_ids, if_changed)
+
+    async def get_constellation_details_many(self,
+                                             constellation_ids,
+                                             if_changed=False):
+        """Gets many constellations"""
+        return self._many(self.get_constellation_details, constellation_ids,
+                          if_changed)
+
+    async def get_system_details_many(self, system_ids, if_changed=False):
+        """Gets many systems"""
+        return self._many(self.get_system_details, system_ids, if_changed)
+
+    async def get_stargate_details_many(self, stargate_ids, if_changed=False):
+        """Gets many stargates"""
+        return self._many(self.get_stargate_details, stargate_ids,
+                          if_changed)
+
+
+class TestUniverseImporter(unittest.TestCase):
+    """Tests for the universe importer"""
+
+    def setUp(self):
+        client = mongomock.MongoClient()
+        self.region_repo = repos.RegionRepo(client)
+        self.constellation_repo = repos.ConstellationRepo(client)
+        self.system_repo = repos.SystemRepo(client)
+        self.stargate_repo = repos.StargateRepo(client)
+
+    def _importer(self, universe_api):
+        return importers.UniverseImporter(
+            universe_api,
+            self.region_repo,
+            self.constellation_repo,
+            self.system_repo,
+            self.stargate_repo,
+            batch_size=2)
+
+    def _ids(self, repo, key):
+        return sorted(item[key] for item in repo._col.find())
+
+    def test_run_imports_every_level(self):
+        """Tests that every level of the universe is fetched and saved"""
+        # Arrange
+        universe_api = FakeUniverseApi()
+        progress = MagicMock()
+
+        # Act
+        result = self._importer(universe_api).run(progress=progress)
+
+        # Assert
+        self.assertEqual(result.saved, 12)
+        self.assertEqual(result.errors, {})
+        self.assertEqual(self._ids(self.region_repo, 'region_id'), [1, 2])
+        self.assertEqual(
+            self._ids(self.constellation_repo, 'constellation_id'), [10, 20])
+        self.assertEqual(
+            self._ids(self.system_repo, 'system_id'), [100, 101, 200, 201])
+        self.assertEqual(
+            self._ids(self.stargate_repo, 'stargate_id'),
+            [1000, 1010, 2000, 2010])
+        progress.update.assert_called_with(12, 12)
+
+    def test_run_uses_provided_region_ids(self):
+        """Tests that provided region ids skip the region id lookup"""
+        # Arrange
+        universe_api = MagicMock(wraps=FakeUniverseApi())
+
+        # Act
+        result = self._importer(universe_api).run([2])
+
+        # Assert
+        self.assertEqual(result.saved, 6)
+        universe_api.get_region_ids.assert_not_called()
+        self.assertEqual(self._ids(self.region_repo, 'region_id'), [2])
+
+    def test_run_keeps_one_thread_pool_per_stage(self):
+        """Tests that batches of a stage share a pool instead of each
+        starting their own"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_executor = stack.enter_context(
+                patch('api.importers.ThreadPoolExecutor',
+                      wraps=importers.ThreadPoolExecutor))
+
+            # Act
+            result = self._importer(FakeUniverseApi()).run()
+
+            # Assert
+            self.assertEqual(result.saved, 12)
+            self.assertEqual(mock_executor.call_count, 4)
+
+    def test_run_resumes_without_fetching_saved_documents(self):
+        """Tests that a re-run only fetches what is missing"""
+        # Arrange
+        failing_api = FakeUniverseApi({('system_id', 101)})
+        first = self._importer(failing_api).run()
+        universe_api = FakeUniverseApi()
+
+        # Act
+        result = self._importer(universe_api).run()
+
+        # Assert
+        self.assertEqual(list(first.errors), [('system', 101)])
+        self.assertEqual(result.saved, 2)
+        self.assertEqual(
+            sorted(c for c in universe_api.calls if c[0] == 'system_id'),
+            [('system_id', 101)])
+        self.assertEqual(
+            self._ids(self.stargate_repo, 'stargate_id'),
+            [1000, 1010, 2000, 2010])
+
+    def test_run_with_force_fetches_everything(self):
+        """Tests that force refreshes documents that are already saved"""
+        # Arrange
+        self._importer(FakeUniverseApi()).run()
+        universe_api = FakeUniverseApi()
+
+        # Act
+        result = self._importer(universe_api).run([1], force=True)
+
+        # Assert
+        self.assertEqual(result.saved, 6)
+        self.assertEqual(len(universe_api.calls), 6)
+
+    def test_run_with_force_only_rewrites_changed_documents(self):
+        """Tests that a refresh skips writing documents that did not change"""
+        # Arrange
+        self._importer(FakeUniverseApi()).run()
+        universe_api = FakeUniverseApi(changed={('system_id', 100)})
+        system_repo = MagicMock(wraps=self.system_repo)
+        self.system_repo = system_repo
+        constellation_repo = MagicMock(wraps=self.constellation_repo)
+        self.constellation_repo = constellation_repo
+
+        # Act
+        result = self._importer(universe_api).run(force=True)
+
+        # Assert
+        self.assertEqual(result.saved, 1)
+        self.assertEqual(result.unchanged, 11)
+        self.assertEqual(len(universe_api.calls), 12)
+        system_repo.save_many.assert_called_once_with([{
+            'system_id': 100,
+            'stargates': [1000]
+        }])
+        constellation_repo.save_many.assert_not_called()
+
+    def test_run_with_async_api_imports_every_level(self):
+        """Tests that an async api is used to fetch each batch"""
+        # Arrange
+        universe_api = FakeAsyncUniverseApi({('system_id', 101)})
+
+        # Act
+        result = self._importer(universe_api).run()
+
+        # Assert
+        self.assertEqual(result.saved, 10)
+        self.assertEqual(list(result.errors), [('system', 101)])
+        self.assertEqual(
+            self._ids(self.stargate_repo, 'stargate_id'),
+            [1000, 2000, 2010])
+
+    def test_run_with_async_api_only_rewrites_changed_documents(self):
+        """Tests that an async refresh fetches saved documents conditionally"""
+        # Arrange
+        self._importer(FakeUniverseApi()).run()
+        self.stargate_repo.remove({'stargate_id': 1000})
+        universe_api = FakeAsyncUniverseApi(changed=set())
+
+        # Act
+        result = self._importer(universe_api).run(force=True)
+
+        # Assert
+        self.assertEqual(result.saved, 1)
+        self.assertEqual(result.unchanged, 11)
+        self.assertEqual(
+            self._ids(self.stargate_repo, 'stargate_id'),
+            [1000, 1010, 2000, 2010])
@@ -0,0 +1,133 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import unittest
+from unittest.mock import patch, MagicMock, ANY
+
+import mongomock
+
+from api import jobs
+from api import repos
+
+
+def _inline_executor():
+    executor = MagicMock()
+    executor.submit.side_effect = lambda func, *args: func(*args)
+    return executor
+
+
+# pylint: disable=invalid-name,protected-access
+class TestJobProgress(unittest.TestCase):
+    """Tests for the job progress handle"""
+
+    @staticmethod
+    def test_update_writes_percentage():
+        """Tests that progress is recorded on the job document"""
+        # Arrange
+        job_repo = MagicMock()
+        progress = jobs.JobProgress(job_repo, 'abc')
+
+        # Act
+        progress.update(1, 4)
+
+        # Assert
+        job_repo.update.assert_called_once_with('abc', {
+            'completed': 1,
+            'total': 4,
+            'percentComplete': 25
+        })
+
+    def test_update_skips_writes_without_percentage_change(self):
+        """Tests that small increments do not rewrite the job document"""
+        # Arrange
+        job_repo = MagicMock()
+        progress = jobs.JobProgress(job_repo, 'abc')
+
+        # Act
+        for completed in range(1, 1001):
+            progress.update(completed, 1000)
+
+        # Assert
+        self.assertEqual(job_repo.update.call_count, 100)
+
+    @staticmethod
+    def test_error_appends_message():
+        """Tests that errors are pushed to the job document"""
+        # Arrange
+        job_repo = MagicMock()
+        progress = jobs.JobProgress(job_repo, 'abc')
+
+        # Act
+        progress.error('oops')
+
+        # Assert
+        job_repo.update.assert_called_once_with('abc', {}, error='oops')
+
+
+class TestJobRunner(unittest.TestCase):
+    """Tests for the background job runner"""
+
+    def test_init_without_params(self):
+        """Test that the init constructs a job repo if none provided"""
+        # Arrange / Act
+        with patch('api.jobs.repos'):
+            runner = jobs.JobRunner()
+
+        # Assert
+        self.assertIsNotNone(runner._job_repo)
+
+    def test_submit_runs_job_to_completion(self):
+        """Tests that a successful job is marked complete"""
+        # Arrange
+        client = mongomock.MongoClient()
+        runner = jobs.JobRunner(repos.JobRepo(client), _inline_executor())
+        func = MagicMock()
+
+        # Act
+        job_id = runner.submit('test', func)
+
+        # Assert
+        func.assert_called_once_with(ANY)
+        job = runner.get(job_id)
+        self.assertEqual(job['name'], 'test')
+        self.assertEqual(job['status'], jobs.STATUS_COMPLETE)
+        self.assertEqual(job['percentComplete'], 100)
+        self.assertEqual(job['errors'], [])
+        self.assertIn('startedAt', job)
+        self.assertIn('finishedAt', job)
+
+    def test_submit_records_failures(self):
+        """Tests that a job raising an error is marked failed"""
+        # Arrange
+        client = mongomock.MongoClient()
+        runner = jobs.JobRunner(repos.JobRepo(client), _inline_executor())
+        func = MagicMock(side_effect=ValueError('boom'))
+
+        # Act
+        with patch('api.jobs.logging'):
+            job_id = runner.submit('test', func)
+
+        # Assert
+        job = runner.get(job_id)
+        self.assertEqual(job['status'], jobs.STATUS_FAILED)
+        self.assertEqual(job['errors'], ['boom'])
+
+    def test_submit_returns_before_job_runs(self):
+        """Tests that submitting only queues the job"""
+        # Arrange
+        client = mongomock.MongoClient()
+        executor = MagicMock()
+        runner = jobs.JobRunner(repos.JobRepo(client), executor)
+        func = MagicMock()
+
+        # Act
+        job_id = runner.submit('test', func)
+
+        # Assert
+        func.assert_not_called()
+        executor.submit.assert_called_once_with(ANY, job_id, func)
+        self.assertEqual(runner.get(job_id)['status'], jobs.STATUS_QUEUED)
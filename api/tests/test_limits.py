@@ -0,0 +1,261 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import unittest
+from unittest.mock import call, patch, MagicMock
+
+import mongomock
+
+from api import limits, metrics
+from api import repos
+from api.errors import ThrottledError
+
+
+# pylint: disable=invalid-name,protected-access
+class TestTokenBucket(unittest.TestCase):
+    """Tests for the token buckets"""
+
+    def test_burst_is_free_then_calls_are_spaced(self):
+        """Tests that calls past the burst wait their turn"""
+        # Arrange
+        bucket = limits.TokenBucket(10, 2)
+        now = bucket._updated
+
+        # Act
+        delays = [bucket._reserve(now) for _ in range(4)]
+
+        # Assert
+        self.assertEqual(delays[:2], [0, 0])
+        self.assertAlmostEqual(delays[2], 0.1)
+        self.assertAlmostEqual(delays[3], 0.2)
+
+    def test_refills_up_to_burst(self):
+        """Tests that idle time refills the bucket without exceeding burst"""
+        # Arrange
+        bucket = limits.TokenBucket(10, 2)
+        now = bucket._updated
+        bucket._reserve(now)
+        bucket._reserve(now)
+
+        # Act
+        delays = [bucket._reserve(now + 60) for _ in range(3)]
+
+        # Assert
+        self.assertEqual(delays[:2], [0, 0])
+        self.assertAlmostEqual(delays[2], 0.1)
+
+    def test_acquire_sleeps_for_reservation(self):
+        """Tests that acquire blocks until its token is due"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_sleep = stack.enter_context(
+                patch('api.limits.time.sleep'))
+            bucket = limits.TokenBucket(4, 1)
+
+            # Act
+            bucket.acquire()
+            bucket.acquire()
+
+            # Assert
+            self.assertEqual(mock_sleep.call_count, 1)
+            self.assertLessEqual(mock_sleep.call_args[0][0], 0.25)
+
+    def test_shared_bucket_is_shared_between_workers(self):
+        """Tests that two workers draw from the same bucket"""
+        # Arrange
+        limit_repo = repos.LimitRepo(mongomock.MongoClient())
+        limit_repo.sync_indexes()
+        first = limits.SharedTokenBucket(limit_repo, 'esi', 10, 2)
+        second = limits.SharedTokenBucket(limit_repo, 'esi', 10, 2)
+
+        # Act
+        delays = [
+            first._reserve(100.0),
+            second._reserve(100.0),
+            first._reserve(100.0),
+            second._reserve(100.0)
+        ]
+
+        # Assert
+        self.assertEqual(delays[:2], [0, 0])
+        self.assertAlmostEqual(delays[2], 0.1)
+        self.assertAlmostEqual(delays[3], 0.2)
+
+    def test_shared_bucket_retries_lost_swap(self):
+        """Tests that a worker rereads the bucket when another beat it"""
+        # Arrange
+        limit_repo = MagicMock()
+        limit_repo.get_bucket.side_effect = [{
+            'tokens': 1,
+            'updated': 100.0,
+            'version': 3
+        }, {
+            'tokens': 0,
+            'updated': 100.0,
+            'version': 4
+        }]
+        limit_repo.swap_bucket.side_effect = [False, True]
+        bucket = limits.SharedTokenBucket(limit_repo, 'esi', 10, 2)
+
+        # Act
+        with patch('api.limits.time.time', return_value=100.0):
+            delay = bucket._reserve(100.0)
+
+        # Assert
+        self.assertAlmostEqual(delay, 0.1)
+        limit_repo.swap_bucket.assert_called_with('esi', 4, -1, 100.0)
+
+
+class TestErrorBudget(unittest.TestCase):
+    """Tests for the error budget trackers"""
+
+    @staticmethod
+    def _response(remain, reset):
+        response = MagicMock()
+        response.header = {
+            'X-Esi-Error-Limit-Remain': [str(remain)],
+            'X-Esi-Error-Limit-Reset': [str(reset)]
+        }
+        return response
+
+    def test_check_passes_while_budget_remains(self):
+        """Tests that calls are allowed above the threshold"""
+        # Arrange
+        budget = limits.ErrorBudget(threshold=10)
+        budget.record(self._response(11, 30))
+
+        # Act / Assert
+        budget.check()
+
+    def test_check_raises_until_reset(self):
+        """Tests that calls are refused with the wait once the budget is low"""
+        # Arrange
+        budget = limits.ErrorBudget(threshold=10)
+        budget.record(self._response(10, 30))
+
+        # Act
+        with self.assertRaises(ThrottledError) as ctx:
+            budget.check()
+
+        # Assert
+        self.assertGreater(ctx.exception.retry_after, 29)
+
+    def test_record_ignores_responses_without_headers(self):
+        """Tests that responses missing the limit headers are skipped"""
+        # Arrange
+        budget = limits.ErrorBudget()
+        response = MagicMock()
+        response.header = {}
+
+        # Act
+        budget.record(response)
+
+        # Assert
+        self.assertIsNone(budget._load())
+
+    def test_shared_budget_is_shared_between_workers(self):
+        """Tests that one worker stops on errors another worker spent"""
+        # Arrange
+        limit_repo = repos.LimitRepo(mongomock.MongoClient())
+        first = limits.SharedErrorBudget(limit_repo, 'esi', threshold=10)
+        second = limits.SharedErrorBudget(limit_repo, 'esi', threshold=10)
+
+        # Act
+        first.record(self._response(5, 30))
+
+        # Assert
+        with self.assertRaises(ThrottledError):
+            second.check()
+
+
+    def test_shared_budget_only_writes_changes(self):
+        """Tests that responses reporting the same budget are not rewritten"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_time = stack.enter_context(
+                patch('api.limits.time.time', return_value=100.0))
+            limit_repo = MagicMock()
+            budget = limits.SharedErrorBudget(limit_repo, 'esi')
+
+            # Act
+            budget.record(self._response(100, 60))
+            mock_time.return_value = 110.2
+            budget.record(self._response(100, 50))
+            budget.record(self._response(99, 50))
+            mock_time.return_value = 170.0
+            budget.record(self._response(100, 50))
+
+            # Assert
+            self.assertEqual(limit_repo.save_budget.call_args_list, [
+                call('esi', 100, 160.0),
+                call('esi', 99, 160.2),
+                call('esi', 100, 220.0)
+            ])
+
+class TestLimitedClient(unittest.TestCase):
+    """Tests for the limited client"""
+
+    def test_request_checks_limits_then_records_response(self):
+        """Tests that requests wait for the limits and update the budget"""
+        # Arrange
+        client = MagicMock()
+        bucket = MagicMock()
+        budget = MagicMock()
+        limited = limits.LimitedClient(client, bucket, budget)
+        operation = (MagicMock(path='/universe/regions/'), MagicMock())
+
+        # Act
+        response = limited.request(operation)
+
+        # Assert
+        self.assertEqual(response, client.request.return_value)
+        budget.check.assert_called_once_with()
+        bucket.acquire.assert_called_once_with()
+        budget.record.assert_called_once_with(client.request.return_value)
+
+    def test_request_latency_labelled_by_path_template(self):
+        """Tests that latency is kept per operation, not per entity id"""
+        # Arrange
+        client = MagicMock()
+        limited = limits.LimitedClient(client, MagicMock(), MagicMock())
+        template = '/universe/constellations/{constellation_id}/'
+        operation = (MagicMock(path=template), MagicMock())
+
+        def _request(req_and_resp):
+            req_and_resp[0].path = '/universe/constellations/20000001/'
+            return MagicMock(status=200)
+
+        client.request.side_effect = _request
+        before, _ = metrics.ESI_LATENCY.get((template, 200))
+
+        # Act
+        limited.request(operation)
+
+        # Assert
+        self.assertEqual(metrics.ESI_LATENCY.get((template, 200))[0],
+                         before + 1)
+        self.assertEqual(
+            metrics.ESI_LATENCY.get(
+                ('/universe/constellations/20000001/', 200)), (0, 0.0))
+
+    def test_request_not_sent_while_budget_spent(self):
+        """Tests that nothing is sent or waited on once the budget is spent"""
+        # Arrange
+        client = MagicMock()
+        bucket = MagicMock()
+        budget = MagicMock()
+        budget.check.side_effect = ThrottledError('spent', 30)
+        limited = limits.LimitedClient(client, bucket, budget)
+
+        # Act
+        with self.assertRaises(ThrottledError):
+            limited.request((MagicMock(), MagicMock()))
+
+        # Assert
+        bucket.acquire.assert_not_called()
+        client.request.assert_not_called()
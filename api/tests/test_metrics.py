@@ -0,0 +1,88 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+import unittest
+
+from api import metrics
+from api import resilience
+
+
+# pylint: disable=invalid-name,protected-access
+class TestRegistry(unittest.TestCase):
+    """Tests for the metrics registry"""
+
+    def test_render_counters_and_gauges(self):
+        """Tests that values are rendered per label value"""
+        # Arrange
+        registry = metrics.Registry()
+        counter = registry.counter('requests_total', 'Requests', ('method', ))
+        gauge = registry.gauge('in_flight', 'In flight')
+        counter.inc(('GET', ))
+        counter.inc(('GET', ), 2)
+        counter.inc(('POST', ))
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        # Act
+        text = registry.render()
+
+        # Assert
+        self.assertEqual(
+            text, '# HELP requests_total Requests\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{method="GET"} 3\n'
+            'requests_total{method="POST"} 1\n'
+            '# HELP in_flight In flight\n'
+            '# TYPE in_flight gauge\n'
+            'in_flight 1\n')
+
+    def test_render_histogram_cumulative_buckets(self):
+        """Tests that histogram buckets are rendered cumulatively"""
+        # Arrange
+        registry = metrics.Registry()
+        histogram = registry.histogram(
+            'latency_seconds', 'Latency', ('route', ), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, ('/a', ))
+
+        # Act
+        text = registry.render()
+
+        # Assert
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 4\n',
+                      text)
+        self.assertIn('latency_seconds_count{route="/a"} 4\n', text)
+        self.assertIn('latency_seconds_sum{route="/a"} 3.65\n', text)
+
+    def test_render_escapes_label_values(self):
+        """Tests that label values cannot break the text format"""
+        # Arrange
+        registry = metrics.Registry()
+        registry.counter('c', 'C', ('path', )).inc(('a"b\\c\n', ))
+
+        # Act
+        text = registry.render()
+
+        # Assert
+        self.assertIn('c{path="a\\"b\\\\c\\n"} 1\n', text)
+
+    def test_render_includes_retry_stats(self):
+        """Tests that the retry counters are exposed"""
+        # Arrange
+        resilience.reset_stats()
+        resilience._count('esi', 'retries')
+
+        # Act
+        text = metrics.REGISTRY.render()
+
+        # Assert
+        self.assertIn(
+            'corp_hq_retry_events_total{name="esi",event="retries"} 1', text)
+        resilience.reset_stats()
@@ -0,0 +1,245 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import unittest
+from unittest.mock import patch, MagicMock
+
+from api import metrics
+from api import mongo
+from api import constants as const
+
+
+# pylint: disable=invalid-name,protected-access
+class TestMongo(unittest.TestCase):
+    """Tests for the shared mongo client registry"""
+
+    def setUp(self):
+        mongo.close_clients()
+
+    def tearDown(self):
+        mongo.close_clients()
+
+    def test_get_client_uses_environment_host(self):
+        """Tests that the client is built for the configured host"""
+        with ExitStack() as stack:
+            # Arrange
+            config = {const.ENV_MONGO_HOST: '10.0.0.1'}
+            instance = MagicMock()
+            mock_client = stack.enter_context(patch('api.mongo.MongoClient'))
+            mock_client.return_value = instance
+            stack.enter_context(patch('os.environ', new=config))
+
+            # Act
+            client = mongo.get_client()
+
+            # Assert
+            self.assertEqual(client, instance)
+            mock_client.assert_called_once_with(
+                host='10.0.0.1',
+                connect=False,
+                event_listeners=[mongo.COMMAND_MONITOR])
+
+    def test_get_client_reuses_client_for_host(self):
+        """Tests that repeated calls for a host share a single client"""
+        with ExitStack() as stack:
+            # Arrange
+            mock_client = stack.enter_context(patch('api.mongo.MongoClient'))
+            mock_client.side_effect = [MagicMock(), MagicMock()]
+
+            # Act
+            client = mongo.get_client('10.0.0.1')
+            client2 = mongo.get_client('10.0.0.1')
+            client3 = mongo.get_client('10.0.0.2')
+
+            # Assert
+            self.assertEqual(client, client2)
+            self.assertNotEqual(client, client3)
+            self.assertEqual(mock_client.call_count, 2)
+
+    def test_get_client_applies_pool_options(self):
+        """Tests that the pool options are read from the environment"""
+        with ExitStack() as stack:
+            # Arrange
+            config = {
+                const.ENV_MONGO_MAX_POOL_SIZE: '25',
+                const.ENV_MONGO_WAIT_QUEUE_TIMEOUT_MS: '500'
+            }
+            mock_client = stack.enter_context(patch('api.mongo.MongoClient'))
+            stack.enter_context(patch('os.environ', new=config))
+
+            # Act
+            mongo.get_client('10.0.0.1')
+
+            # Assert
+            mock_client.assert_called_once_with(
+                host='10.0.0.1',
+                connect=False,
+                event_listeners=[mongo.COMMAND_MONITOR],
+                maxPoolSize=25,
+                waitQueueTimeoutMS=500)
+
+    def test_get_client_discards_clients_after_fork(self):
+        """Tests that a forked process does not reuse the parents clients"""
+        with ExitStack() as stack:
+            # Arrange
+            parent_client = MagicMock()
+            child_client = MagicMock()
+            mock_client = stack.enter_context(patch('api.mongo.MongoClient'))
+            mock_client.side_effect = [parent_client, child_client]
+            mock_getpid = stack.enter_context(patch('api.mongo.os.getpid'))
+            mock_getpid.return_value = mongo._CLIENTS_PID
+            mongo.get_client('10.0.0.1')
+            mock_getpid.return_value = mongo._CLIENTS_PID + 1
+
+            # Act
+            client = mongo.get_client('10.0.0.1')
+
+            # Assert
+            self.assertEqual(client, child_client)
+            parent_client.close.assert_not_called()
+
+    def test_close_clients_closes_all_clients(self):
+        """Tests that shutting down closes every registered client"""
+        with ExitStack() as stack:
+            # Arrange
+            instance = MagicMock()
+            mock_client = stack.enter_context(patch('api.mongo.MongoClient'))
+            mock_client.return_value = instance
+            mongo.get_client('10.0.0.1')
+
+            # Act
+            mongo.close_clients()
+
+            # Assert
+            instance.close.assert_called_once_with()
+            self.assertEqual(len(mongo._CLIENTS), 0)
+
+
+class TestCommandMonitor(unittest.TestCase):
+    """Tests for the mongo command monitor"""
+
+    @staticmethod
+    def _run(monitor, command, micros, failed=False):
+        name = next(iter(command))
+        started = MagicMock(
+            command=command,
+            command_name=name,
+            connection_id=('localhost', 27017),
+            request_id=7)
+        finished = MagicMock(
+            command_name=name,
+            database_name='corp-hq',
+            connection_id=('localhost', 27017),
+            request_id=7,
+            duration_micros=micros)
+        monitor.started(started)
+        if failed:
+            monitor.failed(finished)
+        else:
+            monitor.succeeded(finished)
+
+    def test_records_duration_per_collection(self):
+        """Tests that finished commands are timed by collection and name"""
+        # Arrange
+        monitor = mongo.CommandMonitor(slow_ms=100)
+        labels = ('users', 'find')
+        count, total = metrics.MONGO_LATENCY.get(labels)
+        served = metrics.MONGO_COMMANDS.get(labels + ('ok', ))
+
+        # Act
+        self._run(monitor, {'find': 'users', 'filter': {'username': 'a'}},
+                  1500)
+
+        # Assert
+        self.assertEqual(
+            metrics.MONGO_LATENCY.get(labels), (count + 1, total + 0.0015))
+        self.assertEqual(
+            metrics.MONGO_COMMANDS.get(labels + ('ok', )), served + 1)
+        self.assertEqual(monitor._pending, {})
+
+    def test_counts_failures(self):
+        """Tests that failed commands are counted separately"""
+        # Arrange
+        monitor = mongo.CommandMonitor(slow_ms=100)
+        labels = ('users', 'insert', 'failed')
+        failed = metrics.MONGO_COMMANDS.get(labels)
+
+        # Act
+        self._run(monitor, {'insert': 'users'}, 10, failed=True)
+
+        # Assert
+        self.assertEqual(metrics.MONGO_COMMANDS.get(labels), failed + 1)
+
+    def test_logs_shape_of_slow_commands(self):
+        """Tests that slow commands are logged without their values"""
+        # Arrange
+        monitor = mongo.CommandMonitor(slow_ms=100)
+        labels = ('sessions', 'find')
+        slow = metrics.MONGO_SLOW_COMMANDS.get(labels)
+        command = {
+            'find': 'sessions',
+            'filter': {
+                'token': 'secret',
+                'expireAt': {
+                    '$gt': 5
+                }
+            },
+            'sort': {
+                'expireAt': 1
+            }
+        }
+
+        # Act
+        with self.assertLogs('corp-hq', 'WARNING') as logs:
+            self._run(monitor, command, 250000)
+
+        # Assert
+        self.assertEqual(
+            metrics.MONGO_SLOW_COMMANDS.get(labels), slow + 1)
+        self.assertEqual(logs.output, [
+            'WARNING:corp-hq:Slow mongo find on corp-hq.sessions took '
+            '250.0ms: {"filter": {"expireAt": {"$gt": "?"}, "token": "?"}, '
+            '"sort": {"expireAt": 1}}'
+        ])
+
+    def test_getmore_is_labelled_with_its_collection(self):
+        """Tests that cursor batches are counted against their collection"""
+        # Arrange
+        monitor = mongo.CommandMonitor(slow_ms=100)
+        labels = ('regions', 'getMore', 'ok')
+        served = metrics.MONGO_COMMANDS.get(labels)
+
+        # Act
+        self._run(monitor, {'getMore': 123, 'collection': 'regions'}, 10)
+
+        # Assert
+        self.assertEqual(metrics.MONGO_COMMANDS.get(labels), served + 1)
+
+    def test_filter_shape_reduces_lists(self):
+        """Tests that lists are reduced to the shape of their first item"""
+        # Act
+        shape = mongo.filter_shape({
+            '$or': [{
+                'key': 'a'
+            }, {
+                'key': 'b'
+            }],
+            'region_id': {
+                '$in': [1, 2, 3]
+            }
+        })
+
+        # Assert
+        self.assertEqual(shape, {
+            '$or': [{
+                'key': '?'
+            }],
+            'region_id': {
+                '$in': ['?']
+            }
+        })
@@ -0,0 +1,80 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import unittest
+from unittest.mock import patch
+
+from api import passwords
+from api.errors import ServiceUnavailableError
+
+
+# pylint: disable=invalid-name,protected-access
+class TestPasswordHasher(unittest.TestCase):
+    """Tests for the pooled password hasher"""
+
+    def test_hash_and_check_round_trip(self):
+        """Tests that a hashed password checks against the original"""
+        # Arrange
+        hasher = passwords.PasswordHasher(4)
+
+        # Act
+        hashed = hasher.hash(b'secret')
+
+        # Assert
+        self.assertTrue(hashed.startswith(b'$2b$04$'))
+        self.assertTrue(hasher.check(b'secret', hashed))
+        self.assertFalse(hasher.check(b'wrong', hashed))
+
+    def test_hash_many_preserves_order(self):
+        """Tests that batch hashing returns hashes in input order"""
+        # Arrange
+        hasher = passwords.PasswordHasher(4, max_queue=2)
+        plain = [b'one', b'two', b'three']
+
+        # Act
+        hashed = hasher.hash_many(plain)
+
+        # Assert
+        self.assertEqual(len(hashed), 3)
+        for password, password_hash in zip(plain, hashed):
+            self.assertTrue(hasher.check(password, password_hash))
+
+    def test_needs_rehash_compares_work_factor(self):
+        """Tests that hashes with another work factor need rehashing"""
+        # Arrange
+        hasher = passwords.PasswordHasher(12)
+
+        # Act / Assert
+        self.assertFalse(hasher.needs_rehash(b'$2b$12$abc'))
+        self.assertTrue(hasher.needs_rehash(b'$2b$10$abc'))
+        self.assertTrue(hasher.needs_rehash(b'garbage'))
+
+    def test_rounds_read_from_environment(self):
+        """Tests that the work factor can be configured"""
+        with ExitStack() as stack:
+            # Arrange
+            stack.enter_context(
+                patch('os.environ', new={'CORP_HQ_BCRYPT_ROUNDS': '5'}))
+
+            # Act
+            hasher = passwords.PasswordHasher()
+
+            # Assert
+            self.assertEqual(hasher._rounds, 5)
+
+    def test_full_queue_raises_service_unavailable(self):
+        """Tests that work beyond the queue limit is refused"""
+        with ExitStack() as stack:
+            # Arrange
+            hasher = passwords.PasswordHasher(4, max_queue=1)
+            passwords._get_executor()
+            stack.enter_context(patch('api.passwords._PENDING', new=1))
+
+            # Act / Assert
+            with self.assertRaises(ServiceUnavailableError):
+                hasher.hash(b'secret')
@@ -5,16 +5,29 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
+from collections import namedtuple
+import asyncio
 from contextlib import ExitStack
+from datetime import datetime
+import json
+import os
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 import unittest
+from pymongo import ASCENDING, MongoClient
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, OperationFailure
 import mongomock
 
 # pylint: disable=invalid-name,protected-access
+from api import esi, limits, metrics
 from api import repos
-from api import constants as const
+from api.errors import TransientError
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+SPEC_URL = 'https://esi.tech.ccp.is/latest/swagger.json'
+# NOTE: Query plans need a real mongod, mongomock cannot explain queries.
+TEST_MONGO_HOST = os.environ.get('CORP_HQ_TEST_MONGO_HOST')
 
 
 ###
@@ -68,15 +81,21 @@ class TestBaseRepo(unittest.TestCase):
         def _keys(self) -> list:
             return ['pk']
 
-    def test_empty_constructor_creates_client(self):
-        """Tests that a client is constructed when none is provided """
+    class CompoundImplementation(Implementation):
+        """Implementation keyed on more than one field"""
+
+        @property
+        def _keys(self) -> list:
+            return ['a', 'b']
+
+    def test_empty_constructor_uses_shared_client(self):
+        """Tests that the shared client is used when none is provided """
         with ExitStack() as stack:
             # Arrange
-            config = {const.ENV_MONGO_HOST: '10.0.0.1'}
             instance = MagicMock()
-            mock_client = stack.enter_context(patch('api.repos.MongoClient'))
-            mock_client.return_value = instance
-            stack.enter_context(patch('os.environ', new=config))
+            mock_get_client = stack.enter_context(
+                patch('api.repos.mongo.get_client'))
+            mock_get_client.return_value = instance
 
             # Act
             repo = repos.BaseRepo()
@@ -84,7 +103,7 @@ class TestBaseRepo(unittest.TestCase):
             # Assert
             self.assertIsNotNone(repo)
             self.assertEqual(repo._client, instance)
-            mock_client.assert_called_once_with(host='10.0.0.1')
+            mock_get_client.assert_called_once_with()
 
     def test_constructor_provided_client_uses_client(self):
         """Tests that a client is constructed when none is provided """
@@ -154,6 +173,200 @@ class TestBaseRepo(unittest.TestCase):
             # Assert
             self.assertIn('pk', ex.args[0])
 
+    def test_save_many_persists_valid_items(self):
+        """Tests that save many upserts every item in one bulk write"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_one({'pk': 'foo', 'data': 'old'})
+        items = [{'pk': 'foo', 'data': 'bar'}, {'pk': 'baz', 'data': 'qux'}]
+
+        # Act
+        repo.save_many(items)
+
+        # Assert
+        col = client['test-db']['test-col']
+        self.assertEqual(col.count(), 2)
+        self.assertEqual(col.find_one({'pk': 'foo'})['data'], 'bar')
+        self.assertEqual(col.find_one({'pk': 'baz'})['data'], 'qux')
+
+    def test_save_many_errors_on_invalid_item(self):
+        """Tests that nothing is written when any item is invalid"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        items = [{'pk': 'foo', 'data': 'bar'}, {'data': 'qux'}]
+
+        # Act
+        with self.assertRaises(ValueError):
+            repo.save_many(items)
+
+        # Assert
+        self.assertEqual(client['test-db']['test-col'].count(), 0)
+
+    def test_create_many_inserts_only_new_items(self):
+        """Tests that create many never overwrites existing documents"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_one({'pk': 'foo', 'data': 'old'})
+        items = [{'pk': 'baz', 'data': 'qux'}, {'pk': 'foo', 'data': 'new'}]
+
+        # Act
+        created = repo.create_many(items)
+
+        # Assert
+        col = client['test-db']['test-col']
+        self.assertEqual(created, {0})
+        self.assertEqual(col.count(), 2)
+        self.assertEqual(col.find_one({'pk': 'foo'})['data'], 'old')
+        self.assertEqual(col.find_one({'pk': 'baz'})['data'], 'qux')
+
+    def test_create_many_treats_racing_duplicates_as_existing(self):
+        """Tests that a concurrent insert of the same key is not an error"""
+        # Arrange
+        mock_collection = MagicMock()
+        mock_collection.bulk_write.side_effect = [
+            BulkWriteError({
+                'writeErrors': [{'index': 1, 'code': 11000}],
+                'upserted': [{'index': 0, '_id': 'a'}]
+            }),
+            MagicMock(upserted_ids={0: 'c'})
+        ]
+        repo = TestBaseRepo.Implementation(
+            {'test-db': {'test-col': mock_collection}})
+        items = [{'pk': 'a'}, {'pk': 'b'}, {'pk': 'c'}]
+
+        # Act
+        created = repo.create_many(items, batch_size=2)
+
+        # Assert
+        self.assertEqual(created, {0, 2})
+
+    def test_create_many_raises_other_write_errors(self):
+        """Tests that failures other than duplicate keys are not hidden"""
+        # Arrange
+        mock_collection = MagicMock()
+        mock_collection.bulk_write.side_effect = BulkWriteError({
+            'writeErrors': [{'index': 0, 'code': 121}],
+            'upserted': []
+        })
+        repo = TestBaseRepo.Implementation(
+            {'test-db': {'test-col': mock_collection}})
+
+        # Act
+        with self.assertRaises(BulkWriteError):
+            repo.create_many([{'pk': 'a'}])
+
+    def test_create_many_without_items_skips_write(self):
+        """Tests that an empty batch does not touch the database"""
+        # Arrange
+        mock_collection = MagicMock()
+        repo = TestBaseRepo.Implementation(
+            {'test-db': {'test-col': mock_collection}})
+
+        # Act
+        created = repo.create_many([])
+
+        # Assert
+        self.assertEqual(created, set())
+        mock_collection.bulk_write.assert_not_called()
+
+    def test_save_many_splits_writes_into_batches(self):
+        """Tests that save many sends at most batch size items per write"""
+        # Arrange
+        mock_collection = MagicMock()
+        repo = TestBaseRepo.Implementation(
+            {'test-db': {'test-col': mock_collection}})
+        items = [{'pk': i} for i in range(5)]
+
+        # Act
+        repo.save_many(items, ordered=True, batch_size=2)
+
+        # Assert
+        self.assertEqual(mock_collection.bulk_write.call_count, 3)
+        sizes = [
+            len(c[0][0]) for c in mock_collection.bulk_write.call_args_list
+        ]
+        self.assertEqual(sizes, [2, 2, 1])
+        mock_collection.bulk_write.assert_called_with(ANY, ordered=True)
+
+    def test_create_many_offsets_indexes_across_batches(self):
+        """Tests that created indexes refer to the original item list"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_one({'pk': 'bar'})
+        items = [{'pk': 'foo'}, {'pk': 'bar'}, {'pk': 'baz'}]
+
+        # Act
+        created = repo.create_many(items, batch_size=1)
+
+        # Assert
+        self.assertEqual(created, {0, 2})
+        self.assertEqual(client['test-db']['test-col'].count(), 3)
+
+    def test_get_many_returns_matching_documents(self):
+        """Tests that get many fetches every item with an $in filter"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        col = client['test-db']['test-col']
+        col.insert_many([{'pk': 'foo'}, {'pk': 'bar'}, {'pk': 'baz'}])
+
+        # Act
+        found = repo.get_many(
+            [{'pk': 'foo'}, {'pk': 'baz'}, {'pk': 'nope'}], batch_size=2)
+
+        # Assert
+        self.assertEqual(sorted(item['pk'] for item in found), ['baz', 'foo'])
+
+    def test_get_many_with_compound_keys_uses_or_filter(self):
+        """Tests that repos keyed on many fields fetch with an $or filter"""
+        # Arrange
+        mock_collection = MagicMock()
+        mock_collection.find.return_value = [{'a': 1, 'b': 2}]
+        repo = TestBaseRepo.CompoundImplementation(
+            {'test-db': {'test-col': mock_collection}})
+
+        # Act
+        found = repo.get_many([{'a': 1, 'b': 2}, {'a': 3, 'b': 4}])
+
+        # Assert
+        self.assertEqual(found, [{'a': 1, 'b': 2}])
+        mock_collection.find.assert_called_once_with({
+            '$or': [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]
+        }, None)
+
+    def test_remove_many_deletes_matching_items(self):
+        """Tests that remove many deletes items and reports the count"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        col = client['test-db']['test-col']
+        col.insert_many([{'pk': 'foo'}, {'pk': 'bar'}, {'pk': 'baz'}])
+
+        # Act
+        deleted = repo.remove_many([{'pk': 'foo'}, {'pk': 'bar'}], 1)
+
+        # Assert
+        self.assertEqual(deleted, 2)
+        self.assertEqual([item['pk'] for item in col.find()], ['baz'])
+
+    def test_remove_many_errors_on_invalid_item(self):
+        """Tests that nothing is deleted when any item is invalid"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_one({'pk': 'foo'})
+
+        # Act
+        with self.assertRaises(ValueError):
+            repo.remove_many([{'pk': 'foo'}, {'data': 'bar'}])
+
+        # Assert
+        self.assertEqual(client['test-db']['test-col'].count(), 1)
+
     def test_get_by_keys_returns_existing_document(self):
         """Tests fetch of documents based on the computed key filter"""
         # Arrange
@@ -183,6 +396,64 @@ class TestBaseRepo(unittest.TestCase):
         self.assertEqual(client['test-db']['test-col'].count(), 1)
         self.assertIsNone(db_data)
 
+    def test_get_by_keys_with_fields_loads_only_those_fields(self):
+        """Tests that a list of fields projects the fetched document"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_one({
+            'pk': 'foo',
+            'data': 'bar',
+            'big': 'baz'
+        })
+
+        # Act
+        db_data = repo.get_by_keys({'pk': 'foo'}, ['data'])
+
+        # Assert
+        self.assertEqual(db_data, {'data': 'bar'})
+
+    def test_get_by_keys_with_result_type_builds_result(self):
+        """Tests that a namedtuple type is loaded and returned"""
+        # Arrange
+        result_type = namedtuple('Result', ['pk', 'data'])
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_one({
+            'pk': 'foo',
+            'data': 'bar',
+            'big': 'baz'
+        })
+
+        # Act
+        db_data = repo.get_by_keys({'pk': 'foo'}, result_type)
+        missing = repo.get_by_keys({'pk': 'nope'}, result_type)
+
+        # Assert
+        self.assertEqual(db_data, result_type('foo', 'bar'))
+        self.assertIsNone(missing)
+
+    def test_get_many_with_result_type_builds_results(self):
+        """Tests that get many can return lightweight results"""
+        # Arrange
+        result_type = namedtuple('Result', ['pk'])
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.Implementation(client)
+        client['test-db']['test-col'].insert_many([{
+            'pk': 'foo',
+            'data': 'bar'
+        }, {
+            'pk': 'baz',
+            'data': 'qux'
+        }])
+
+        # Act
+        found = repo.get_many([{'pk': 'foo'}, {'pk': 'baz'}], result_type)
+
+        # Assert
+        self.assertEqual(
+            sorted(found), [result_type('baz'), result_type('foo')])
+
     def test_remove_deletes_item(self):
         """Test we remove items from the collection properly"""
         # Arrange
@@ -202,6 +473,151 @@ class TestBaseRepo(unittest.TestCase):
         self.assertEqual(before_count, 3)
         self.assertEqual(after_count, 2)
 
+    class IndexedImplementation(Implementation):
+        """Implementation declaring an extra index"""
+
+        @property
+        def _extra_indexes(self) -> list:
+            return [repos.index_spec('data', sparse=True)]
+
+    def test_check_indexes_reports_missing_indexes(self):
+        """Test that declared indexes not in the database are missing"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.IndexedImplementation(client)
+
+        # Act
+        with patch.object(repo, '_index_usage', return_value=None):
+            report = repo.check_indexes()
+
+        # Assert
+        self.assertEqual(report, [{
+            'collection': 'test-db.test-col',
+            'name': 'pk_1',
+            'keys': [['pk', 1]],
+            'status': 'missing',
+            'unused': None
+        }, {
+            'collection': 'test-db.test-col',
+            'name': 'data_1',
+            'keys': [['data', 1]],
+            'status': 'missing',
+            'unused': None
+        }])
+
+    def test_check_indexes_reports_changed_unknown_and_unused(self):
+        """Test that indexes differing from their spec are reported"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.IndexedImplementation(client)
+        collection = client['test-db']['test-col']
+        collection.create_index('pk', unique=True)
+        collection.create_index('data')
+        collection.create_index('other')
+
+        # Act
+        with patch.object(
+                repo, '_index_usage', return_value={
+                    '_id_': 5,
+                    'pk_1': 10,
+                    'data_1': 0
+                }):
+            report = repo.check_indexes()
+
+        # Assert
+        self.assertEqual([(entry['name'], entry['status'], entry['unused'])
+                          for entry in report],
+                         [('pk_1', 'ok', False), ('data_1', 'changed', True),
+                          ('other_1', 'unknown', None)])
+
+    def test_sync_indexes_creates_and_rebuilds_indexes(self):
+        """Test that sync fixes the indexes and is safe to run again"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.IndexedImplementation(client)
+        collection = client['test-db']['test-col']
+        collection.create_index('data')
+        collection.create_index('other')
+
+        # Act
+        first = repo.sync_indexes()
+        second = repo.sync_indexes(drop_unknown=True)
+
+        # Assert
+        self.assertEqual([(entry['name'], entry['status'])
+                          for entry in first],
+                         [('pk_1', 'created'), ('data_1', 'rebuilt'),
+                          ('other_1', 'unknown')])
+        self.assertEqual([(entry['name'], entry['status'])
+                          for entry in second],
+                         [('pk_1', 'ok'), ('data_1', 'ok'),
+                          ('other_1', 'dropped')])
+        info = collection.index_information()
+        self.assertEqual(sorted(info), ['_id_', 'data_1', 'pk_1'])
+        self.assertTrue(info['pk_1']['unique'])
+        self.assertTrue(info['data_1']['sparse'])
+
+    def test_sync_indexes_reports_failed_builds(self):
+        """Test that an index that cannot be built does not stop the rest"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = TestBaseRepo.IndexedImplementation(client)
+        collection = client['test-db']['test-col']
+        collection.insert_many([{'pk': 'foo'}, {'pk': 'foo'}])
+
+        # Act
+        report = repo.sync_indexes()
+
+        # Assert
+        self.assertEqual(report[0]['status'], 'failed')
+        self.assertIn('error', report[0])
+        self.assertEqual(report[1]['status'], 'created')
+        self.assertEqual(
+            sorted(collection.index_information()), ['_id_', 'data_1'])
+
+    @staticmethod
+    def test_index_usage_is_unknown_when_server_refuses():
+        """Test that usage is None when index stats are not available"""
+        # Arrange
+        collection = MagicMock()
+        collection.aggregate.side_effect = OperationFailure('nope')
+
+        # Act
+        usage = repos.BaseRepo._index_usage(collection)
+
+        # Assert
+        assert usage is None
+
+    @staticmethod
+    def test_index_usage_is_unknown_when_not_implemented():
+        """Test that usage is None when the server lacks index stats"""
+        # Arrange
+        collection = mongomock.MongoClient()['db']['col']
+
+        # Act
+        usage = repos.BaseRepo._index_usage(collection)
+
+        # Assert
+        assert usage is None
+
+    def test_index_usage_counts_uses_by_name(self):
+        """Test that usage maps index names to their use counts"""
+        # Arrange
+        collection = MagicMock()
+        collection.aggregate.return_value = [{
+            'name': 'pk_1',
+            'accesses': {
+                'ops': 3
+            }
+        }]
+
+        # Act
+        usage = repos.BaseRepo._index_usage(collection)
+
+        # Assert
+        self.assertEqual(usage, {'pk_1': 3})
+        collection.aggregate.assert_called_once_with([{'$indexStats': {}}])
+
 
 class TestBaseEveRepo(EveRepoTestBase):
     """Test the base eve repo properties and functionality"""
@@ -215,10 +631,11 @@ class TestBaseEveRepo(EveRepoTestBase):
             mock_app = MagicMock()
             mock_client = MagicMock()
             mock_config_repo = MagicMock()
-            mock_app_create = stack.enter_context(
-                patch('api.repos.esipy.App.create'))
+            mock_spec_cache_init = stack.enter_context(
+                patch('api.repos.esi.SpecCache'))
+            mock_app_create = mock_spec_cache_init.return_value.get_app
             mock_client_init = stack.enter_context(
-                patch('api.repos.esipy.EsiClient'))
+                patch('api.repos.esi.EsiClient'))
             mock_config_repo_init = stack.enter_context(
                 patch('api.repos.ConfigRepo'))
 
@@ -232,8 +649,33 @@ class TestBaseEveRepo(EveRepoTestBase):
             # Assert
             self.assertIsNotNone(repo)
             self.assertEqual(repo._app, mock_app)
-            self.assertEqual(repo._client, mock_client)
+            self.assertIsInstance(repo._client, limits.LimitedClient)
+            self.assertEqual(repo._client._client, mock_client)
+            self.assertIsInstance(repo._client._bucket, limits.TokenBucket)
             self.assertEqual(repo._config_repo, mock_config_repo)
+            self.assertIsInstance(mock_client_init.call_args[1]['cache'],
+                                  esi.ResponseCache)
+            self.assertIn('User-Agent',
+                          mock_client_init.call_args[1]['headers'])
+
+    def test_shared_limits_kept_in_mongo(self):
+        """Tests that the limits are shared when configured to be"""
+        with ExitStack() as stack:
+            # Arrange
+            stack.enter_context(
+                patch.dict('os.environ', {
+                    'CORP_HQ_ESI_SHARED_LIMITS': '1',
+                    'CORP_HQ_ESI_REQUESTS_PER_SECOND': '20'
+                }))
+            stack.enter_context(patch('api.repos.LimitRepo'))
+
+            # Act
+            bucket, budget = repos.BaseEveRepo._build_limits()
+
+            # Assert
+            self.assertIsInstance(bucket, limits.SharedTokenBucket)
+            self.assertEqual(bucket._rate, 20)
+            self.assertIsInstance(budget, limits.SharedErrorBudget)
 
     def test_constructor_provided_client_uses_client(self):
         """Tests that a client is constructed when none is provided """
@@ -260,10 +702,11 @@ class TestBaseEveRepo(EveRepoTestBase):
             mock_app = MagicMock()
             mock_client = MagicMock()
             mock_config_repo = MagicMock()
-            mock_app_create = stack.enter_context(
-                patch('api.repos.esipy.App.create'))
+            mock_spec_cache_init = stack.enter_context(
+                patch('api.repos.esi.SpecCache'))
+            mock_app_create = mock_spec_cache_init.return_value.get_app
             mock_client_init = stack.enter_context(
-                patch('api.repos.esipy.EsiClient'))
+                patch('api.repos.esi.EsiClient'))
             mock_config_repo_init = stack.enter_context(
                 patch('api.repos.ConfigRepo'))
 
@@ -279,9 +722,9 @@ class TestBaseEveRepo(EveRepoTestBase):
             self.assertIsNotNone(repo)
             self.assertIsNotNone(repo2)
             self.assertEqual(repo._app, mock_app)
-            self.assertEqual(repo._client, mock_client)
+            self.assertEqual(repo._client._client, mock_client)
             self.assertEqual(repo2._app, mock_app)
-            self.assertEqual(repo2._client, mock_client)
+            self.assertEqual(repo2._client, repo._client)
 
 
 class TestRegionRepo(unittest.TestCase):
@@ -339,6 +782,194 @@ class TestRegionRepo(unittest.TestCase):
         # Assert
         self.assertFalse(db_result)
 
+    def test_sync_indexes_sets_indexes_on_collection(self):
+        """Tests that region id and name lookups are indexed"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.RegionRepo(client)
+
+        # Act
+        repo.sync_indexes()
+
+        # Assert
+        info = client['eve-static-data']['regions'].index_information()
+        self.assertEqual(info['region_id_1']['key'], [('region_id', 1)])
+        self.assertTrue(info['region_id_1']['unique'])
+        self.assertEqual(info['region_id_1_name_1']['key'],
+                         [('region_id', ASCENDING), ('name', ASCENDING)])
+
+    def test_find_regions_pages_by_region_id(self):
+        """Tests that pages seek past the previous region id"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.RegionRepo(client)
+        client['eve-static-data']['regions'].insert_many([{
+            'region_id': region_id,
+            'name': name
+        } for region_id, name in [(3, 'Three'), (1, 'One'), (2, 'Two'),
+                                  (4, 'Four')]])
+
+        # Act
+        first = repo.find_regions(limit=2, fields=['region_id'])
+        second = repo.find_regions(after=2, limit=2, fields=['region_id'])
+
+        # Assert
+        self.assertEqual(first, [{'region_id': 1}, {'region_id': 2}])
+        self.assertEqual(second, [{'region_id': 3}, {'region_id': 4}])
+
+    def test_iter_regions_reads_in_batches_by_region_id(self):
+        """Tests that every matching region is yielded in id order"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.RegionRepo(client)
+        client['eve-static-data']['regions'].insert_many([{
+            'region_id': region_id,
+            'name': name
+        } for region_id, name in [(3, 'The Three'), (1, 'The One'),
+                                  (2, 'Two')]])
+
+        # Act
+        regions = list(
+            repo.iter_regions(name_prefix='The ', fields=[], batch_size=1))
+
+        # Assert
+        self.assertEqual(regions, [{
+            'region_id': 1,
+            'name': 'The One'
+        }, {
+            'region_id': 3,
+            'name': 'The Three'
+        }])
+
+    def test_iter_items_closes_cursor_when_stopped_early(self):
+        """Tests that abandoning the iterator frees the server cursor"""
+        # Arrange
+        mock_collection = MagicMock()
+        cursor = MagicMock()
+        cursor.__iter__.return_value = iter([{'region_id': 1}, {
+            'region_id': 2
+        }])
+        sorted_cursor = mock_collection.find.return_value.sort.return_value
+        sorted_cursor.batch_size.return_value = cursor
+        repo = repos.RegionRepo({'eve-static-data': {
+            'regions': mock_collection
+        }})
+
+        # Act
+        items = repo.iter_items(batch_size=7)
+        first = next(items)
+        items.close()
+
+        # Assert
+        self.assertEqual(first, {'region_id': 1})
+        sorted_cursor.batch_size.assert_called_once_with(7)
+        cursor.close.assert_called_once_with()
+
+    def test_find_regions_filters_by_name_prefix(self):
+        """Tests that only regions starting with the prefix are returned"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.RegionRepo(client)
+        client['eve-static-data']['regions'].insert_many([{
+            'region_id': 1,
+            'name': 'The Forge'
+        }, {
+            'region_id': 2,
+            'name': 'Forge.Other'
+        }, {
+            'region_id': 3,
+            'name': 'The Citadel'
+        }])
+
+        # Act
+        regions = repo.find_regions(name_prefix='The ', fields=[])
+        escaped = repo.find_regions(name_prefix='Forge.', fields=[])
+
+        # Assert
+        self.assertEqual(regions, [{
+            'region_id': 1,
+            'name': 'The Forge'
+        }, {
+            'region_id': 3,
+            'name': 'The Citadel'
+        }])
+        self.assertEqual(escaped, [{'region_id': 2, 'name': 'Forge.Other'}])
+
+
+def _plan_stages(plan):
+    """Yield (stage, index key pattern) for every stage of a query plan"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage'], plan.get('keyPattern')
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+@unittest.skipUnless(TEST_MONGO_HOST, 'CORP_HQ_TEST_MONGO_HOST is not set')
+class TestRegionRepoQueryPlans(unittest.TestCase):
+    """Test the region queries against the plans a real mongod picks"""
+
+    def setUp(self):
+        self.client = MongoClient(
+            TEST_MONGO_HOST, serverSelectionTimeoutMS=5000)
+        self.repo = repos.RegionRepo(self.client)
+        self.repo._db = self.client['corp-hq-test']
+        self.repo._col.insert_many([{
+            'region_id': 10000000 + index,
+            'name': '%s %s' % ('Rare' if index % 50 == 0 else 'Common', index)
+        } for index in range(5000)])
+        self.repo.sync_indexes()
+
+    def tearDown(self):
+        self.client.drop_database('corp-hq-test')
+        self.client.close()
+
+    def test_name_prefix_page_is_read_in_order_from_an_index(self):
+        """Tests that a filtered page is not sorted in memory"""
+        # Arrange
+        cursor = self.repo._page_cursor(
+            self.repo._name_query('Rare'), after=10001000, limit=20)
+
+        # Act
+        explain = cursor.explain()
+
+        # Assert
+        stages = list(_plan_stages(explain['queryPlanner']['winningPlan']))
+        self.assertNotIn('SORT', [stage for stage, _ in stages])
+        self.assertIn('IXSCAN', [stage for stage, _ in stages])
+        for stage, key_pattern in stages:
+            if stage == 'IXSCAN':
+                self.assertEqual(list(key_pattern)[0], 'region_id')
+
+
+class TestUniverseRepos(unittest.TestCase):
+    """Test constellation, system and stargate repo properties"""
+
+    def test_repos_key_and_index_on_their_ids(self):
+        """Test each repo is keyed and indexed on its id and parent id"""
+        for repo_type, name, key, parent in [
+                (repos.ConstellationRepo, 'constellations',
+                 'constellation_id', 'region_id'),
+                (repos.SystemRepo, 'systems', 'system_id', 'constellation_id'),
+                (repos.StargateRepo, 'stargates', 'stargate_id', 'system_id')
+        ]:
+            # Arrange
+            client = mongomock.MongoClient()
+            repo = repo_type(client)
+
+            # Act
+            repo.sync_indexes()
+
+            # Assert
+            info = client['eve-static-data'][name].index_information()
+            self.assertEqual(repo._keys, [key])
+            self.assertEqual(repo._col.name, name)
+            self.assertTrue(info[key + '_1']['unique'])
+            self.assertIn(parent + '_1', info)
+
 
 class TestSessionRepo(unittest.TestCase):
     """Test session repo properties and functionality"""
@@ -369,20 +1000,40 @@ class TestSessionRepo(unittest.TestCase):
         # Assert
         self.assertEqual(collection, mock_collection)
 
-    @staticmethod
-    def test_apply_indexes_sets_indexes_on_collection():
-        """Test that indexes are saved on the backing collection"""
+    def test_sync_indexes_sets_indexes_on_collection(self):
+        """Test that indexes are saved on the backing collections"""
         # Arrange
-        mock_collection = MagicMock()
-        client = {'corp-hq': {'sessions': mock_collection}}
+        client = mongomock.MongoClient()
+        repo = repos.SessionRepo(client)
+
+        # Act
+        repo.sync_indexes()
+
+        # Assert
+        sessions = client['corp-hq']['sessions'].index_information()
+        revocations = client['corp-hq'][
+            'session_revocations'].index_information()
+        self.assertTrue(sessions['token_1']['unique'])
+        self.assertEqual(sessions['expireAt_1']['expireAfterSeconds'], 1)
+        self.assertEqual(revocations['revokedAt_1']['expireAfterSeconds'],
+                         120)
+
+    def test_get_revoked_tokens_returns_recent_revocations(self):
+        """Test that only revocations after the cut off are returned"""
+        # Arrange
+        client = mongomock.MongoClient()
         repo = repos.SessionRepo(client)
+        client['corp-hq']['session_revocations'].insert_one({
+            'token': 'old',
+            'revokedAt': datetime(2017, 1, 1)
+        })
+        repo.publish_revocation('new')
 
         # Act
-        repo.apply_indexes()
+        revoked = repo.get_revoked_tokens(datetime(2017, 1, 2))
 
         # Assert
-        mock_collection.create_index.assert_called_once_with(
-            'expireAt', expireAfterSeconds=1)
+        self.assertEqual(revoked, ['new'])
 
 
 class TestUserRepo(unittest.TestCase):
@@ -414,6 +1065,23 @@ class TestUserRepo(unittest.TestCase):
         # Assert
         self.assertEqual(collection, mock_collection)
 
+    def test_update_password_changes_only_the_password(self):
+        """Tests that the stored hash is replaced in place"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.UserRepo(client)
+        repo.save({'username': 'foo', 'password': b'old', 'email': 'e'})
+
+        # Act
+        repo.update_password('foo', b'new')
+
+        # Assert
+        self.assertEqual(
+            repo.get_by_keys({'username': 'foo'}, repos.UserCredentials),
+            repos.UserCredentials('foo', b'new'))
+        self.assertEqual(
+            repo.get_by_keys({'username': 'foo'})['email'], 'e')
+
 
 class TestEveRegionRepo(TestBaseEveRepo):
     """Test eve region repo properties and functionality"""
@@ -440,6 +1108,146 @@ class TestEveRegionRepo(TestBaseEveRepo):
 class TestConfigRepo(unittest.TestCase):
     """Test user repo properties and functionality"""
 
+    def setUp(self):
+        repos.ConfigRepo._CACHE.clear()
+
+    def tearDown(self):
+        repos.ConfigRepo._CACHE.clear()
+
+    def test_get_by_keys_caches_lookups(self):
+        """Test that repeated lookups of a key only query mongo once"""
+        # Arrange
+        mock_collection = MagicMock()
+        mock_collection.find_one.return_value = {'key': 'foo', 'value': 1}
+        client = {'corp-hq': {'config': mock_collection}}
+        repo = repos.ConfigRepo(client)
+        repo2 = repos.ConfigRepo(client)
+
+        # Act
+        item = repo.get_by_keys({'key': 'foo'})
+        item2 = repo2.get_by_keys({'key': 'foo'})
+
+        # Assert
+        self.assertEqual(item, {'key': 'foo', 'value': 1})
+        self.assertEqual(item, item2)
+        mock_collection.find_one.assert_called_once_with({'key': 'foo'}, None)
+
+    def test_get_by_keys_caches_missing_keys(self):
+        """Test that keys not in the database are cached as missing"""
+        # Arrange
+        mock_collection = MagicMock()
+        mock_collection.find_one.return_value = None
+        client = {'corp-hq': {'config': mock_collection}}
+        repo = repos.ConfigRepo(client)
+
+        # Act
+        item = repo.get_by_keys({'key': 'foo'})
+        item2 = repo.get_by_keys({'key': 'foo'})
+
+        # Assert
+        self.assertIsNone(item)
+        self.assertIsNone(item2)
+        self.assertEqual(mock_collection.find_one.call_count, 1)
+
+    def test_save_invalidates_cached_key(self):
+        """Test that saving a config item drops the stale cached copy"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.ConfigRepo(client)
+        repo.save({'key': 'foo', 'value': 1})
+        repo.get_by_keys({'key': 'foo'})
+
+        # Act
+        repo.save({'key': 'foo', 'value': 2})
+        value = repo.get_value('foo')
+
+        # Assert
+        self.assertEqual(value, 2)
+
+    def test_remove_invalidates_cached_key(self):
+        """Test that removing a config item drops the cached copy"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.ConfigRepo(client)
+        repo.save({'key': 'foo', 'value': 1})
+        repo.get_by_keys({'key': 'foo'})
+
+        # Act
+        repo.remove({'key': 'foo'})
+        value = repo.get_value('foo', 'default')
+
+        # Assert
+        self.assertEqual(value, 'default')
+
+    def test_remove_many_invalidates_cached_keys(self):
+        """Test that bulk removal drops the cached copies"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.ConfigRepo(client)
+        repo.save_many([{
+            'key': 'foo',
+            'value': 1
+        }, {
+            'key': 'bar',
+            'value': 2
+        }])
+        repo.get_by_keys({'key': 'foo'})
+        repo.get_by_keys({'key': 'bar'})
+
+        # Act
+        repo.remove_many([{'key': 'foo'}, {'key': 'bar'}])
+
+        # Assert
+        self.assertIsNone(repo.get_value('foo'))
+        self.assertIsNone(repo.get_value('bar'))
+
+    def test_get_by_keys_with_extra_filters_skips_cache(self):
+        """Test that filters other than the key always query mongo"""
+        # Arrange
+        mock_collection = MagicMock()
+        client = {'corp-hq': {'config': mock_collection}}
+        repo = repos.ConfigRepo(client)
+
+        # Act
+        repo.get_by_keys({'key': 'foo', 'value': 1})
+        repo.get_by_keys({'key': 'foo', 'value': 1})
+
+        # Assert
+        self.assertEqual(mock_collection.find_one.call_count, 2)
+
+    def test_watch_changes_unsupported(self):
+        """Test that no watcher starts without change stream support"""
+        # Arrange
+        mock_collection = MagicMock(spec=['find_one'])
+        client = {'corp-hq': {'config': mock_collection}}
+        repo = repos.ConfigRepo(client)
+
+        # Act
+        result = repo.watch_changes()
+
+        # Assert
+        self.assertFalse(result)
+
+    def test_watch_changes_clears_cache_on_change(self):
+        """Test that a change from any worker clears the cache"""
+        # Arrange
+        mock_collection = MagicMock()
+        stream = mock_collection.watch.return_value.__enter__.return_value
+        stream.__iter__.return_value = iter([{'operationType': 'update'}])
+        client = {'corp-hq': {'config': mock_collection}}
+        repo = repos.ConfigRepo(client)
+        repos.ConfigRepo._CACHE.set('foo', {'key': 'foo', 'value': 1})
+
+        # Act
+        with patch('api.repos.threading.Thread') as mock_thread:
+            result = repo.watch_changes()
+            target = mock_thread.call_args[1]['target']
+        target()
+
+        # Assert
+        self.assertTrue(result)
+        self.assertEqual(len(repos.ConfigRepo._CACHE), 0)
+
     def test_keys_initialized_properly(self):
         """Test that the keys property has been implemented properly"""
         # Arrange
@@ -493,6 +1301,7 @@ class TestConfigRepo(unittest.TestCase):
 
         mock_client.request.return_value = mock_response
         data = [1, 2, 3]
+        mock_response.status = 200
         mock_response.data = data
         repo = repos.EveRegionRepo(mock_app, mock_client, mock_config_repo,
                                    mock_region_repo)
@@ -515,9 +1324,15 @@ class TestConfigRepo(unittest.TestCase):
 
         mock_client.request.return_value = mock_response
         data = {'regionId': 1, 'name': 'test'}
+        mock_response.status = 200
         mock_response.data = data
-        repo = repos.EveRegionRepo(mock_app, mock_client, mock_config_repo,
-                                   mock_region_repo)
+        mock_response.header = {}
+        repo = repos.EveRegionRepo(
+            mock_app,
+            mock_client,
+            mock_config_repo,
+            mock_region_repo,
+            resource_repo=MagicMock())
 
         # Act
         return_data = repo.get_region_details(1)
@@ -525,3 +1340,396 @@ class TestConfigRepo(unittest.TestCase):
         # Assert
         self.assertIsNotNone(data)
         self.assertEqual(data, return_data)
+
+
+class TestEveUniverseRepo(TestBaseEveRepo):
+    """Test eve universe repo functionality"""
+
+    def test_get_details_requests_each_resource(self):
+        """Test that each getter requests the matching ESI operation"""
+        with open(os.path.join(FIXTURES_DIR, 'swagger.json')) as spec_file:
+            app = esi.SpecCache._build_app(SPEC_URL, json.load(spec_file))
+
+        for method, param in [('get_constellation_details',
+                               'constellation_id'),
+                              ('get_system_details', 'system_id'),
+                              ('get_stargate_details', 'stargate_id')]:
+            # Arrange
+            mock_client = MagicMock()
+            mock_client.request.return_value.status = 200
+            mock_client.request.return_value.data = {'id': 7}
+            mock_client.request.return_value.header = {}
+            repo = repos.EveUniverseRepo(
+                app,
+                mock_client,
+                MagicMock(),
+                MagicMock(),
+                resource_repo=MagicMock())
+
+            # Act
+            data = getattr(repo, method)(7)
+
+            # Assert
+            self.assertEqual(data, {'id': 7})
+            request = mock_client.request.call_args[0][0][0]
+            self.assertIn('{%s}' % param, request.path)
+            self.assertEqual(request._p['path'], {param: '7'})
+
+
+class TestEveResourceValidators(EveRepoTestBase):
+    """Test the conditional reads shared by the eve repos"""
+
+    def setUp(self):
+        super().setUp()
+        with open(os.path.join(FIXTURES_DIR, 'swagger.json')) as spec_file:
+            self.app = esi.SpecCache._build_app(SPEC_URL, json.load(spec_file))
+        self.client = MagicMock()
+        self.resource_repo = repos.EsiResourceRepo(mongomock.MongoClient())
+        self.repo = repos.EveRegionRepo(
+            self.app,
+            self.client,
+            MagicMock(),
+            MagicMock(),
+            resource_repo=self.resource_repo)
+
+    def _respond(self, status, data=None, expires=None):
+        response = MagicMock()
+        response.status = status
+        response.data = data
+        response.header = {
+            'ETag': ['"abc"'],
+            'Last-Modified': ['Mon, 01 Jan 2018 00:00:00 GMT'],
+            'Expires': [expires or 'Mon, 01 Jan 2018 01:00:00 GMT']
+        }
+        self.client.request.return_value = response
+
+    def _meta(self):
+        return self.resource_repo.get_by_keys({'key': 'region:1'})
+
+    def test_read_records_validators(self):
+        """Test that a successful read keeps the validators and body hash"""
+        # Arrange
+        self._respond(200, {'region_id': 1})
+
+        # Act
+        data = self.repo.get_region_details(1)
+
+        # Assert
+        meta = self._meta()
+        self.assertEqual(data, {'region_id': 1})
+        self.assertEqual(meta['etag'], '"abc"')
+        self.assertEqual(meta['lastModified'],
+                         'Mon, 01 Jan 2018 00:00:00 GMT')
+        self.assertEqual(meta['expires'], datetime(2018, 1, 1, 1))
+        self.assertEqual(meta['hash'],
+                         repos.BaseEveRepo._hash({'region_id': 1}))
+
+    def test_read_if_changed_skips_request_before_expiry(self):
+        """Test that an unexpired resource is not requested again"""
+        # Arrange
+        self._respond(200, {'region_id': 1}, 'Fri, 01 Jan 2100 00:00:00 GMT')
+        self.repo.get_region_details(1)
+        self.client.request.reset_mock()
+
+        # Act
+        data = self.repo.get_region_details(1, if_changed=True)
+
+        # Assert
+        self.assertIs(data, repos.NOT_MODIFIED)
+        self.client.request.assert_not_called()
+
+    def test_read_if_changed_sends_validators(self):
+        """Test that an expired resource is requested conditionally"""
+        # Arrange
+        self._respond(200, {'region_id': 1})
+        self.repo.get_region_details(1)
+        self._respond(304, expires='Fri, 01 Jan 2100 00:00:00 GMT')
+
+        # Act
+        data = self.repo.get_region_details(1, if_changed=True)
+
+        # Assert
+        self.assertIs(data, repos.NOT_MODIFIED)
+        self.assertEqual(self.client.request.call_args[1]['headers'], {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Mon, 01 Jan 2018 00:00:00 GMT'
+        })
+        self.assertEqual(self._meta()['expires'], datetime(2100, 1, 1))
+
+    def test_read_if_changed_compares_body_hash(self):
+        """Test that a resent but identical body counts as unchanged"""
+        # Arrange
+        self._respond(200, {'region_id': 1})
+        self.repo.get_region_details(1)
+
+        # Act
+        same = self.repo.get_region_details(1, if_changed=True)
+        self._respond(200, {'region_id': 1, 'name': 'new'})
+        changed = self.repo.get_region_details(1, if_changed=True)
+
+        # Assert
+        self.assertIs(same, repos.NOT_MODIFIED)
+        self.assertEqual(changed, {'region_id': 1, 'name': 'new'})
+
+
+class FakeHttpResponse(object):
+    """Stands in for an aiohttp response"""
+
+    def __init__(self, status, data=None, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = json.dumps(data).encode('utf8') if data else b''
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self):
+        """Gets the body"""
+        return self._body
+
+
+class FakeHttpSession(object):
+    """Stands in for an aiohttp session, answering from a handler"""
+
+    def __init__(self, handler):
+        self.requests = []
+        self._handler = handler
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def get(self, url, params=None, headers=None):
+        """Records the request and answers it"""
+        self.requests.append((url, params, dict(headers)))
+        return self._handler(url)
+
+
+class TestAsyncEveUniverseRepo(EveRepoTestBase):
+    """Test fetching many universe details at once"""
+
+    def setUp(self):
+        super().setUp()
+        with open(os.path.join(FIXTURES_DIR, 'swagger.json')) as spec_file:
+            self.app = esi.SpecCache._build_app(SPEC_URL, json.load(spec_file))
+        self.resource_repo = repos.EsiResourceRepo(mongomock.MongoClient())
+        self.handler = MagicMock()
+        self.session = FakeHttpSession(self.handler)
+
+    def tearDown(self):
+        super().tearDown()
+        repos._ESI_BREAKER.record_success()
+
+    def _repo(self, **kwargs):
+        return repos.AsyncEveUniverseRepo(
+            self.app,
+            MagicMock(),
+            MagicMock(),
+            MagicMock(),
+            resource_repo=self.resource_repo,
+            session_factory=lambda: self.session,
+            **kwargs)
+
+    @staticmethod
+    def _run(coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def _region(self, url):
+        region_id = int(url.rstrip('/').rsplit('/', 1)[1])
+        return FakeHttpResponse(200, self._data(region_id), {
+            'ETag': '"%s"' % region_id,
+            'Expires': 'Mon, 01 Jan 2018 01:00:00 GMT'
+        })
+
+    @staticmethod
+    def _data(region_id):
+        return {
+            'region_id': region_id,
+            'name': 'Region %s' % region_id,
+            'constellations': []
+        }
+
+    def test_get_region_details_many_uses_spec_scheme(self):
+        """Test that requests are sent with the scheme the spec declares"""
+        # Arrange
+        with open(os.path.join(FIXTURES_DIR, 'swagger.json')) as spec_file:
+            spec = json.load(spec_file)
+        spec['schemes'] = ['http']
+        self.app = esi.SpecCache._build_app(SPEC_URL, spec)
+        self.handler.side_effect = self._region
+
+        # Act
+        results = self._run(self._repo().get_region_details_many([1]))
+
+        # Assert
+        self.assertEqual(results, [(1, self._data(1), None)])
+        self.assertTrue(self.session.requests[0][0].startswith('http://'))
+
+    def test_get_region_details_many_fetches_every_region(self):
+        """Test that every region is fetched and its validators saved"""
+        # Arrange
+        self.handler.side_effect = self._region
+        repo = self._repo(max_concurrency=2)
+
+        # Act
+        results = self._run(repo.get_region_details_many([1, 2, 3]))
+
+        # Assert
+        self.assertEqual(
+            sorted(results, key=lambda result: result[0]),
+            [(1, self._data(1), None), (2, self._data(2), None),
+             (3, self._data(3), None)])
+        self.assertEqual(len(self.session.requests), 3)
+        self.assertEqual(
+            self.resource_repo.get_by_keys({'key': 'region:2'})['etag'],
+            '"2"')
+
+    def test_get_region_details_many_labels_latency_by_template(self):
+        """Test that latency is kept per operation, not per region id"""
+        # Arrange
+        self.handler.side_effect = self._region
+        template = ('/universe/regions/{region_id}/', 200)
+        before, _ = metrics.ESI_LATENCY.get(template)
+
+        # Act
+        self._run(self._repo().get_region_details_many([7, 8, 9]))
+
+        # Assert
+        self.assertEqual(metrics.ESI_LATENCY.get(template)[0], before + 3)
+        self.assertEqual(
+            metrics.ESI_LATENCY.get(('/universe/regions/7/', 200)), (0, 0.0))
+
+    def test_get_region_details_many_sends_validators(self):
+        """Test that known regions are requested conditionally"""
+        # Arrange
+        self.resource_repo.save({
+            'key': 'region:1',
+            'etag': '"1"',
+            'expires': datetime(2018, 1, 1),
+            'hash': 'abc'
+        })
+        self.handler.return_value = FakeHttpResponse(
+            304, headers={'Expires': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+        repo = self._repo()
+
+        # Act
+        results = self._run(
+            repo.get_region_details_many([1], if_changed=True))
+
+        # Assert
+        self.assertEqual(results, [(1, repos.NOT_MODIFIED, None)])
+        self.assertEqual(self.session.requests[0][2]['If-None-Match'], '"1"')
+        self.assertEqual(
+            self.resource_repo.get_by_keys({'key': 'region:1'})['expires'],
+            datetime(2100, 1, 1))
+
+    def test_get_region_details_many_reports_failures(self):
+        """Test that a failing region is retried then reported on its own"""
+        # Arrange
+        def _handle(url):
+            if url.endswith('/2/'):
+                return FakeHttpResponse(503, {'error': 'down'})
+            return self._region(url)
+
+        async def _no_sleep(_):
+            pass
+
+        self.handler.side_effect = _handle
+        repo = self._repo()
+
+        # Act
+        with patch('api.resilience.asyncio.sleep', _no_sleep):
+            results = dict((item_id, (result, error))
+                           for item_id, result, error in self._run(
+                               repo.get_region_details_many([1, 2])))
+
+        # Assert
+        self.assertEqual(results[1], (self._data(1), None))
+        self.assertIsInstance(results[2][1], TransientError)
+        self.assertEqual(
+            len([r for r in self.session.requests if r[0].endswith('/2/')]),
+            3)
+
+
+class TestLimitRepo(unittest.TestCase):
+    """Test limit repo properties and functionality"""
+
+    def test_swap_bucket_only_stores_unchanged_state(self):
+        """Test that a bucket update loses to one made since it was read"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.LimitRepo(client)
+        repo.sync_indexes()
+
+        # Act
+        created = repo.swap_bucket('esi', None, 9, 100.0)
+        recreated = repo.swap_bucket('esi', None, 9, 100.0)
+        swapped = repo.swap_bucket('esi', 1, 8, 100.0)
+        stale = repo.swap_bucket('esi', 1, 7, 100.0)
+
+        # Assert
+        self.assertTrue(created)
+        self.assertFalse(recreated)
+        self.assertTrue(swapped)
+        self.assertFalse(stale)
+        self.assertEqual(
+            repo.get_bucket('esi'), {'tokens': 8,
+                                     'updated': 100.0,
+                                     'version': 2})
+
+    def test_save_budget_overwrites_budget(self):
+        """Test that the latest error budget is the one kept"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.LimitRepo(client)
+
+        # Act
+        repo.save_budget('esi', 90, 100.0)
+        repo.save_budget('esi', 80, 160.0)
+
+        # Assert
+        self.assertEqual(
+            repo.get_budget('esi'), {'remain': 80,
+                                     'resetAt': 160.0})
+
+
+class TestJobRepo(unittest.TestCase):
+    """Test job repo properties and functionality"""
+
+    def test_keys_initialized_properly(self):
+        """Test that the keys property has been implemented properly"""
+        # Arrange
+        client = MagicMock()
+        repo = repos.JobRepo(client)
+
+        # Act
+        keys = repo._keys
+
+        # Assert
+        self.assertEqual(len(keys), 1)
+        self.assertIn('jobId', keys)
+
+    def test_update_sets_fields_and_appends_errors(self):
+        """Test that updates modify the job document in place"""
+        # Arrange
+        client = mongomock.MongoClient()
+        repo = repos.JobRepo(client)
+        repo.save({'jobId': 'abc', 'status': 'queued', 'errors': []})
+
+        # Act
+        repo.update('abc', {'status': 'running'})
+        repo.update('abc', {}, error='oops')
+
+        # Assert
+        job = repo.get_by_keys({'jobId': 'abc'})
+        self.assertEqual(job['status'], 'running')
+        self.assertEqual(job['errors'], ['oops'])
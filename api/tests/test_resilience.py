@@ -0,0 +1,203 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from contextlib import ExitStack
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from api import resilience
+from api.errors import CircuitOpenError, ThrottledError, TransientError
+
+
+# pylint: disable=invalid-name,protected-access
+class TestRetry(unittest.TestCase):
+    """Tests for the retry decorator"""
+
+    def setUp(self):
+        resilience.reset_stats()
+        self._stack = ExitStack()
+        self.mock_sleep = self._stack.enter_context(
+            patch('api.resilience.time.sleep'))
+
+    def tearDown(self):
+        self._stack.close()
+        resilience.reset_stats()
+
+    def test_retries_transient_errors_until_success(self):
+        """Tests that transient failures are retried with short delays"""
+        # Arrange
+        func = MagicMock(side_effect=[requests.Timeout(), 'ok'])
+        wrapped = resilience.retry('test', base_delay=0.1, max_delay=1)(func)
+
+        # Act
+        result = wrapped(1, key=2)
+
+        # Assert
+        self.assertEqual(result, 'ok')
+        self.assertEqual(func.call_count, 2)
+        func.assert_called_with(1, key=2)
+        self.assertLessEqual(self.mock_sleep.call_args[0][0], 0.1)
+        self.assertEqual(resilience.get_stats(), {
+            'test.attempts': 2,
+            'test.retries': 1
+        })
+
+    def test_does_not_retry_other_errors(self):
+        """Tests that programming errors are raised at once"""
+        # Arrange
+        func = MagicMock(side_effect=KeyError('boom'))
+        wrapped = resilience.retry('test')(func)
+
+        # Act
+        with self.assertRaises(KeyError):
+            wrapped()
+
+        # Assert
+        self.assertEqual(func.call_count, 1)
+        self.mock_sleep.assert_not_called()
+
+    def test_raises_without_sleeping_after_last_attempt(self):
+        """Tests that the final failure is raised straight away"""
+        # Arrange
+        func = MagicMock(side_effect=TransientError('boom'))
+        wrapped = resilience.retry('test', attempts=3)(func)
+
+        # Act
+        with self.assertRaises(TransientError):
+            wrapped()
+
+        # Assert
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(self.mock_sleep.call_count, 2)
+        self.assertEqual(resilience.get_stats()['test.gave_up'], 1)
+
+    def test_waits_for_retry_after(self):
+        """Tests that a requested wait is honored when short enough"""
+        # Arrange
+        func = MagicMock(side_effect=[TransientError('boom', 2), 'ok'])
+        wrapped = resilience.retry('test', max_delay=5)(func)
+
+        # Act
+        wrapped()
+
+        # Assert
+        self.mock_sleep.assert_called_once_with(2)
+
+    def test_gives_up_when_retry_after_is_too_long(self):
+        """Tests that a long requested wait fails fast instead of stalling"""
+        # Arrange
+        func = MagicMock(side_effect=TransientError('boom', 60))
+        wrapped = resilience.retry('test', max_delay=5)(func)
+
+        # Act
+        with self.assertRaises(TransientError):
+            wrapped()
+
+        # Assert
+        self.assertEqual(func.call_count, 1)
+        self.mock_sleep.assert_not_called()
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests for the circuit breaker"""
+
+    def setUp(self):
+        self._stack = ExitStack()
+        self._stack.enter_context(patch('api.resilience.time.sleep'))
+        self.mock_monotonic = self._stack.enter_context(
+            patch('api.resilience.time.monotonic'))
+        self.mock_monotonic.return_value = 100.0
+
+    def tearDown(self):
+        self._stack.close()
+
+    def test_opens_after_repeated_failures(self):
+        """Tests that calls are refused once the failure threshold is hit"""
+        # Arrange
+        breaker = resilience.CircuitBreaker(
+            'test', failure_threshold=2, reset_timeout=30)
+        func = MagicMock(side_effect=TransientError('boom'))
+        wrapped = resilience.retry('test', attempts=5, breaker=breaker)(func)
+
+        # Act
+        with self.assertRaises(CircuitOpenError):
+            wrapped()
+
+        # Assert
+        self.assertEqual(func.call_count, 2)
+        self.assertTrue(breaker.is_open)
+
+    def test_trial_call_closes_circuit(self):
+        """Tests that a successful call after the timeout closes the circuit"""
+        # Arrange
+        breaker = resilience.CircuitBreaker(
+            'test', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        wrapped = resilience.retry('test', breaker=breaker)(lambda: 'ok')
+
+        # Act
+        with self.assertRaises(CircuitOpenError):
+            wrapped()
+        self.mock_monotonic.return_value = 131.0
+        result = wrapped()
+
+        # Assert
+        self.assertEqual(result, 'ok')
+        self.assertFalse(breaker.is_open)
+
+    def test_failed_trial_reopens_circuit(self):
+        """Tests that a failing trial call keeps the circuit open"""
+        # Arrange
+        breaker = resilience.CircuitBreaker(
+            'test', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.mock_monotonic.return_value = 131.0
+
+        # Act
+        breaker.before_call()
+        breaker.record_failure()
+
+        # Assert
+        self.assertTrue(breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_throttled_calls_do_not_open_circuit(self):
+        """Tests that calls held back by a limit are not counted as failures"""
+        # Arrange
+        breaker = resilience.CircuitBreaker(
+            'test', failure_threshold=2, reset_timeout=30)
+        func = MagicMock(side_effect=ThrottledError('spent', 1))
+        wrapped = resilience.retry('test', attempts=5, breaker=breaker)(func)
+
+        # Act
+        with self.assertRaises(ThrottledError):
+            wrapped()
+
+        # Assert
+        self.assertEqual(func.call_count, 5)
+        self.assertFalse(breaker.is_open)
+
+    def test_throttled_trial_lets_next_call_be_trial(self):
+        """Tests that a trial call held back by a limit does not leave the
+        circuit stuck open"""
+        # Arrange
+        breaker = resilience.CircuitBreaker(
+            'test', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.mock_monotonic.return_value = 131.0
+        func = MagicMock(side_effect=[ThrottledError('spent', 1), 'ok'])
+        wrapped = resilience.retry('test', breaker=breaker)(func)
+
+        # Act
+        result = wrapped()
+
+        # Assert
+        self.assertEqual(result, 'ok')
+        self.assertFalse(breaker.is_open)
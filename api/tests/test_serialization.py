@@ -0,0 +1,129 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from datetime import date, datetime, timedelta, timezone
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+from bson import ObjectId
+
+import api.constants as const
+from api import serialization
+from api.controllers import _build_response
+
+
+# pylint: disable=invalid-name,protected-access
+class TestSerialization(unittest.TestCase):
+    """Tests for the serialization module"""
+
+    def setUp(self):
+        serialization.reset_serializer()
+
+    def tearDown(self):
+        serialization.reset_serializer()
+
+    @staticmethod
+    def _installed():
+        return [serializer_type() for serializer_type in
+                serialization._SERIALIZERS
+                if serialization._is_installed(serializer_type.name)]
+
+    def test_dumps_handles_mongo_types(self):
+        """Test that every installed serializer writes what json does"""
+        # Arrange
+        value = {
+            'naive': datetime(2017, 1, 2, 3, 4, 5, 678),
+            'aware': datetime(2017, 1, 2, 5, 4, 5,
+                              tzinfo=timezone(timedelta(hours=2))),
+            'day': date(2017, 1, 2),
+            'id': ObjectId('5a0a1b2c3d4e5f6a7b8c9d0e'),
+            'raw': b'\x00\xff',
+            'items': (1, 2),
+            'nested': [{'raw': b'abc', 'tags': {'a'}}],
+            'text': 'caf\xe9 / \u2603',
+            7: 'numbered'
+        }
+
+        for serializer in self._installed():
+            with self.subTest(serializer=serializer.name):
+                # Act
+                result = json.loads(serializer.dumps(value).decode('utf8'))
+
+                # Assert
+                self.assertEqual(result, {
+                    'naive': '2017-01-02T03:04:05Z',
+                    'aware': '2017-01-02T03:04:05Z',
+                    'day': '2017-01-02',
+                    'id': '5a0a1b2c3d4e5f6a7b8c9d0e',
+                    'raw': 'AP8=',
+                    'items': [1, 2],
+                    'nested': [{'raw': 'YWJj', 'tags': ['a']}],
+                    'text': 'caf\xe9 / \u2603',
+                    '7': 'numbered'
+                })
+
+    def test_dumps_rejects_unknown_types(self):
+        """Test that values with no JSON form still raise a TypeError"""
+        with self.assertRaises(TypeError):
+            serialization.dumps({'value': object()})
+
+    def test_build_serializer_falls_back_to_json(self):
+        """Test that the stdlib is used when nothing faster is installed"""
+        with patch.object(serialization, 'orjson', None), \
+                patch.object(serialization, 'ujson', None):
+            # Act
+            serializer = serialization.build_serializer()
+
+        # Assert
+        self.assertEqual(serializer.name, 'json')
+
+    def test_build_serializer_only_uses_ujson_when_named(self):
+        """Test that ujson is never picked without being asked for"""
+        with patch.object(serialization, 'orjson', None), \
+                patch.object(serialization, 'ujson', object()):
+            # Act
+            default = serialization.build_serializer()
+            named = serialization.build_serializer('ujson')
+
+        # Assert
+        self.assertEqual(default.name, 'json')
+        self.assertEqual(named.name, 'ujson')
+
+    def test_build_serializer_refuses_missing_serializers(self):
+        """Test that asking for one that is not installed fails clearly"""
+        with patch.object(serialization, 'orjson', None):
+            with self.assertRaises(ValueError):
+                serialization.build_serializer('orjson')
+        with self.assertRaises(ValueError):
+            serialization.build_serializer('pickle')
+
+    def test_get_serializer_uses_environment(self):
+        """Test that the serializer can be chosen with an env var"""
+        with patch.dict(os.environ, {const.ENV_JSON_SERIALIZER: 'json'}):
+            # Act
+            first = serialization.get_serializer()
+            second = serialization.get_serializer()
+
+        # Assert
+        self.assertEqual(first.name, 'json')
+        self.assertIs(first, second)
+
+    def test_build_response_serializes_every_payload_type(self):
+        """Test that lists are serialized and text is passed through"""
+        # Act
+        listing = _build_response([{'at': datetime(2017, 1, 1)}])
+        text = _build_response('OK')
+        empty = _build_response(None)
+
+        # Assert
+        self.assertEqual(listing.get_data(),
+                         b'[{"at":"2017-01-01T00:00:00Z"}]')
+        self.assertEqual(listing.headers['Content-Type'], 'application/json')
+        self.assertEqual(text.get_data(), b'OK')
+        self.assertEqual(empty.get_data(), b'')
@@ -5,8 +5,11 @@ Copyright (c) 2017 fritogotlayed
 For full license details please see the LICENSE file located in the root folder
 of the project.
 """
+import os
 import unittest
+from unittest.mock import patch
 
+import api.constants as const
 import api.server as server
 
 
@@ -20,3 +23,29 @@ class TestServer(unittest.TestCase):
 
         # Assert
         self.assertIsNotNone(app)
+
+    def test_build_app_syncs_indexes_when_enabled(self):
+        """Test that indexes are synced on start up when asked to"""
+        with patch.dict(os.environ, {const.ENV_SYNC_INDEXES: '1'}), \
+                patch('api.server.domain') as mock_domain:
+            # Act
+            app = server.build_app()
+
+        # Assert
+        self.assertIsNotNone(app)
+        mock_domain.Indexes.return_value.sync.assert_called_once_with()
+
+    def test_build_app_warns_when_config_watch_unsupported(self):
+        """Test that asking for an unsupported config watch is logged"""
+        with patch.dict(os.environ, {const.ENV_CONFIG_WATCH: '1'}), \
+                patch('api.server.repos') as mock_repos, \
+                self.assertLogs(const.SYS_LOGGER_NAME, 'WARNING') as logs:
+            # Arrange
+            mock_repos.ConfigRepo.return_value.watch_changes.return_value = \
+                False
+
+            # Act
+            server.build_app()
+
+        # Assert
+        self.assertIn(const.ENV_CONFIG_WATCH, logs.output[0])
@@ -0,0 +1,88 @@
+"""
+The MIT License (MIT)
+Copyright (c) 2017 fritogotlayed
+
+For full license details please see the LICENSE file located in the root folder
+of the project.
+"""
+from datetime import datetime, timedelta
+import unittest
+
+from api import tokens
+
+SECRET = b'test secret'
+
+
+# pylint: disable=invalid-name
+class TestTokens(unittest.TestCase):
+    """Tests for the token helpers"""
+
+    def test_generate_token_is_url_safe_and_unique(self):
+        """Tests that generated tokens are URL safe and do not repeat"""
+        # Act
+        generated = {tokens.generate_token() for _ in range(100)}
+
+        # Assert
+        self.assertEqual(len(generated), 100)
+        for token in generated:
+            self.assertEqual(len(token), 43)
+            self.assertRegex(token, r'^[A-Za-z0-9_-]+$')
+            self.assertFalse(tokens.is_signed(token))
+
+    def test_verify_token_accepts_valid_token(self):
+        """Tests that a signed token verifies and reports its expiry"""
+        # Arrange
+        expires = datetime(2030, 1, 1, 12, 30)
+        token = tokens.sign_token(expires, SECRET)
+
+        # Act
+        result = tokens.verify_token(token, SECRET, datetime(2030, 1, 1))
+
+        # Assert
+        self.assertTrue(tokens.is_signed(token))
+        self.assertRegex(token, r'^[A-Za-z0-9_.-]+$')
+        self.assertEqual(result, expires)
+
+    def test_verify_token_rejects_expired_token(self):
+        """Tests that a token past its expiry is rejected"""
+        # Arrange
+        token = tokens.sign_token(datetime(2017, 1, 1), SECRET)
+
+        # Act
+        result = tokens.verify_token(token, SECRET, datetime(2017, 1, 2))
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_verify_token_rejects_wrong_secret(self):
+        """Tests that a token signed by another secret is rejected"""
+        # Arrange
+        expires = datetime.utcnow() + timedelta(minutes=10)
+        token = tokens.sign_token(expires, b'other secret')
+
+        # Act
+        result = tokens.verify_token(token, SECRET)
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_verify_token_rejects_tampered_expiry(self):
+        """Tests that changing the body invalidates the signature"""
+        # Arrange
+        expires = datetime.utcnow() + timedelta(minutes=10)
+        body, mac = tokens.sign_token(expires, SECRET).split('.')
+        forged = tokens.sign_token(expires + timedelta(days=1), SECRET)
+
+        # Act
+        result = tokens.verify_token(forged.split('.')[0] + '.' + mac, SECRET)
+        original = tokens.verify_token(body + '.' + mac, SECRET)
+
+        # Assert
+        self.assertIsNone(result)
+        self.assertIsNotNone(original)
+
+    def test_verify_token_rejects_malformed_token(self):
+        """Tests that garbage input is rejected rather than raising"""
+        # Act / Assert
+        for token in ['', 'abc', 'a.b.c', '!!!.???', 'YQ.YQ']:
+            self.assertIsNone(tokens.verify_token(token, SECRET))